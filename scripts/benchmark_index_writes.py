@@ -0,0 +1,112 @@
+"""Compare per-row media_items writes with the batched MediaIndexStore.replace_snapshot."""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tiklocal.services.database import AppDatabase  # noqa: E402
+from tiklocal.services.library_index import MediaIndexStore, _SNAPSHOT_UPSERT_SQL  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes",
+        default="10000,100000,500000",
+        help="comma separated record counts",
+    )
+    parser.add_argument("--skip-legacy-over", type=int, default=500000, help="skip the per-row run above this size")
+    return parser.parse_args()
+
+
+def make_records(count: int) -> list[dict]:
+    records = []
+    for index in range(count):
+        rel_path = f"{index // 1000:04d}/item-{index}.jpg"
+        records.append({
+            "uri": rel_path,
+            "source_id": "main",
+            "rel_path": rel_path,
+            "filename": f"item-{index}.jpg",
+            "parent_path": f"{index // 1000:04d}",
+            "media_type": "image",
+            "extension": ".jpg",
+            "size_bytes": 1000 + index,
+            "mtime": 1_700_000_000.0 + index,
+            "captured_at": 1_700_000_000.0 + index,
+            "captured_local_date": "2023-11-14",
+            "time_source": "filesystem_mtime",
+            "time_confidence": "fallback",
+            "time_metadata_version": 1,
+        })
+    return records
+
+
+# The previous statement rewrote every row, changed or not.
+LEGACY_UPSERT_SQL = _SNAPSHOT_UPSERT_SQL[:_SNAPSHOT_UPSERT_SQL.rindex("WHERE")]
+
+
+def legacy_snapshot(store: MediaIndexStore, records: list[dict]) -> dict:
+    """The previous write loop: one upsert plus one seen-row insert per record."""
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    with store.database.connect() as conn:
+        conn.execute("CREATE TEMP TABLE media_index_seen(uri TEXT PRIMARY KEY)")
+        for record in records:
+            conn.execute(LEGACY_UPSERT_SQL, store._record_values(record, now))
+            conn.execute("INSERT OR IGNORE INTO media_index_seen(uri) VALUES (?)", (record["uri"],))
+        conn.execute(
+            """
+            DELETE FROM media_items
+            WHERE source_id = 'main' AND uri NOT IN (SELECT uri FROM media_index_seen)
+            """
+        )
+        conn.execute("DROP TABLE media_index_seen")
+    return {"written": len(records)}
+
+
+def timed(label: str, func) -> None:
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    suffix = f"  written {result['written']:>7}" if isinstance(result, dict) else ""
+    print(f"    {label:<18} {elapsed * 1000:>10.1f} ms{suffix}")
+
+
+def run(count: int, skip_legacy_over: int) -> None:
+    records = make_records(count)
+    print(f"  {count} records")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if count <= skip_legacy_over:
+            legacy = MediaIndexStore(AppDatabase(Path(temp_dir) / "legacy.db"))
+            legacy.database.migrate()
+            timed("per-row insert", lambda: legacy_snapshot(legacy, records))
+            timed("per-row resync", lambda: legacy_snapshot(legacy, records))
+
+        store = MediaIndexStore(AppDatabase(Path(temp_dir) / "batched.db"))
+        store.database.migrate()
+        timed("batched insert", lambda: store.replace_snapshot(records, synced_source_ids={"main"}))
+        timed("batched resync", lambda: store.replace_snapshot(records, synced_source_ids={"main"}))
+        touched = count // 100
+        changed = [dict(record, size_bytes=record["size_bytes"] + 1) for record in records[:touched]]
+        timed(
+            "batched 1% change",
+            lambda: store.replace_snapshot(changed + records[touched:], synced_source_ids={"main"}),
+        )
+
+
+def main() -> None:
+    args = parse_args()
+    print("media_items write benchmark")
+    for size in [int(value) for value in args.sizes.split(",") if value.strip()]:
+        run(size, args.skip_legacy_over)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Compare the single-pass library walker with the previous per-extension glob scan."""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tiklocal.services import (  # noqa: E402
+    AUDIO_EXTENSIONS,
+    IMAGE_EXTENSIONS,
+    VIDEO_EXTENSIONS,
+    LibraryService,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=20000, help="synthetic files to create")
+    parser.add_argument("--per-dir", type=int, default=200, help="files per directory")
+    parser.add_argument("--root", default="", help="scan an existing directory instead")
+    return parser.parse_args()
+
+
+def build_tree(root: Path, files: int, per_dir: int) -> None:
+    suffixes = [".jpg", ".JPG", ".png", ".mp4", ".mov", ".mp3", ".txt"]
+    for index in range(files):
+        folder = root / f"{index // (per_dir * 10):03d}" / f"{index // per_dir:05d}"
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"item-{index}{suffixes[index % len(suffixes)]}").write_bytes(b"")
+
+
+def legacy_scan(library: LibraryService) -> int:
+    """The previous LibraryIndexer.sync: one glob per extension, then stat to sort and index."""
+
+    def glob_source(extensions, include_uppercase=False):
+        items = []
+        for source in library.sources:
+            for ext in extensions:
+                items.extend(source.path.glob(f"**/*{ext}"))
+                if include_uppercase:
+                    items.extend(source.path.glob(f"**/*{ext.upper()}"))
+        return items
+
+    videos = sorted(glob_source(VIDEO_EXTENSIONS), key=lambda p: p.stat().st_mtime, reverse=True)
+    audios = sorted(glob_source(AUDIO_EXTENSIONS), key=lambda p: p.stat().st_mtime, reverse=True)
+    images = glob_source(IMAGE_EXTENSIONS, include_uppercase=True)
+    paths = videos + images + audios
+    for path in paths:
+        path.stat()
+        library.get_relative_path(path)
+    return len(paths)
+
+
+def walker_scan(library: LibraryService) -> int:
+    return len(library.scan_media())
+
+
+def measure(label: str, func, library: LibraryService) -> None:
+    original = os.scandir
+    calls = 0
+
+    def counting_scandir(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        return original(*args, **kwargs)
+
+    os.scandir = counting_scandir
+    try:
+        started = time.perf_counter()
+        found = func(library)
+        elapsed = time.perf_counter() - started
+    finally:
+        os.scandir = original
+    print(f"  {label:<8} files {found:>8}  directory listings {calls:>8}  {elapsed * 1000:>9.1f} ms")
+
+
+def main() -> None:
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(args.root).expanduser() if args.root else Path(temp_dir)
+        if not args.root:
+            build_tree(root, args.files, args.per_dir)
+        library = LibraryService(root)
+        print(f"Library scan benchmark: {root}")
+        measure("glob", legacy_scan, library)
+        measure("scandir", walker_scan, library)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Compare float32, float16 and int8 storage in image_vectors.
+
+Reports database size, cold matrix load time and how often the top-k
+similar images of each encoding match the float32 result.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import tiklocal.services.embedding as embedding  # noqa: E402
+from tiklocal.services.database import AppDatabase  # noqa: E402
+from tiklocal.services.embedding import SQLiteImageVectorStore, encode_embedding  # noqa: E402
+
+MODEL = "benchmark-embedding"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=20000, help="number of vectors")
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--cluster-size", type=int, default=16, help="vectors per synthetic cluster")
+    parser.add_argument("--noise", type=float, default=0.35, help="per-dimension noise relative to the cluster centre")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=12, help="neighbours per query")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def make_vectors(count: int, dimensions: int, cluster_size: int, noise: float, seed: int) -> list[list[float]]:
+    rng = random.Random(seed)
+    vectors = []
+    for start in range(0, count, cluster_size):
+        centre = [rng.gauss(0, 1) for _ in range(dimensions)]
+        for _ in range(min(cluster_size, count - start)):
+            vectors.append([value + rng.gauss(0, noise) for value in centre])
+    return vectors
+
+
+def load(store: SQLiteImageVectorStore, vectors: list[list[float]], encoding: str) -> None:
+    rows = []
+    for index, vector in enumerate(vectors):
+        blob, scale, values = encode_embedding(vector, encoding)
+        uri = f"{index:07d}.jpg"
+        rows.append((uri, uri, MODEL, len(vector), float(index), blob, store._embedding_norm(values), encoding, scale))
+    with store.database.connect() as conn:
+        conn.executemany(
+            """
+            INSERT INTO image_vectors (
+              uri, source_id, rel_path, model, dimensions, image_max_size, image_quality,
+              mtime, size_bytes, embedding, embedding_norm, embedding_encoding, embedding_scale, indexed_at
+            )
+            VALUES (?, 'main', ?, ?, ?, 512, 82, ?, 1000, ?, ?, ?, ?, '')
+            """,
+            rows,
+        )
+    conn = store.database.connect()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+
+
+def timed(func) -> tuple[object, float]:
+    started = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main() -> None:
+    args = parse_args()
+    backend = "numpy" if embedding.np is not None else "pure python"
+    print(f"vector encoding benchmark: {args.count} x {args.dimensions}, k={args.k}, {backend}")
+    vectors = make_vectors(args.count, args.dimensions, args.cluster_size, args.noise, args.seed)
+    queries = [f"{index:07d}.jpg" for index in random.Random(args.seed + 1).sample(range(args.count), min(args.queries, args.count))]
+    # Exact search on every store, so differences come from the encoding alone.
+    embedding.LSH_MIN_ROWS = embedding.LSH_MIN_ROWS_NUMPY = args.count + 1
+
+    reference: list[set[str]] = []
+    print(f"    {'encoding':<10} {'db size':>10} {'cold load':>12} {'top-k agreement':>16}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for encoding in ("float32", "float16", "int8"):
+            path = Path(temp_dir) / f"{encoding}.db"
+            database = AppDatabase(path)
+            database.migrate()
+            load(SQLiteImageVectorStore(database), vectors, encoding)
+            store = SQLiteImageVectorStore(database)
+            _, load_ms = timed(lambda: store.query_similar(queries[0], limit=args.k))
+            results = [{item["uri"] for item in store.query_similar(uri, limit=args.k)} for uri in queries]
+            if not reference:
+                reference = results
+            agreement = sum(len(found & truth) for found, truth in zip(results, reference)) / sum(map(len, reference))
+            size_mb = path.stat().st_size / 1024 / 1024
+            print(f"    {encoding:<10} {size_mb:>8.1f} MB {load_ms:>9.1f} ms {agreement:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
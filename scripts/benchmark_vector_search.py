@@ -0,0 +1,111 @@
+"""Measure recall@k and latency of LSH-backed query_similar against exact search.
+
+Synthetic clustered embeddings stand in for a photo library: every cluster is
+a handful of near-duplicate shots around one random direction. Needs NumPy to
+generate the data.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import tiklocal.services.embedding as embedding  # noqa: E402
+from tiklocal.services.database import AppDatabase  # noqa: E402
+from tiklocal.services.embedding import SQLiteImageVectorStore  # noqa: E402
+
+MODEL = "benchmark-embedding"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=100000, help="number of vectors")
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--cluster-size", type=int, default=16, help="vectors per synthetic cluster")
+    parser.add_argument("--noise", type=float, default=0.35, help="per-dimension noise relative to the cluster centre")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=12, help="neighbours per query")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def make_vectors(count: int, dimensions: int, cluster_size: int, noise: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((count // cluster_size + 1, dimensions), dtype=np.float32)
+    members = np.repeat(centres, cluster_size, axis=0)[:count]
+    return members + rng.standard_normal((count, dimensions), dtype=np.float32) * np.float32(noise)
+
+
+def load(store: SQLiteImageVectorStore, vectors: np.ndarray) -> None:
+    """Bulk insert without LSH codes, as vectors written before the index existed."""
+    norms = np.linalg.norm(vectors, axis=1)
+    with store.database.connect() as conn:
+        conn.executemany(
+            """
+            INSERT INTO image_vectors (
+              uri, source_id, rel_path, model, dimensions, image_max_size, image_quality,
+              mtime, size_bytes, embedding, embedding_norm, indexed_at
+            )
+            VALUES (?, 'main', ?, ?, ?, 512, 82, ?, 1000, ?, ?, '')
+            """,
+            (
+                (f"{index:07d}.jpg", f"{index:07d}.jpg", MODEL, vectors.shape[1], float(index), row.tobytes(), float(norm))
+                for index, (row, norm) in enumerate(zip(vectors, norms))
+            ),
+        )
+
+
+def timed(label: str, func):
+    started = time.perf_counter()
+    result = func()
+    print(f"    {label:<22} {(time.perf_counter() - started) * 1000:>10.1f} ms")
+    return result
+
+
+def search(store: SQLiteImageVectorStore, uris: list[str], k: int) -> tuple[list[set[str]], float]:
+    started = time.perf_counter()
+    results = [{item["uri"] for item in store.query_similar(uri, limit=k)} for uri in uris]
+    return results, (time.perf_counter() - started) * 1000 / max(1, len(uris))
+
+
+def main() -> None:
+    args = parse_args()
+    print(f"vector search benchmark: {args.count} x {args.dimensions}, k={args.k}")
+    vectors = make_vectors(args.count, args.dimensions, args.cluster_size, args.noise, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = [f"{int(index):07d}.jpg" for index in rng.choice(args.count, size=min(args.queries, args.count), replace=False)]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        database = AppDatabase(Path(temp_dir) / "vectors.db")
+        database.migrate()
+        store = SQLiteImageVectorStore(database)
+        timed("insert", lambda: load(store, vectors))
+        timed("build lsh codes", store.build_ann_index)
+        timed("load matrix", lambda: store.query_similar(queries[0], limit=args.k))
+
+        matrix = store._matrices[(MODEL, args.dimensions)]
+        candidates = [len(matrix.lsh.candidates(uri)) for uri in queries]
+        print(f"    lsh candidates/query   {sum(candidates) / len(candidates):>10.0f}  of {args.count}")
+
+        minimum = embedding.LSH_MIN_ROWS, embedding.LSH_MIN_ROWS_NUMPY
+        embedding.LSH_MIN_ROWS = embedding.LSH_MIN_ROWS_NUMPY = args.count + 1
+        exact, exact_ms = search(store, queries, args.k)
+        embedding.LSH_MIN_ROWS = embedding.LSH_MIN_ROWS_NUMPY = 0
+        approximate, lsh_ms = search(store, queries, args.k)
+        embedding.LSH_MIN_ROWS, embedding.LSH_MIN_ROWS_NUMPY = minimum
+
+    recall = sum(len(found & truth) for found, truth in zip(approximate, exact)) / sum(len(truth) for truth in exact)
+    print(f"    exact query            {exact_ms:>10.2f} ms")
+    print(f"    lsh query              {lsh_ms:>10.2f} ms")
+    print(f"    recall@{args.k:<15} {recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
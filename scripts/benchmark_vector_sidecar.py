@@ -0,0 +1,81 @@
+"""Compare cold matrix loads from SQLite BLOBs and from the memory-mapped sidecar.
+
+Each load is the first ``query_similar`` of a fresh store, which builds the
+in-memory matrix. Needs NumPy.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tiklocal.services.database import AppDatabase  # noqa: E402
+from tiklocal.services.embedding import SQLiteImageVectorStore  # noqa: E402
+
+MODEL = "benchmark-embedding"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=50000, help="number of vectors")
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--repeat", type=int, default=3, help="cold loads per variant; the best is reported")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def load(store: SQLiteImageVectorStore, vectors: np.ndarray) -> None:
+    norms = np.linalg.norm(vectors, axis=1)
+    with store.database.connect() as conn:
+        conn.executemany(
+            """
+            INSERT INTO image_vectors (
+              uri, source_id, rel_path, model, dimensions, image_max_size, image_quality,
+              mtime, size_bytes, embedding, embedding_norm, indexed_at
+            )
+            VALUES (?, 'main', ?, ?, ?, 512, 82, ?, 1000, ?, ?, '')
+            """,
+            (
+                (f"{index:07d}.jpg", f"{index:07d}.jpg", MODEL, vectors.shape[1], float(index), row.tobytes(), float(norm))
+                for index, (row, norm) in enumerate(zip(vectors, norms))
+            ),
+        )
+
+
+def timed(label: str, func, repeat: int = 1):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"    {label:<22} {best:>10.1f} ms")
+    return result
+
+
+def main() -> None:
+    args = parse_args()
+    print(f"vector sidecar benchmark: {args.count} x {args.dimensions}")
+    vectors = np.random.default_rng(args.seed).standard_normal((args.count, args.dimensions), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        database = AppDatabase(Path(temp_dir) / "vectors.db")
+        database.migrate()
+        sidecar_dir = Path(temp_dir) / "vectors"
+        timed("insert", lambda: load(SQLiteImageVectorStore(database), vectors))
+        timed("load from sqlite", lambda: SQLiteImageVectorStore(database).query_similar("0000000.jpg"), args.repeat)
+        timed("write sidecar", lambda: SQLiteImageVectorStore(database, sidecar_dir=sidecar_dir).compact_sidecars())
+        timed("load from sidecar", lambda: SQLiteImageVectorStore(database, sidecar_dir=sidecar_dir).query_similar("0000000.jpg"), args.repeat)
+        size = sum(path.stat().st_size for path in sidecar_dir.iterdir())
+        print(f"    sidecar size           {size / 1024 / 1024:>10.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
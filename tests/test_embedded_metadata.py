@@ -72,3 +72,66 @@ def test_image_detail_has_embedded_generation_panel(tmp_path, monkeypatch):
     assert 'id="embedded-model"' in body
     assert 'id="embedded-prompt"' in body
     assert "/api/image/embedded-metadata" in body
+
+
+def test_exif_header_reader_finds_sub_ifd_dates_without_reading_image_body(tmp_path, monkeypatch):
+    from tiklocal.services.embedded_metadata import read_exif_ascii_tags, read_jpeg_comments
+
+    image_path = tmp_path / "camera.jpg"
+    exif = Image.Exif()
+    exif[306] = "2021:01:02 03:04:05"
+    exif.get_ifd(0x8769)[36867] = "2020:05:06 07:08:09"
+    Image.effect_noise((512, 512), 64).convert("RGB").save(
+        image_path, format="JPEG", exif=exif, comment=b"Prompt: sunset | Model: demo"
+    )
+
+    read_sizes = []
+    original_open = type(image_path).open
+
+    def tracking_open(self, *args, **kwargs):
+        handle = original_open(self, *args, **kwargs)
+        original_read = handle.read
+
+        def read(size=-1):
+            read_sizes.append(size)
+            return original_read(size)
+
+        handle.read = read
+        return handle
+
+    monkeypatch.setattr(type(image_path), "open", tracking_open)
+
+    tags = read_exif_ascii_tags(image_path, {36867, 306})
+    comments = read_jpeg_comments(image_path)
+
+    assert tags == {36867: "2020:05:06 07:08:09", 306: "2021:01:02 03:04:05"}
+    assert comments == ["Prompt: sunset | Model: demo"]
+    assert -1 not in read_sizes
+    assert sum(read_sizes) < 4096 < image_path.stat().st_size
+    assert read_exif_ascii_tags(tmp_path / "missing.jpg", {306}) is None
+
+
+def test_jpeg_segment_reader_keeps_segments_read_before_an_io_error(tmp_path, monkeypatch):
+    from tiklocal.services.embedded_metadata import JPEG_COM, read_jpeg_segments
+
+    image_path = tmp_path / "share.jpg"
+    Image.new("RGB", (8, 8)).save(image_path, format="JPEG", comment=b"first")
+    original_open = type(image_path).open
+    opened = []
+
+    def failing_open(self, *args, **kwargs):
+        handle = original_open(self, *args, **kwargs)
+        opened.append(self)
+
+        def seek(offset, whence=0):
+            raise OSError(5, "Input/output error")
+
+        handle.seek = seek
+        return handle
+
+    monkeypatch.setattr(type(image_path), "open", failing_open)
+    # APP0 and COM are read; seeking over the next segment fails like EIO on a share.
+    segments = read_jpeg_segments(image_path, {0xE0, JPEG_COM})
+    assert (JPEG_COM, b"first") in segments
+    assert len(opened) == 1
+    assert read_jpeg_segments(tmp_path / "missing.jpg", {JPEG_COM}) is None
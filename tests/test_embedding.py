@@ -1,3 +1,4 @@
+import random
 from pathlib import Path
 from types import SimpleNamespace
 
@@ -8,13 +9,17 @@ from tiklocal.app import create_app
 from tiklocal.run import run_analyze_similar, run_vectorize
 from tiklocal.paths import get_database_path
 from tiklocal.services.database import AppDatabase
+import tiklocal.services.embedding as embedding_module
+import tiklocal.services.embedding_lsh as embedding_lsh_module
 from tiklocal.services.embedding import (
     EmbeddingConfigStore,
+    ImageVectorService,
     OpenAICompatibleImageEmbeddingClient,
     SQLiteImageVectorStore,
     validate_embedding_config,
 )
-from tiklocal.services.similarity import SQLiteSimilarityGroupStore
+import tiklocal.services.similarity as similarity_module
+from tiklocal.services.similarity import ImageSimilarityService, SQLiteSimilarityGroupStore
 
 
 class FakeVectorIndex:
@@ -61,6 +66,17 @@ class FakeVectorIndex:
         return result
 
 
+@pytest.fixture(params=["python", "numpy"])
+def backend(request, monkeypatch):
+    """Run a test once on the NumPy vector code and once on the pure Python fallback."""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(embedding_module, "np", None)
+        monkeypatch.setattr(embedding_lsh_module, "np", None)
+    return request.param
+
+
 def test_embedding_config_store_roundtrip(tmp_path):
     store = EmbeddingConfigStore(tmp_path / "embedding_config.json")
     assert store.get() is None
@@ -135,6 +151,12 @@ def test_embedding_config_validation():
     )
     assert "image_max_size" in error
 
+    validated, error = validate_embedding_config({"vector_encoding": "INT8"}, partial=True)
+    assert error is None
+    assert validated == {"vector_encoding": "int8"}
+    _, error = validate_embedding_config({"vector_encoding": "bfloat16"}, partial=True)
+    assert "vector_encoding" in error
+
 
 def test_openai_compatible_image_embedding_payload(tmp_path, monkeypatch):
     image_path = tmp_path / "photo.jpg"
@@ -221,6 +243,359 @@ def test_sqlite_image_vector_store_roundtrip(tmp_path):
     assert store.get_metadata("@default/b.jpg") is None
 
 
+def _vector_metadata(uri, dimensions, index=0):
+    return {
+        "source_id": "default",
+        "rel_path": uri.split("/", 1)[-1],
+        "model": "demo-embedding",
+        "dimensions": dimensions,
+        "image_max_size": 512,
+        "image_quality": 82,
+        "mtime": 10.0 + index,
+        "size_bytes": 100 + index,
+        "indexed_at": "2026-06-07T00:00:00Z",
+    }
+
+
+def test_query_similar_ranks_by_cosine_with_and_without_numpy(tmp_path, backend):
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = SQLiteImageVectorStore(database)
+    vectors = {
+        f"@default/{index}.jpg": [float((index * 7 + dim * 3) % 11) - 5.0 for dim in range(8)]
+        for index in range(40)
+    }
+    vectors["@default/zero.jpg"] = [0.0] * 8
+    for index, (uri, embedding) in enumerate(vectors.items()):
+        store.upsert_image(uri=uri, embedding=embedding, metadata=_vector_metadata(uri, 8, index))
+    store.upsert_image(
+        uri="@default/other-model.jpg",
+        embedding=vectors["@default/0.jpg"],
+        metadata=dict(_vector_metadata("@default/other-model.jpg", 8), model="other"),
+    )
+
+    def cosine(left, right):
+        dot = sum(a * b for a, b in zip(left, right))
+        return dot / (sum(a * a for a in left) ** 0.5 * sum(b * b for b in right) ** 0.5)
+
+    query = vectors["@default/3.jpg"]
+    expected = sorted(
+        (1.0 - cosine(query, embedding), uri)
+        for uri, embedding in vectors.items()
+        if uri not in {"@default/3.jpg", "@default/zero.jpg"}
+    )
+    similar = store.query_similar("@default/3.jpg", limit=5)
+
+    assert [item["distance"] for item in similar] == pytest.approx([distance for distance, _ in expected[:5]], abs=1e-5)
+    assert {item["uri"] for item in similar} <= {uri for _, uri in expected}
+    assert similar[0]["metadata"]["rel_path"] == similar[0]["uri"].split("/", 1)[-1]
+    assert len(store.query_similar("@default/3.jpg", limit=100)) == len(expected)
+    assert store.query_similar("@default/zero.jpg") == []
+
+
+def test_vector_matrix_cache_is_patched_and_invalidated(tmp_path, backend):
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = SQLiteImageVectorStore(database)
+    other_process = SQLiteImageVectorStore(database)
+    for index, embedding in enumerate(([1.0, 0.0], [0.0, 1.0], [0.7, 0.7])):
+        uri = f"@default/{index}.jpg"
+        store.upsert_image(uri=uri, embedding=embedding, metadata=_vector_metadata(uri, 2, index))
+
+    assert [item["uri"] for item in store.query_similar("@default/0.jpg")] == ["@default/2.jpg", "@default/1.jpg"]
+    matrix = store._matrices[("demo-embedding", 2)]
+
+    # Own writes patch the cached matrix in place.
+    store.upsert_image(uri="@default/3.jpg", embedding=[0.99, 0.01], metadata=_vector_metadata("@default/3.jpg", 2, 3))
+    store.delete(["@default/2.jpg"])
+    assert [item["uri"] for item in store.query_similar("@default/0.jpg")] == ["@default/3.jpg", "@default/1.jpg"]
+    assert store._matrices[("demo-embedding", 2)] is matrix
+    vectors = {item["uri"]: list(item["embedding"]) for item in store.list_vectors()}
+    assert vectors["@default/3.jpg"] == pytest.approx([0.99, 0.01], abs=1e-6)
+    assert store._matrices[("demo-embedding", 2)] is matrix
+    # Listed vectors are copies; changing one leaves the cached row alone.
+    store.list_vectors()[0]["embedding"][0] = 5.0
+    assert {item["uri"]: list(item["embedding"]) for item in store.list_vectors()} == vectors
+
+    # Writes that bypass this store bump the generation and force a rebuild.
+    other_process.upsert_image(uri="@default/1.jpg", embedding=[1.0, 0.0], metadata=_vector_metadata("@default/1.jpg", 2, 1))
+    similar = store.query_similar("@default/0.jpg")
+    assert similar[0]["uri"] == "@default/1.jpg"
+    assert similar[0]["distance"] == pytest.approx(0.0, abs=1e-6)
+    assert store._matrices[("demo-embedding", 2)] is not matrix
+
+    # Moving a vector to another model takes it out of the old matrix.
+    store.upsert_image(
+        uri="@default/1.jpg",
+        embedding=[1.0, 0.0],
+        metadata=dict(_vector_metadata("@default/1.jpg", 2, 1), model="other"),
+    )
+    assert [item["uri"] for item in store.query_similar("@default/0.jpg")] == ["@default/3.jpg"]
+
+
+def test_lsh_candidates_keep_recall_and_follow_writes(tmp_path, monkeypatch, backend):
+    monkeypatch.setattr(embedding_module, "LSH_MIN_ROWS", 0)
+    monkeypatch.setattr(embedding_module, "LSH_MIN_ROWS_NUMPY", 0)
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = SQLiteImageVectorStore(database)
+    rng = random.Random(7)
+    vectors = {}
+    for cluster in range(20):
+        center = [rng.gauss(0, 1) for _ in range(32)]
+        for member in range(10):
+            vectors[f"@default/{cluster}-{member}.jpg"] = [value + rng.gauss(0, 0.15) for value in center]
+    for index, (uri, embedding) in enumerate(vectors.items()):
+        store.upsert_image(uri=uri, embedding=embedding, metadata=_vector_metadata(uri, 32, index))
+
+    def exact(uri, limit):
+        query = vectors[uri]
+
+        def cosine(other):
+            dot = sum(a * b for a, b in zip(query, other))
+            return dot / (sum(a * a for a in query) ** 0.5 * sum(b * b for b in other) ** 0.5)
+
+        ranked = sorted((candidate for candidate in vectors if candidate != uri), key=lambda item: -cosine(vectors[item]))
+        return set(ranked[:limit])
+
+    queries = [f"@default/{cluster}-0.jpg" for cluster in range(20)]
+    found = sum(len({item["uri"] for item in store.query_similar(uri, limit=5)} & exact(uri, 5)) for uri in queries)
+    assert found / (5 * len(queries)) >= 0.9
+    matrix = store._matrices[("demo-embedding", 32)]
+    assert len(matrix.lsh.candidates(queries[0])) < len(vectors) - 1
+
+    with database.connect(read_only=True) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM image_vector_lsh").fetchone()[0] == len(vectors)
+    store.delete([queries[0]])
+    with database.connect(read_only=True) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM image_vector_lsh").fetchone()[0] == len(vectors) - 1
+
+    # Vectors stored before the index existed fall back to exact search until backfilled.
+    with database.connect() as conn:
+        conn.execute("DELETE FROM image_vector_lsh WHERE uri LIKE '@default/1-%'")
+    fresh = SQLiteImageVectorStore(database)
+    assert {item["uri"] for item in fresh.query_similar(queries[1], limit=5)} == exact(queries[1], 5)
+    assert len(fresh._matrices[("demo-embedding", 32)].lsh) < len(vectors) - 1
+    assert fresh.build_ann_index(batch_size=7) == 10
+    assert fresh.build_ann_index() == 0
+    fresh.query_similar(queries[1], limit=5)
+    assert len(fresh._matrices[("demo-embedding", 32)].lsh) == len(vectors) - 1
+
+
+def _clustered_vectors(clusters=12, members=6, dimensions=16, noise=0.3):
+    rng = random.Random(11)
+    vectors = []
+    for cluster in range(clusters):
+        center = [rng.gauss(0, 1) for _ in range(dimensions)]
+        for member in range(members):
+            embedding = [value + rng.gauss(0, noise) for value in center]
+            uri = f"@default/{cluster}-{member}.jpg"
+            vectors.append({
+                "uri": uri,
+                "embedding": embedding,
+                "embedding_norm": sum(value * value for value in embedding) ** 0.5,
+                "metadata": {"uri": uri},
+            })
+    rng.shuffle(vectors)
+    vectors.append({"uri": "@default/blank.jpg", "embedding": [0.0] * dimensions, "embedding_norm": 0.0, "metadata": {}})
+    return vectors
+
+
+def test_similarity_graph_matches_pairwise_scan_with_and_without_numpy(monkeypatch):
+    pytest.importorskip("numpy")
+    vectors = _clustered_vectors()
+    service = ImageSimilarityService(None, None)
+    expected_pairs = {
+        threshold: sum(
+            1
+            for index, left in enumerate(vectors)
+            for right in vectors[index + 1:]
+            if similarity_module.cosine_similarity(left, right) >= threshold
+        )
+        for threshold in similarity_module.DEFAULT_PROFILE_THRESHOLDS
+    }
+
+    results = {}
+    for backend in ("numpy", "python"):
+        if backend == "python":
+            monkeypatch.setattr(similarity_module, "np", None)
+        # Small blocks so the matrix path crosses several block boundaries.
+        monkeypatch.setattr(similarity_module, "SIMILARITY_BLOCK_ELEMENTS", 100)
+        profile = service.profile_thresholds(vectors=vectors, min_group_size=2, max_group_size=4)
+        assert {item["threshold"]: item["candidate_pairs"] for item in profile} == expected_pairs
+        groups = service.build_groups(vectors=vectors, limit=0, threshold=0.8, max_group_size=4)
+        assert groups["total"] == len(groups["items"]) > 0
+        results[backend] = [group["group_key"] for group in groups["items"]]
+        for group in groups["items"]:
+            assert 2 <= group["count"] <= 4
+            assert len({item["uri"].split("-")[0] for item in group["items"]}) == 1
+    assert results["numpy"] == results["python"]
+
+
+def test_update_groups_folds_new_vectors_into_saved_groups(tmp_path):
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    vector_store = SQLiteImageVectorStore(database)
+    group_store = SQLiteSimilarityGroupStore(database)
+    service = ImageSimilarityService(None, vector_store)
+
+    def add(name, embedding, indexed_at):
+        uri = f"@default/{name}.jpg"
+        metadata = dict(_vector_metadata(uri, 3), indexed_at=indexed_at)
+        vector_store.upsert_image(uri=uri, embedding=embedding, metadata=metadata)
+
+    add("a1", [1.0, 0.0, 0.0], "2026-01-01T00:00:00Z")
+    add("a2", [0.99, 0.1, 0.0], "2026-01-01T00:00:01Z")
+    add("b1", [0.8, 0.6, 0.0], "2026-01-01T00:00:02Z")
+    add("b2", [0.78, 0.62, 0.0], "2026-01-01T00:00:03Z")
+    # Nothing happens before a full analysis has saved groups.
+    assert service.update_groups(group_store)["processed"] == 0
+
+    watermark = vector_store.latest_indexed_at()
+    payload = service.build_groups(vectors=vector_store.list_vectors(limit=0), limit=0, threshold=0.9)
+    group_store.save_groups(payload["items"], threshold=0.9, min_group_size=2, max_group_size=8, watermark=watermark)
+    assert group_store.list_groups()["total"] == 2
+
+    add("m", [0.95, 0.31, 0.0], "2026-01-02T00:00:00Z")
+    add("c1", [0.0, 0.0, 1.0], "2026-01-02T00:00:01Z")
+    add("c2", [0.0, 0.05, 1.0], "2026-01-02T00:00:02Z")
+    result = service.update_groups(group_store)
+
+    assert result["processed"] == 3
+    assert result["merged"] == 1
+    assert result["created"] == 1
+    groups = group_store.list_groups()["items"]
+    assert sorted(sorted(item["uri"].split("/")[1] for item in group["items"]) for group in groups) == [
+        ["a1.jpg", "a2.jpg", "b1.jpg", "b2.jpg", "m.jpg"],
+        ["c1.jpg", "c2.jpg"],
+    ]
+    assert all(group["threshold"] == 0.9 for group in groups)
+    assert group_store.state()["watermark"] == "2026-01-02T00:00:02Z"
+    assert service.update_groups(group_store)["processed"] == 0
+
+    group_store.clear()
+    assert group_store.state() is None
+
+
+def test_quantized_vectors_decode_into_the_same_ranking(tmp_path, backend):
+    vectors = {item["uri"]: item["embedding"] for item in _clustered_vectors(clusters=6, members=4, dimensions=24)}
+    vectors.pop("@default/blank.jpg")
+    rankings = {}
+    for encoding in ("float32", "float16", "int8"):
+        database = AppDatabase(tmp_path / f"{encoding}.sqlite3")
+        database.migrate()
+        store = SQLiteImageVectorStore(database)
+        for index, (uri, embedding) in enumerate(vectors.items()):
+            metadata = dict(_vector_metadata(uri, 24, index), vector_encoding=encoding)
+            store.upsert_image(uri=uri, embedding=embedding, metadata=metadata)
+        with database.connect(read_only=True) as conn:
+            row = conn.execute("SELECT embedding, embedding_encoding FROM image_vectors LIMIT 1").fetchone()
+        assert row["embedding_encoding"] == encoding
+        assert len(row["embedding"]) == 24 * {"float32": 4, "float16": 2, "int8": 1}[encoding]
+        assert store.get_metadata("@default/0-0.jpg")["vector_encoding"] == encoding
+
+        # A fresh store decodes from SQLite rather than reusing the patched matrix.
+        fresh = SQLiteImageVectorStore(database)
+        rankings[encoding] = {uri: [item["uri"] for item in fresh.query_similar(uri, limit=3)] for uri in vectors}
+        decoded = {item["uri"]: list(item["embedding"]) for item in fresh.list_vectors(limit=0)}
+        tolerance = {"float32": 1e-6, "float16": 2e-3, "int8": 0.05}[encoding]
+        for uri, embedding in vectors.items():
+            assert decoded[uri] == pytest.approx(embedding, abs=tolerance * max(abs(value) for value in embedding))
+
+    for encoding in ("float16", "int8"):
+        for uri, ranked in rankings["float32"].items():
+            assert set(rankings[encoding][uri]) == set(ranked)
+
+
+def test_reencode_converts_stored_vectors_without_the_embedding_api(tmp_path, backend):
+    vectors = {item["uri"]: item["embedding"] for item in _clustered_vectors(clusters=4, members=3, dimensions=16)}
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = SQLiteImageVectorStore(database)
+    for index, (uri, embedding) in enumerate(vectors.items()):
+        store.upsert_image(uri=uri, embedding=embedding, metadata=_vector_metadata(uri, 16, index))
+    before = {uri: [item["uri"] for item in store.query_similar(uri, limit=2)] for uri in vectors}
+    service = ImageVectorService(None, store)
+
+    assert store.pending_reencode("int8") == len(vectors)
+    assert service.reencode({"vector_encoding": "int8"}) == len(vectors)
+    assert service.reencode({"vector_encoding": "int8"}) == 0
+    with database.connect(read_only=True) as conn:
+        assert {tuple(row) for row in conn.execute("SELECT embedding_encoding, length(embedding) FROM image_vectors")} == {
+            ("int8", 16),
+        }
+        assert conn.execute("SELECT COUNT(*) FROM image_vector_lsh").fetchone()[0] == len(vectors) - 1
+    # The cached matrix follows the generation bump, so queries see the new rows.
+    assert {uri: [item["uri"] for item in store.query_similar(uri, limit=2)] for uri in vectors} == before
+    assert store.get_metadata("@default/0-0.jpg")["vector_encoding"] == "int8"
+
+
+def test_vector_sidecar_follows_writes_and_compacts(tmp_path, monkeypatch):
+    np = pytest.importorskip("numpy")
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    sidecar_dir = tmp_path / "vectors"
+    store = SQLiteImageVectorStore(database, sidecar_dir=sidecar_dir)
+    vectors = {item["uri"]: item["embedding"] for item in _clustered_vectors(clusters=4, members=3, dimensions=8)}
+    vectors.pop("@default/blank.jpg")
+    for index, (uri, embedding) in enumerate(vectors.items()):
+        store.upsert_image(uri=uri, embedding=embedding, metadata=_vector_metadata(uri, 8, index))
+    # Reads never write the sidecar; compaction does.
+    store.query_similar("@default/0-0.jpg")
+    assert not sidecar_dir.exists()
+    assert store.compact_sidecars() == 1
+    assert store.compact_sidecars() == 0
+
+    # Writes after the sidecar was written are appended to it.
+    vectors["@default/0-1.jpg"] = vectors["@default/1-1.jpg"]
+    store.upsert_image(uri="@default/0-1.jpg", embedding=vectors["@default/0-1.jpg"], metadata=_vector_metadata("@default/0-1.jpg", 8, 1))
+    store.delete(["@default/2-2.jpg"])
+    vectors.pop("@default/2-2.jpg")
+    expected = {uri: [item["uri"] for item in store.query_similar(uri, limit=4)] for uri in vectors}
+
+    def from_sqlite(*args):
+        raise AssertionError("matrix should come from the sidecar")
+
+    fresh = SQLiteImageVectorStore(database, sidecar_dir=sidecar_dir)
+    monkeypatch.setattr(fresh, "_load_matrix", from_sqlite)
+    assert {uri: [item["uri"] for item in fresh.query_similar(uri, limit=4)] for uri in vectors} == expected
+    decoded = {item["uri"]: list(item["embedding"]) for item in fresh.list_vectors(limit=0)}
+    for uri, embedding in vectors.items():
+        assert decoded[uri] == pytest.approx(embedding, abs=1e-5)
+
+    # Compaction drops the replaced and deleted rows; the result maps without a copy.
+    assert store._sidecar.row_count("demo-embedding", 8) == len(vectors) + 2
+    assert store.compact_sidecars() == 1
+    assert store._sidecar.row_count("demo-embedding", 8) == len(vectors)
+    fresh = SQLiteImageVectorStore(database, sidecar_dir=sidecar_dir)
+    monkeypatch.setattr(fresh, "_load_matrix", from_sqlite)
+    assert fresh.query_similar("@default/0-0.jpg", limit=4) == store.query_similar("@default/0-0.jpg", limit=4)
+    assert isinstance(fresh._matrices[("demo-embedding", 8)]._vectors, np.memmap)
+
+    # A write the sidecar did not see makes it stale: cold loads read SQLite
+    # without rewriting it until the next compaction.
+    SQLiteImageVectorStore(database).delete(["@default/0-0.jpg"])
+    fresh = SQLiteImageVectorStore(database, sidecar_dir=sidecar_dir)
+    assert "@default/0-0.jpg" not in {item["uri"] for item in fresh.query_similar("@default/0-2.jpg", limit=20)}
+    assert fresh._sidecar.row_count("demo-embedding", 8) == len(vectors)
+    assert fresh.compact_sidecars() == 1
+    assert fresh._sidecar.row_count("demo-embedding", 8) == len(vectors) - 1
+
+    # A torn append is never trusted.
+    _, index_path = fresh._sidecar.paths("demo-embedding", 8)
+    with index_path.open("a", encoding="utf-8") as handle:
+        handle.write('[99, "@default/x.jpg", 0')
+    assert fresh._sidecar.load("demo-embedding", 8, fresh._generation) is None
+
+    # Sidecars of models no longer stored are removed.
+    with database.connect() as conn:
+        conn.execute("UPDATE image_vectors SET model = 'other'")
+    store.compact_sidecars()
+    assert {path.name for path in sidecar_dir.iterdir()} == {
+        path.name for path in store._sidecar.paths("other", 8)
+    }
+
+
 @pytest.fixture
 def embedding_client(tmp_path, monkeypatch):
     media_root = tmp_path / "media"
@@ -1,15 +1,22 @@
+import json
 import os
+import time
 from io import BytesIO
 from urllib.parse import quote
 
 import pytest
 from PIL import Image
 
+import tiklocal.services.database as database_module
 import tiklocal.services.library_index as library_index_module
 from tiklocal.app import create_app
+from tiklocal.run import resolve_library_index_workers
 from tiklocal.services import LibraryService
 from tiklocal.services.database import AppDatabase
 from tiklocal.services.library_index import MediaIndexStore
+from tiklocal.services.media_probe import MediaProbeCache
+from tiklocal.services.metadata import ImageMetadataStore
+from tiklocal.services.radio import RadioService
 
 
 @pytest.fixture
@@ -314,6 +321,230 @@ def test_api_library_items_no_duplicates_across_offsets(client):
         offset = int(data["next_offset"])
 
 
+def test_api_library_items_cursor_matches_offset_pages(client):
+    first = client.get("/api/library/items?scope=all&mode=all&limit=12").get_json()["data"]
+    assert first["has_more"] is True
+    assert first["next_cursor"]
+
+    res = client.get(f"/api/library/items?scope=all&mode=all&limit=12&cursor={first['next_cursor']}")
+    cursor_page = res.get_json()["data"]
+    offset_page = client.get("/api/library/items?scope=all&mode=all&limit=12&offset=12").get_json()["data"]
+
+    assert [item["name"] for item in cursor_page["items"]] == [item["name"] for item in offset_page["items"]]
+    assert cursor_page["total"] == first["total"] == 13
+    assert cursor_page["offset"] == 12
+    assert cursor_page["has_more"] is False
+    assert cursor_page["next_cursor"] == ""
+
+    garbage = client.get("/api/library/items?scope=all&mode=all&limit=12&cursor=not-a-cursor").get_json()["data"]
+    assert [item["name"] for item in garbage["items"]] == [item["name"] for item in first["items"]]
+
+
+def test_media_index_cursor_breaks_mtime_ties_by_uri(tmp_path):
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = MediaIndexStore(database)
+    store.replace_snapshot([
+        {
+            "uri": f"@default/{index:02d}.jpg",
+            "source_id": "default",
+            "rel_path": f"{index:02d}.jpg",
+            "filename": f"{index:02d}.jpg",
+            "parent_path": ".",
+            "media_type": "image",
+            "extension": ".jpg",
+            "size_bytes": 1,
+            "mtime": 1_700_000_000.0 + index // 5,
+        }
+        for index in range(23)
+    ])
+
+    names = []
+    cursor = ""
+    while True:
+        page = store.page(limit=4, cursor=cursor)
+        names.extend(record["name"] for record in page["records"])
+        assert page["total"] == 23
+        if not page["has_more"]:
+            break
+        cursor = page["next_cursor"]
+
+    assert names == [record["name"] for record in store.page(limit=96)["records"]]
+    assert len(set(names)) == 23
+
+
+def test_media_index_search_matches_captions_tags_and_renames(tmp_path):
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = MediaIndexStore(database)
+
+    def record(rel_path, mtime):
+        return {
+            "uri": f"@default/{rel_path}",
+            "source_id": "default",
+            "rel_path": rel_path,
+            "filename": rel_path.rsplit("/", 1)[-1],
+            "parent_path": rel_path.rsplit("/", 1)[0] if "/" in rel_path else ".",
+            "media_type": "image",
+            "extension": ".jpg",
+            "size_bytes": 1,
+            "mtime": mtime,
+        }
+
+    store.replace_snapshot([
+        record("trips/beach.jpg", 1.0),
+        record("trips/Sunset-Beach.jpg", 2.0),
+        record("cats/a.jpg", 3.0),
+    ])
+    ImageMetadataStore(database).set("@default/cats/a.jpg", {"title": "窗边晒太阳的猫", "tags": ["猫", "午后"]})
+
+    def names(**kwargs):
+        return [item["name"] for item in store.page(**kwargs)["records"]]
+
+    # Filename hits outrank folder-only hits; matching ignores case.
+    assert names(search="BEACH") == ["@default/trips/beach.jpg", "@default/trips/Sunset-Beach.jpg"]
+    assert names(search="trips sunset") == ["@default/trips/Sunset-Beach.jpg"]
+    assert names(search="晒太阳") == ["@default/cats/a.jpg"]
+    assert names(search="猫") == ["@default/cats/a.jpg"]
+    assert [item["name"] for item in store.records(search="午后")] == ["@default/cats/a.jpg"]
+    # Upgraded databases copy captions already in media_meta once, in the migration.
+    with database.connect() as conn:
+        conn.execute("UPDATE media_search_text SET caption = '', tags = ''")
+        database_module._migrate_023_sync_media_search_text(conn)
+    assert names(search="晒太阳") == ["@default/cats/a.jpg"]
+    assert names(search="午后") == ["@default/cats/a.jpg"]
+
+    store.replace_snapshot([record("trips/beach.jpg", 1.0), record("pets/a.jpg", 3.0)])
+    assert names(search="trips") == ["@default/trips/beach.jpg"]
+    assert names(search="pets") == ["@default/pets/a.jpg"]
+    assert names(search="猫") == []
+
+
+def test_media_index_search_falls_back_to_like_without_fts5(tmp_path, monkeypatch):
+    import dataclasses
+    import sqlite3
+
+    class NoFts5:
+        """Connection that fails like a libsqlite3 built without FTS5."""
+
+        def __init__(self, conn):
+            self._conn = conn
+
+        def execute(self, sql, *args):
+            if "fts5" in sql:
+                raise sqlite3.OperationalError("no such module: fts5")
+            return self._conn.execute(sql, *args)
+
+    migrations = [
+        dataclasses.replace(migration, up=lambda conn, up=migration.up: up(NoFts5(conn)))
+        if migration.version == 11 else migration
+        for migration in database_module.MIGRATIONS
+    ]
+    monkeypatch.setattr(database_module, "MIGRATIONS", migrations)
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = MediaIndexStore(database)
+    assert not store._has_full_text()
+
+    def record(rel_path, mtime):
+        return {
+            "uri": f"@default/{rel_path}",
+            "source_id": "default",
+            "rel_path": rel_path,
+            "filename": rel_path.rsplit("/", 1)[-1],
+            "parent_path": rel_path.rsplit("/", 1)[0],
+            "media_type": "image",
+            "extension": ".jpg",
+            "size_bytes": 1,
+            "mtime": mtime,
+        }
+
+    store.replace_snapshot([record("trips/beach.jpg", 1.0), record("trips/Sunset-Beach.jpg", 2.0), record("cats/a.jpg", 3.0)])
+    ImageMetadataStore(database).set("@default/cats/a.jpg", {"title": "窗边晒太阳的猫", "tags": ["猫"]})
+
+    def names(**kwargs):
+        return [item["name"] for item in store.page(**kwargs)["records"]]
+
+    assert names(search="BEACH") == ["@default/trips/Sunset-Beach.jpg", "@default/trips/beach.jpg"]
+    assert names(search="晒太阳") == ["@default/cats/a.jpg"]
+    store.upsert([record("trips/sunset2.jpg", 4.0)])
+    assert store.delete("@default/trips/beach.jpg")
+    assert [item["name"] for item in store.records(search="sunset")] == [
+        "@default/trips/sunset2.jpg",
+        "@default/trips/Sunset-Beach.jpg",
+    ]
+
+
+def test_month_rollups_follow_incremental_writes(tmp_path):
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = MediaIndexStore(database)
+
+    def record(index, month, media_type="image"):
+        return {
+            "uri": f"@default/{index}.jpg",
+            "source_id": "default",
+            "rel_path": f"{index}.jpg",
+            "filename": f"{index}.jpg",
+            "parent_path": ".",
+            "media_type": media_type,
+            "extension": ".jpg",
+            "size_bytes": 1,
+            "mtime": 1_700_000_000.0 + index,
+            "captured_at": 1_700_000_000.0 + index,
+            "captured_local_date": f"{month}-01T00:00:00",
+        }
+
+    def summary():
+        return [
+            (month["key"], month["count"], month["image_count"], month["video_count"], len(month["records"]))
+            for month in store.timeline_months(limit=36, preview_limit=3)["months"]
+        ]
+
+    def aggregated():
+        with database.connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT capture_month, COUNT(*),
+                  SUM(media_type = 'image'), SUM(media_type = 'video'), MIN(COUNT(*), 3)
+                FROM media_items WHERE media_type IN ('image', 'video')
+                GROUP BY capture_month ORDER BY capture_month DESC
+                """
+            ).fetchall()
+        return [tuple(row) for row in rows]
+
+    store.replace_snapshot([record(index, f"2024-0{index % 3 + 1}", ("image", "video")[index % 2]) for index in range(9)])
+    assert summary() == aggregated()
+    assert [year["count"] for year in store.timeline_months()["years"]] == [9]
+
+    store.upsert([record(0, "2023-12"), record(20, "2024-05", "video")])
+    store.delete("@default/3.jpg")
+    store.replace_snapshot([
+        record(index, f"2024-0{index % 3 + 1}", ("image", "video")[index % 2])
+        for index in range(9)
+        if index not in {0, 3, 4}
+    ] + [record(0, "2023-12"), record(20, "2024-05", "video")])
+    assert summary() == aggregated()
+    assert [(year["year"], year["count"], year["month_count"]) for year in store.timeline_months()["years"]] == [
+        ("2024", 7, 4),
+        ("2023", 1, 1),
+    ]
+
+    # The migration's own backfill builds the same rows as the live write path,
+    # including the video cap and image fill of a month with many covers.
+    store.upsert([record(100 + index, "2022-06", "image" if index % 6 == 0 else "video") for index in range(30)])
+    with database.connect(read_only=True) as conn:
+        covers = json.loads(conn.execute("SELECT covers FROM media_month_rollups WHERE capture_month = '2022-06'").fetchone()[0])
+    assert len(covers) == 18
+    assert sum(cover["media_type"] == "video" for cover in covers) == 13
+    with database.connect() as conn:
+        live = [tuple(row) for row in conn.execute("SELECT * FROM media_month_rollups ORDER BY capture_month")]
+        conn.execute("DELETE FROM media_month_rollups")
+        database_module._migrate_012_create_media_month_rollups(conn)
+        backfilled = [tuple(row) for row in conn.execute("SELECT * FROM media_month_rollups ORDER BY capture_month")]
+    assert backfilled == live
+
+
 def test_api_library_items_dedupes_symlink_aliases(tmp_path, monkeypatch):
     media_root = tmp_path / "media"
     media_root.mkdir(parents=True, exist_ok=True)
@@ -399,7 +630,7 @@ def test_startup_resyncs_existing_media_index(tmp_path, monkeypatch):
     assert app.extensions["media_index_sync"]["deleted"] == 1
 
 
-def test_startup_preserves_index_for_unavailable_media_source(tmp_path):
+def test_startup_preserves_index_for_unavailable_media_source(tmp_path, caplog):
     default_root = tmp_path / "default"
     extra_root = tmp_path / "extra"
     default_root.mkdir()
@@ -428,6 +659,14 @@ def test_startup_preserves_index_for_unavailable_media_source(tmp_path):
     assert names == {"@photos/photo.jpg"}
     assert app.extensions["media_index_sync"]["unavailable_sources"] == ["photos"]
 
+    # The background startup sync logs the same warning once it finishes.
+    caplog.clear()
+    create_app({**config, "LIBRARY_SYNC_MODE": "background"})
+    deadline = time.monotonic() + 5
+    while not caplog.records and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert [record.getMessage() for record in caplog.records] == ["媒体源不可用，已保留其现有索引: photos"]
+
 
 def test_library_images_use_bounded_cached_thumbnails(tmp_path, monkeypatch):
     media_root = tmp_path / "media"
@@ -505,6 +744,231 @@ def test_favorite_scope_and_detail_links(client):
     assert any(item["detail_url"] == "/image?uri=%40default/i01.jpg" for item in data["items"])
 
 
+def test_favorites_json_is_imported_once_and_paged_in_sql(tmp_path, monkeypatch):
+    media_root = tmp_path / "media"
+    media_root.mkdir()
+    for index in range(30):
+        path = media_root / f"i{index:02d}.jpg"
+        path.write_bytes(b"00")
+        os.utime(path, (1_700_000_000 + index, 1_700_000_000 + index))
+    data_root = tmp_path / "tiklocal-data"
+    data_root.mkdir()
+    (data_root / "favorites.json").write_text(
+        json.dumps([f"@default/i{index:02d}.jpg" for index in range(0, 30, 2)]),
+        encoding="utf-8",
+    )
+    (media_root / "favorite.json").write_text(json.dumps(["i01.jpg"]), encoding="utf-8")
+    monkeypatch.setenv("MEDIA_ROOT", str(media_root))
+    monkeypatch.setenv("TIKLOCAL_INSTANCE", str(data_root))
+
+    client = create_app({"TESTING": True, "MEDIA_ROOT": media_root}).test_client()
+    first = client.get("/api/library/items?scope=favorite&limit=12").get_json()["data"]
+    assert first["total"] == 16
+    assert first["has_more"] is True
+    rest = client.get(
+        f"/api/library/items?scope=favorite&limit=12&cursor={first['next_cursor']}"
+    ).get_json()["data"]
+    names = [item["name"] for item in first["items"] + rest["items"]]
+    assert len(set(names)) == 16 and "@default/i01.jpg" in names
+
+    assert client.post("/api/favorite/i00.jpg").get_json()["favorite"] is False
+    restarted = create_app({"TESTING": True, "MEDIA_ROOT": media_root}).test_client()
+    assert restarted.get("/api/favorite/i00.jpg").get_json()["favorite"] is False
+    assert restarted.get("/api/library/items?scope=favorite&limit=12").get_json()["data"]["total"] == 15
+
+
+def test_collections_json_is_imported_once_and_paged_in_sql(tmp_path, monkeypatch):
+    media_root = tmp_path / "media"
+    media_root.mkdir()
+    for index in range(20):
+        (media_root / f"c{index:02d}.jpg").write_bytes(b"00")
+    data_root = tmp_path / "tiklocal-data"
+    data_root.mkdir()
+    (data_root / "collections.json").write_text(
+        json.dumps({
+            "version": 1,
+            "collections": [{
+                "id": "col_legacy",
+                "name": "旧集合",
+                "created_at": "2024-01-01T00:00:00Z",
+                "items": [
+                    {"uri": f"@default/c{index:02d}.jpg", "added_at": "2024-01-01T00:00:00Z"}
+                    for index in range(20)
+                ],
+            }],
+        }),
+        encoding="utf-8",
+    )
+    monkeypatch.setenv("MEDIA_ROOT", str(media_root))
+    monkeypatch.setenv("TIKLOCAL_INSTANCE", str(data_root))
+
+    client = create_app({"TESTING": True, "MEDIA_ROOT": media_root}).test_client()
+    first = client.get("/api/library/items?scope=collection&collection_id=col_legacy&limit=12").get_json()["data"]
+    assert first["total"] == 20
+    assert first["items"][0]["name"] == "@default/c19.jpg"
+    rest = client.get(
+        f"/api/library/items?scope=collection&collection_id=col_legacy&limit=12&cursor={first['next_cursor']}"
+    ).get_json()["data"]
+    assert [item["name"] for item in first["items"] + rest["items"]] == [
+        f"@default/c{index:02d}.jpg" for index in reversed(range(20))
+    ]
+
+    removed = client.delete("/api/collections/col_legacy/items", json={"uris": ["@default/c19.jpg"]})
+    assert removed.get_json()["data"]["item"]["cover_uri"] == "@default/c18.jpg"
+    restarted = create_app({"TESTING": True, "MEDIA_ROOT": media_root}).test_client()
+    summary = restarted.get("/api/collections/col_legacy").get_json()["data"]["item"]
+    assert summary["item_count"] == 19
+    by_media = restarted.get("/api/collections/by-media?uri=@default/c00.jpg").get_json()["data"]["items"]
+    assert [item["id"] for item in by_media] == ["col_legacy"]
+
+
+def test_metadata_json_is_imported_into_media_meta(tmp_path, monkeypatch):
+    media_root = tmp_path / "media"
+    media_root.mkdir()
+    (media_root / "sized.jpg").write_bytes(b"00")
+    Image.new("RGB", (64, 48)).save(media_root / "unsized.jpg", format="JPEG")
+    data_root = tmp_path / "tiklocal-data"
+    data_root.mkdir()
+    metadata_path = data_root / "metadata.json"
+    metadata_path.write_text(
+        json.dumps({
+            "sized.jpg": {
+                "title": "海边日落",
+                "tags": ["海", "日落"],
+                "media_meta": {"type": "image", "width": 1200, "height": 800},
+            },
+            # The canonical key wins over the legacy key of the same file.
+            "unsized.jpg": {"title": "旧标题", "tags": ["旧"]},
+            "@default/unsized.jpg": {"title": "新标题", "tags": ["新"]},
+        }),
+        encoding="utf-8",
+    )
+    monkeypatch.setenv("MEDIA_ROOT", str(media_root))
+    monkeypatch.setenv("TIKLOCAL_INSTANCE", str(data_root))
+
+    client = create_app({"TESTING": True, "MEDIA_ROOT": media_root}).test_client()
+    items = {
+        item["name"]: item
+        for item in client.get("/api/library/items?limit=12").get_json()["data"]["items"]
+    }
+    assert (items["@default/sized.jpg"]["width"], items["@default/sized.jpg"]["height"]) == (1200, 800)
+    # Without the background probe, serialization leaves unknown dimensions empty.
+    assert items["@default/unsized.jpg"]["width"] is None
+
+    metadata = client.get("/api/image/metadata?uri=sized.jpg").get_json()["data"]
+    assert metadata["title"] == "海边日落"
+    assert client.get("/api/image/metadata?uri=unsized.jpg").get_json()["data"]["title"] == "新标题"
+    search = client.get("/api/library/items?q=日落").get_json()["data"]
+    assert [item["name"] for item in search["items"]] == ["@default/sized.jpg"]
+
+    metadata_path.write_text("{}", encoding="utf-8")
+    restarted = create_app({"TESTING": True, "MEDIA_ROOT": media_root, "LIBRARY_PROBE": True}).test_client()
+    deadline = time.monotonic() + 5
+    while restarted.get("/api/library/stats").get_json()["sync"]["probe"]["running"] and time.monotonic() < deadline:
+        time.sleep(0.02)
+    items = {
+        item["name"]: item
+        for item in restarted.get("/api/library/items?limit=12").get_json()["data"]["items"]
+    }
+    assert (items["@default/sized.jpg"]["width"], items["@default/sized.jpg"]["height"]) == (1200, 800)
+    assert (items["@default/unsized.jpg"]["width"], items["@default/unsized.jpg"]["height"]) == (64, 48)
+    assert restarted.get("/api/image/metadata?uri=sized.jpg").get_json()["data"]["title"] == "海边日落"
+
+
+def test_media_probe_pass_is_resumable_and_versioned(tmp_path, monkeypatch):
+    media_root = tmp_path / "media"
+    media_root.mkdir()
+    for index in range(5):
+        (media_root / f"p{index}.mp4").write_bytes(b"video")
+    (media_root / "song.mp3").write_bytes(b"audio")
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = MediaIndexStore(database)
+    probed = []
+
+    def fake_ffprobe(path):
+        probed.append(path.name)
+        if path.suffix == ".mp3":
+            return {"format": {"duration": "61.0", "tags": {"title": "歌名"}}, "streams": []}
+        return {
+            "format": {"duration": "12.5"},
+            "streams": [{"codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080}],
+        }
+
+    probe_cache = MediaProbeCache(database, probe=fake_ffprobe)
+    indexer = library_index_module.LibraryIndexer(
+        LibraryService(media_root),
+        store,
+        capture_workers=2,
+        probe_cache=probe_cache,
+    )
+    indexer.sync()
+    monkeypatch.setattr(library_index_module, "PROBE_BATCH_SIZE", 2)
+
+    assert indexer.probe_media() == 6
+    assert sorted(probed) == [f"p{index}.mp4" for index in range(5)] + ["song.mp3"]
+    assert indexer.probe_media() == 0
+    record = store.records_for_uris(["@default/p0.mp4"])[0]
+    assert (record["width"], record["height"]) == (1920, 1080)
+
+    # Radio metadata reads the cached ffprobe output instead of probing again.
+    radio = RadioService(LibraryService(media_root), None, probe_cache=probe_cache)
+    metadata = radio.metadata_for(media_root / "song.mp3")
+    assert (metadata.title, metadata.duration) == ("歌名", 61.0)
+    assert len(probed) == 6
+
+    path = media_root / "p3.mp4"
+    path.write_bytes(b"longer video")
+    os.utime(path, (1_800_000_000, 1_800_000_000))
+    indexer.sync(full=True)
+    probed.clear()
+    assert indexer.probe_media() == 1
+    assert probed == ["p3.mp4"]
+
+    # A new probe version re-reads media_meta from the cache without running ffprobe.
+    monkeypatch.setattr(library_index_module, "MEDIA_PROBE_VERSION", 2)
+    assert indexer.probe_media() == 6
+    assert probed == ["p3.mp4"]
+    with database.connect(read_only=True) as conn:
+        row = conn.execute("SELECT * FROM media_meta WHERE uri = '@default/p3.mp4'").fetchone()
+    assert (row["duration"], row["codec"], row["probe_version"]) == (12.5, "h264", 2)
+    assert indexer.progress()["probe"]["probed"] == 6
+
+
+def test_thumbnails_reuse_probe_cache_of_configured_sources(tmp_path, monkeypatch):
+    import tiklocal.thumbs as thumbs_module
+    from tiklocal.services import build_media_sources
+
+    monkeypatch.setenv("TIKLOCAL_INSTANCE", str(tmp_path / "data"))
+    media_root = tmp_path / "media"
+    media_root.mkdir()
+    for index in range(3):
+        (media_root / f"p{index}.mp4").write_bytes(b"video")
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    probed = []
+
+    def fake_ffprobe(path):
+        probed.append(path.name)
+        return {"format": {"duration": "12.5"}, "streams": [{"codec_type": "video", "width": 640, "height": 360}]}
+
+    probe_cache = MediaProbeCache(database, probe=fake_ffprobe)
+    library = LibraryService(media_root, media_sources=build_media_sources(media_root, [{"id": "main", "path": str(media_root)}]))
+    indexer = library_index_module.LibraryIndexer(library, MediaIndexStore(database), capture_workers=2, probe_cache=probe_cache)
+    indexer.sync()
+    assert indexer.probe_media() == 3
+    probed.clear()
+
+    captured = []
+    monkeypatch.setattr(thumbs_module, "_ffmpeg_capture", lambda vp, out, ts, duration: captured.append(duration) or True)
+    thumbs_module.generate_thumbnails(media_root, show_progress=False, probe_cache=probe_cache, library=library)
+    assert captured == [12.5] * 3
+    assert probed == []
+    with database.connect(read_only=True) as conn:
+        uris = [row[0] for row in conn.execute("SELECT uri FROM media_probe_cache ORDER BY uri")]
+    assert uris == [f"@main/p{index}.mp4" for index in range(3)]
+
+
 def test_special_chars_in_media_urls_are_encoded(tmp_path, monkeypatch):
     media_root = tmp_path / "media"
     media_root.mkdir(parents=True, exist_ok=True)
@@ -558,3 +1022,290 @@ def test_special_chars_in_media_urls_are_encoded(tmp_path, monkeypatch):
     media_res = local_client.get(f"/media?uri={quote(video_name, safe='')}", follow_redirects=False)
     assert media_res.status_code in {301, 302, 308}
     assert media_res.headers.get("Location", "").endswith("/media/%40default/v%231%2B.mp4")
+
+
+def test_scan_media_walks_sources_once_and_reuses_stat(tmp_path, monkeypatch):
+    media_root = tmp_path / "media"
+    (media_root / "trip" / "day1").mkdir(parents=True)
+    (media_root / "trip" / "day1" / "IMG_1.JPG").write_bytes(b"img")
+    (media_root / "trip" / "clip.Mp4").write_bytes(b"video-bytes")
+    (media_root / "song.mp3").write_bytes(b"a")
+    (media_root / "notes.txt").write_bytes(b"skip")
+    library = LibraryService(media_root)
+
+    listed = []
+    original_scandir = os.scandir
+
+    def counting_scandir(path):
+        listed.append(path)
+        return original_scandir(path)
+
+    monkeypatch.setattr(os, "scandir", counting_scandir)
+    entries = {entry.uri: entry for entry in library.scan_media()}
+
+    assert len(listed) == 3
+    assert set(entries) == {
+        "@default/trip/day1/IMG_1.JPG",
+        "@default/trip/clip.Mp4",
+        "@default/song.mp3",
+    }
+    assert entries["@default/trip/clip.Mp4"].media_type == "video"
+    assert entries["@default/trip/clip.Mp4"].size_bytes == len(b"video-bytes")
+    assert library.scan_videos() == [media_root.resolve() / "trip" / "clip.Mp4"]
+
+
+def test_incremental_sync_only_lists_changed_directories(tmp_path):
+    media_root = tmp_path / "media"
+    (media_root / "2024" / "spring").mkdir(parents=True)
+    (media_root / "2024" / "summer").mkdir(parents=True)
+    (media_root / "top.mp4").write_bytes(b"video")
+    (media_root / "2024" / "spring" / "a.jpg").write_bytes(b"a")
+    (media_root / "2024" / "summer" / "b.jpg").write_bytes(b"b")
+
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = MediaIndexStore(database)
+    indexer = library_index_module.LibraryIndexer(LibraryService(media_root), store)
+
+    first = indexer.sync()
+    assert first["mode"] == "full"
+    assert first["indexed"] == 3
+
+    unchanged = indexer.sync()
+    assert unchanged["mode"] == "incremental"
+    assert unchanged["listed_directories"] == 0
+    assert unchanged["indexed"] == 0
+    assert unchanged["total"] == 3
+
+    summer = media_root / "2024" / "summer"
+    (summer / "c.jpg").write_bytes(b"c")
+    os.utime(summer, (summer.stat().st_mtime + 5,) * 2)
+    (media_root / "2024" / "spring" / "a.jpg").unlink()
+    (media_root / "2024" / "spring").rmdir()
+    changed = indexer.sync()
+    assert changed["listed_directories"] == 2
+    assert changed["deleted"] == 1
+    assert {item["name"] for item in store.records()} == {
+        "@default/top.mp4",
+        "@default/2024/summer/b.jpg",
+        "@default/2024/summer/c.jpg",
+    }
+    assert set(store.directory_states()["default"]) == {"", "2024", "2024/summer"}
+
+    assert indexer.sync(full=True)["indexed"] == 3
+
+
+def test_every_nth_startup_sync_is_full(tmp_path, monkeypatch):
+    media_root = tmp_path / "media"
+    media_root.mkdir()
+    photo = media_root / "photo.jpg"
+    photo.write_bytes(b"a")
+    monkeypatch.setattr(library_index_module, "FULL_SYNC_EVERY_STARTUPS", 3)
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = MediaIndexStore(database)
+    indexer = library_index_module.LibraryIndexer(LibraryService(media_root), store)
+
+    def start():
+        full = indexer.startup_sync_is_full()
+        indexer.sync(full=full)
+        return full
+
+    assert [start(), start()] == [False, False]
+    # Rewritten in place: the directory mtime stays, so only a full sync sees it.
+    directory_mtime = media_root.stat().st_mtime
+    photo.write_bytes(b"edited")
+    os.utime(media_root, (directory_mtime, directory_mtime))
+    assert store.records()[0]["size_bytes"] == 1
+    assert start() is True
+    assert store.records()[0]["size_bytes"] == 6
+    assert [start(), start(), start()] == [False, False, True]
+
+    # A manual full sync restarts the count.
+    indexer.startup_sync_is_full()
+    indexer.sync(full=True)
+    assert [start(), start(), start()] == [False, False, True]
+
+
+def test_background_startup_sync_reports_progress(tmp_path, monkeypatch):
+    media_root = tmp_path / "media"
+    media_root.mkdir()
+    (media_root / "clip.mp4").write_bytes(b"video")
+    (media_root / "photo.jpg").write_bytes(b"image")
+    monkeypatch.setenv("TIKLOCAL_INSTANCE", str(tmp_path / "tiklocal-data"))
+
+    app = create_app({
+        "TESTING": True,
+        "MEDIA_ROOT": media_root,
+        "APP_DATABASE": AppDatabase(tmp_path / "tiklocal.sqlite3"),
+        "LIBRARY_SYNC_MODE": "background",
+    })
+    assert app.extensions["media_index_sync"] is None
+    local_client = app.test_client()
+
+    deadline = time.monotonic() + 5
+    stats = local_client.get("/api/library/stats").get_json()
+    while stats["sync"]["running"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+        stats = local_client.get("/api/library/stats").get_json()
+
+    assert stats["sync"]["phase"] == "idle"
+    assert stats["sync"]["processed"] == 2
+    assert stats["sync"]["last_result"]["indexed"] == 2
+    assert stats["indexed_total"] == 2
+
+
+def test_library_index_workers_config_is_validated_and_clamped():
+    assert resolve_library_index_workers({}) is None
+    assert resolve_library_index_workers({"library_index_workers": "4"}) == 4
+    assert resolve_library_index_workers({"library_index_workers": 0}) == 1
+    assert resolve_library_index_workers({"library_index_workers": 500}) == library_index_module.MAX_CAPTURE_WORKERS
+    with pytest.raises(ValueError, match="library_index_workers"):
+        resolve_library_index_workers({"library_index_workers": "auto"})
+
+
+def test_capture_times_are_probed_on_a_worker_pool(tmp_path):
+    media_root = tmp_path / "media"
+    media_root.mkdir()
+    for index in range(6):
+        image = Image.new("RGB", (8, 8))
+        exif = Image.Exif()
+        exif[36867] = f"2019:04:0{index + 1} 10:20:30"
+        image.save(media_root / f"p{index}.jpg", exif=exif)
+
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = MediaIndexStore(database)
+    indexer = library_index_module.LibraryIndexer(LibraryService(media_root), store, capture_workers=3)
+
+    result = indexer.sync()
+    assert result["captured"] == 6
+    assert set(result["timings_ms"]) == {"walk", "capture", "write"}
+    dates = sorted(item["captured_local_date"] for item in store.records())
+    assert dates == [f"2019-04-0{index + 1}T10:20:30" for index in range(6)]
+    assert indexer.sync()["captured"] == 0
+
+
+def test_replace_snapshot_skips_unchanged_rows(tmp_path):
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = MediaIndexStore(database)
+    records = [
+        {
+            "uri": f"@default/{index}.jpg",
+            "source_id": "default",
+            "rel_path": f"{index}.jpg",
+            "filename": f"{index}.jpg",
+            "parent_path": ".",
+            "media_type": "image",
+            "extension": ".jpg",
+            "size_bytes": 10 + index,
+            "mtime": 1_700_000_000.0 + index,
+        }
+        for index in range(2500)
+    ]
+
+    assert store.replace_snapshot(records)["written"] == 2500
+    resync = store.replace_snapshot(records)
+    assert resync["written"] == 0
+    assert resync["total"] == 2500
+
+    records[0] = {**records[0], "size_bytes": 1}
+    changed = store.replace_snapshot(records[:-1])
+    assert changed["written"] == 1
+    assert changed["deleted"] == 1
+    assert store.records_for_uris(["@default/0.jpg"])[0]["size_bytes"] == 1
+
+
+def test_incremental_replace_snapshot_reads_only_stale_directories(tmp_path, monkeypatch):
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = MediaIndexStore(database)
+
+    def record(parent, index, size=10):
+        rel_path = f"{parent}/{index}.jpg"
+        return {
+            "uri": f"@default/{rel_path}",
+            "source_id": "default",
+            "rel_path": rel_path,
+            "filename": f"{index}.jpg",
+            "parent_path": parent,
+            "media_type": "image",
+            "extension": ".jpg",
+            "size_bytes": size,
+            "mtime": 1_700_000_000.0 + index,
+        }
+
+    store.replace_snapshot([record(parent, index) for parent in ("a", "b", "c") for index in range(100)])
+    loaded = []
+    existing_rows = MediaIndexStore._existing_rows
+
+    def spy(*args, **kwargs):
+        rows = existing_rows(*args, **kwargs)
+        loaded.append(len(rows))
+        return rows
+
+    monkeypatch.setattr(MediaIndexStore, "_existing_rows", staticmethod(spy))
+    # Directory "a" lost one file and changed another; "b" and "c" were not listed.
+    result = store.replace_snapshot(
+        [record("a", index, size=11 if index == 0 else 10) for index in range(99)],
+        synced_source_ids=set(),
+        stale_directories={"default": {"a"}},
+    )
+    assert loaded == [100]
+    assert (result["written"], result["deleted"], result["total"]) == (1, 1, 299)
+
+
+def test_app_database_reuses_one_connection_per_thread(tmp_path):
+    import sqlite3
+    import threading
+
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = MediaIndexStore(database)
+    opened = database.connection_stats()["opened"]
+
+    for _ in range(5):
+        store.stats()
+        store.directory_states()
+    assert database.connection_stats()["opened"] == opened + 1
+
+    with database.connect(read_only=True) as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM media_items")
+
+    thread_conns = []
+    worker = threading.Thread(target=lambda: thread_conns.append(database.connect()))
+    worker.start()
+    worker.join()
+    assert thread_conns[0] is not database.connect()
+    assert database.connection_stats()["reused"] >= 9
+
+    database.close()
+    assert database.connection_stats()["open"] == 0
+    assert store.stats()["total"] == 0
+
+
+def test_app_database_closes_connections_of_finished_threads(tmp_path):
+    import gc
+    import threading
+
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    store = MediaIndexStore(database)
+
+    def job():
+        with database.connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO media_probe_cache(uri, size_bytes, mtime, payload, probed_at) VALUES ('a', 1, 1, '{}', '')")
+        store.stats()
+
+    for _ in range(50):
+        worker = threading.Thread(target=job)
+        worker.start()
+        worker.join()
+    del worker
+    gc.collect()
+    stats = database.connection_stats()
+    assert stats["opened"] >= 100
+    # Only the main thread's write connection from migrate() is left.
+    assert stats["open"] == 1
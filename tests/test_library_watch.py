@@ -0,0 +1,97 @@
+import errno
+import os
+import time
+
+import pytest
+
+from tiklocal.services import LibraryService
+from tiklocal.services.database import AppDatabase
+from tiklocal.services.library_index import LibraryIndexer, MediaIndexStore
+from tiklocal.services.library_watch import IN_CREATE, IN_ISDIR, LibraryWatcher, inotify_available
+
+
+def _indexer(tmp_path):
+    media_root = tmp_path / "media"
+    media_root.mkdir()
+    (media_root / "kept.jpg").write_bytes(b"kept")
+    database = AppDatabase(tmp_path / "tiklocal.sqlite3")
+    database.migrate()
+    indexer = LibraryIndexer(LibraryService(media_root), MediaIndexStore(database))
+    indexer.sync()
+    return media_root, indexer
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def _names(indexer):
+    return {item["name"] for item in indexer.store.records()}
+
+
+@pytest.mark.skipif(not inotify_available(), reason="inotify is Linux-only")
+def test_inotify_watcher_applies_debounced_file_and_directory_events(tmp_path):
+    media_root, indexer = _indexer(tmp_path)
+    watcher = LibraryWatcher(indexer, debounce=0.1, max_delay=0.5).start()
+    try:
+        assert _wait_for(lambda: watcher.mode == "inotify")
+        (media_root / "new.mp4").write_bytes(b"video")
+        (media_root / "kept.jpg").unlink()
+        (media_root / "album").mkdir()
+        (media_root / "album" / "inside.png").write_bytes(b"png")
+
+        assert _wait_for(lambda: _names(indexer) == {
+            "@default/new.mp4",
+            "@default/album/inside.png",
+        })
+        assert watcher.status()["watched_directories"] == 2
+    finally:
+        watcher.stop()
+    assert watcher.status()["mode"] == "stopped"
+
+
+def test_polling_watcher_falls_back_to_incremental_sync(tmp_path):
+    media_root, indexer = _indexer(tmp_path)
+    watcher = LibraryWatcher(indexer, poll_interval=1, use_inotify=False).start()
+    try:
+        (media_root / "later.jpg").write_bytes(b"later")
+        assert _wait_for(lambda: "@default/later.jpg" in _names(indexer))
+        assert watcher.mode == "polling"
+    finally:
+        watcher.stop()
+
+
+def test_file_events_are_applied_alongside_a_directory_sync(tmp_path):
+    media_root, indexer = _indexer(tmp_path)
+    watcher = LibraryWatcher(indexer, use_inotify=False)
+    directory_mtime = media_root.stat().st_mtime
+    (media_root / "kept.jpg").write_bytes(b"rewritten")
+    os.utime(media_root, (directory_mtime, directory_mtime))
+
+    watcher._mark("default", path=str(media_root / "kept.jpg"))
+    watcher._mark("default", dirty=True)
+    watcher._flush_source("default")
+
+    assert [item["size_bytes"] for item in indexer.store.records()] == [len(b"rewritten")]
+
+
+def test_unwatchable_new_directory_switches_its_source_to_polling(tmp_path):
+    media_root, indexer = _indexer(tmp_path)
+    watcher = LibraryWatcher(indexer, poll_interval=1)
+
+    class FullInotify:
+        def add_watch(self, path):
+            raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC), path)
+
+    watcher._inotify = FullInotify()
+    watcher._watches[1] = str(media_root)
+    (media_root / "album").mkdir()
+    watcher._handle_event(1, IN_CREATE | IN_ISDIR, "album")
+
+    assert watcher.status()["polled_sources"] == ["default"]
+    assert "No space left" in watcher.last_error
@@ -0,0 +1,193 @@
+import sqlite3
+
+import pytest
+
+import tiklocal.services.database as database_module
+from tiklocal.services.database import AppDatabase
+from tiklocal.services.library_index import MediaIndexStore
+
+# Calls that read a whole table on purpose.
+FULL_READS = {"time_states_all", "directory_states"}
+# Keyset pages must seek to the cursor instead of walking the index from the top.
+SEEKS = {"page_cursor", "page_video_cursor", "page_month_cursor"}
+# Searches and favorites start from their (small) match set and sort it,
+# instead of walking the whole library in index order.
+MATCH_SETS = {
+    "page_search", "page_search_cursor", "records_search",
+    "page_favorites", "page_favorites_cursor", "records_favorites",
+}
+SORT_STEPS = (
+    "USE TEMP B-TREE FOR ORDER BY",
+    "USE TEMP B-TREE FOR RIGHT PART OF ORDER BY",
+    "USE TEMP B-TREE FOR GROUP BY",
+)
+
+
+def _records(count: int) -> list[dict]:
+    records = []
+    for index in range(count):
+        month = f"2024-{index % 12 + 1:02d}"
+        rel_path = f"{index % 20}/{index}.jpg"
+        records.append({
+            "uri": f"@default/{rel_path}",
+            "source_id": "default",
+            "rel_path": rel_path,
+            "filename": f"{index}.jpg",
+            "parent_path": f"{index % 20}",
+            "media_type": ("image", "video", "audio")[index % 3],
+            "extension": ".jpg",
+            "size_bytes": index * 1024,
+            "mtime": 1_700_000_000.0 + index,
+            "captured_at": 1_700_000_000.0 + index,
+            "captured_local_date": f"{month}-01T00:00:00",
+        })
+    return records
+
+
+class _RecordingCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        self.connection.statements.append((sql, parameters))
+        return super().execute(sql, parameters)
+
+
+class _RecordingConnection(sqlite3.Connection):
+    """Keep each statement with its bound parameters; plans can depend on them."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements: list[tuple[str, object]] = []
+
+    def cursor(self, factory=_RecordingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        self.statements.append((sql, parameters))
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        rows = list(seq_of_parameters)
+        if rows:
+            self.statements.append((sql, rows[0]))
+        return super().executemany(sql, rows)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    connect = sqlite3.connect
+    monkeypatch.setattr(
+        database_module.sqlite3,
+        "connect",
+        lambda *args, **kwargs: connect(*args, factory=_RecordingConnection, **kwargs),
+    )
+    database = AppDatabase(tmp_path / "plans.sqlite3")
+    database.migrate()
+    index_store = MediaIndexStore(database)
+    index_store.replace_snapshot(_records(600))
+    return index_store
+
+
+# Cursor of a row in the middle of the library, so cursor pages only trace the seek.
+CURSOR = MediaIndexStore._encode_cursor(1_700_000_300.0, "@default/0/300.jpg", 200, 400)
+
+
+QUERIES = {
+    "page": lambda store: store.page(limit=48),
+    "page_offset": lambda store: store.page(offset=96, limit=48),
+    "page_cursor": lambda store: store.page(limit=48, cursor=CURSOR),
+    "page_video": lambda store: store.page(media_type="video", limit=48),
+    "page_video_cursor": lambda store: store.page(media_type="video", limit=48, cursor=CURSOR),
+    "page_big_files": lambda store: store.page(media_type="video", min_size=100 * 1024, limit=48),
+    "page_month": lambda store: store.page(month="2024-03", limit=48),
+    "page_month_cursor": lambda store: store.page(month="2024-03", limit=48, cursor=CURSOR),
+    "page_search": lambda store: store.page(search="300.jpg", limit=48),
+    "page_search_cursor": lambda store: store.page(search="300", limit=48, cursor=CURSOR),
+    "page_search_short": lambda store: store.page(search="30", limit=48),
+    "records_search": lambda store: store.records(search="300"),
+    "page_favorites": lambda store: store.page(favorites_only=True, limit=48),
+    "page_favorites_cursor": lambda store: store.page(favorites_only=True, limit=48, cursor=CURSOR),
+    "records_favorites": lambda store: store.records(favorites_only=True),
+    "page_collection": lambda store: store.page(collection_id="col_plans", limit=48),
+    "page_collection_cursor": lambda store: store.page(collection_id="col_plans", limit=48, cursor=CURSOR),
+    "records": lambda store: store.records(),
+    "records_video": lambda store: store.records(media_type="video"),
+    "timeline_months": lambda store: store.timeline_months(),
+    "timeline_months_before": lambda store: store.timeline_months(before="2024-06"),
+    "records_for_uris": lambda store: store.records_for_uris(["@default/1/1.jpg", "@default/2/2.jpg"]),
+    "stats": lambda store: store.stats(),
+    "pending_probes": lambda store: store.pending_probes(1, after="@default/1/1.jpg", limit=64),
+    "time_states_all": lambda store: store.time_states(),
+    "time_states_directories": lambda store: store.time_states({"default": {"1", "2"}}),
+    "time_states_uris": lambda store: store.time_states(uris=["@default/1/1.jpg"]),
+    "outdated_directories": lambda store: store.outdated_directories(2),
+    "directory_states": lambda store: store.directory_states(),
+    "upsert": lambda store: store.upsert(_records(3)),
+    "delete": lambda store: store.delete("@default/1/1.jpg"),
+    "replace_snapshot": lambda store: store.replace_snapshot(
+        _records(40),
+        synced_source_ids=set(),
+        stale_directories={"default": {"1"}},
+        directories={"default": {"": 1.0, "1": 2.0}},
+    ),
+}
+
+
+def _traced_plans(store: MediaIndexStore, call) -> list[tuple[str, list[str]]]:
+    database = store.database
+    connections = [database.connect(read_only=read_only) for read_only in (False, True)]
+    for conn in connections:
+        conn.statements.clear()
+    call(store)
+
+    conn = connections[0]
+    plans = []
+    seen = set()
+    for sql, parameters in (item for conn in connections for item in conn.statements):
+        statement = " ".join(sql.split())
+        if statement in seen or statement.split(None, 1)[0].upper() not in {"SELECT", "UPDATE", "DELETE"}:
+            continue
+        seen.add(statement)
+        details = [str(row["detail"]) for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)]
+        plans.append((statement, details))
+    return plans
+
+
+@pytest.mark.parametrize("name", sorted(QUERIES))
+def test_media_index_queries_use_indexes(store, name):
+    plans = _traced_plans(store, QUERIES[name])
+    assert plans, f"{name} issued no statements"
+
+    if name in FULL_READS:
+        return
+    for sql, details in plans:
+        table_scans = [
+            detail for detail in details
+            if detail.startswith("SCAN ")
+            and " USING " not in detail
+            and " VIRTUAL TABLE " not in detail
+            # Reading back a subquery's own output is not a table scan.
+            and not detail.startswith("SCAN (subquery")
+        ]
+        assert not table_scans, f"{name}: table scan in {sql!r}: {details}"
+        if name not in MATCH_SETS:
+            assert not [detail for detail in details if detail in SORT_STEPS], (
+                f"{name}: sort step in {sql!r}: {details}"
+            )
+        if name in SEEKS:
+            assert details[0].startswith("SEARCH "), f"{name}: no index seek in {sql!r}: {details}"
+
+
+def test_query_plan_check_detects_table_scans(store):
+    plans = _traced_plans(store, QUERIES["time_states_all"])
+    assert any(detail == "SCAN media_items" for _, details in plans for detail in details)
+
+
+def test_timeline_months_query_count_does_not_grow_with_months(store):
+    counts = []
+    for limit in (2, 8):
+        conn = store.database.connect(read_only=True)
+        conn.statements.clear()
+        payload = store.timeline_months(limit=limit, preview_limit=6)
+        assert len(payload["months"]) == limit
+        assert all(len(month["records"]) == 6 for month in payload["months"])
+        counts.append(len(conn.statements))
+    assert counts[0] == counts[1]
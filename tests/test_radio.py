@@ -184,7 +184,7 @@ def test_radio_uses_embedded_audio_metadata(tmp_path, monkeypatch):
     def fake_run(*args, **kwargs):
         return FakeCompleted()
 
-    monkeypatch.setattr("tiklocal.services.radio.sp.run", fake_run)
+    monkeypatch.setattr("tiklocal.services.media_probe.sp.run", fake_run)
 
     media_root = tmp_path / "media"
     media_root.mkdir(parents=True, exist_ok=True)
@@ -209,7 +209,7 @@ def test_radio_tune_does_not_probe_audio_metadata(client, monkeypatch):
     def fail_probe(*args, **kwargs):
         raise AssertionError("tune should not call ffprobe")
 
-    monkeypatch.setattr("tiklocal.services.radio.sp.run", fail_probe)
+    monkeypatch.setattr("tiklocal.services.media_probe.sp.run", fail_probe)
     res = client.get("/api/radio/tune?station=default&limit=3&seed=fixed")
 
     assert res.status_code == 200
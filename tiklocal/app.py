@@ -41,9 +41,10 @@ from tiklocal.services.embedding import (
     merge_embedding_config,
     validate_embedding_config,
 )
-from tiklocal.services.similarity import SQLiteSimilarityGroupStore
+from tiklocal.services.similarity import ImageSimilarityService, SQLiteSimilarityGroupStore
 from tiklocal.services.database import AppDatabase, MediaActivityStore
-from tiklocal.services.library_index import LibraryIndexer, MediaIndexStore
+from tiklocal.services.library_index import DEFAULT_CAPTURE_WORKERS, LibraryIndexer, MediaIndexStore
+from tiklocal.services.library_watch import LibraryWatcher
 from tiklocal.services.downloader import (
     DEFAULT_DOWNLOAD_CONFIG,
     DownloadConfigStore,
@@ -71,6 +72,7 @@ from tiklocal.paths import (
     get_collections_path,
     get_radio_profile_path,
     get_auth_path,
+    get_vector_sidecar_dir,
 )
 from tiklocal import view_builders
 
@@ -140,6 +142,10 @@ def create_app(test_config=None):
         VISION_CONFIG = None,
         EMBEDDING_CONFIG = None,
         VECTOR_INDEX = None,
+        LIBRARY_WATCH = False,
+        LIBRARY_SYNC_MODE = 'blocking',
+        LIBRARY_INDEX_WORKERS = None,
+        LIBRARY_PROBE = False,
         AUTH_ENABLED = None,
         AUTH_COOKIE_SECURE = False,
         INSTANCE_NAME = None,
@@ -215,23 +221,49 @@ def create_app(test_config=None):
     default_media_root = library_service.media_root
     media_root_str = str(default_media_root)
     app.config['MEDIA_ROOT'] = default_media_root
-    favorite_service = FavoriteService(media_root_str, db_path=get_favorites_path(), library_service=library_service)
     thumbnail_service = ThumbnailService(Path(media_root_str), library_service=library_service)
-    metadata_store = ImageMetadataStore(get_metadata_path())
     prompt_config_store = PromptConfigStore(get_prompt_config_path())
     llm_config_store = LLMConfigStore(get_llm_config_path())
     embedding_config_store = EmbeddingConfigStore(get_embedding_config_path())
     app_database = app.config.get('APP_DATABASE') or AppDatabase(get_database_path())
     app_database.migrate()
+    metadata_store = ImageMetadataStore(app_database, get_metadata_path(), library_service=library_service)
+    favorite_service = FavoriteService(
+        media_root_str,
+        database=app_database,
+        db_path=get_favorites_path(),
+        library_service=library_service,
+    )
     media_index = MediaIndexStore(app_database)
-    library_indexer = LibraryIndexer(library_service, media_index)
-    index_sync_result = library_indexer.sync()
-    app.extensions["media_index_sync"] = index_sync_result
-    if index_sync_result["unavailable_sources"]:
-        app.logger.warning(
-            "媒体源不可用，已保留其现有索引: %s",
-            ", ".join(index_sync_result["unavailable_sources"]),
+    library_indexer = LibraryIndexer(
+        library_service,
+        media_index,
+        capture_workers=app.config.get('LIBRARY_INDEX_WORKERS') or DEFAULT_CAPTURE_WORKERS,
+    )
+    def log_unavailable_sources(result):
+        if result["unavailable_sources"]:
+            app.logger.warning(
+                "媒体源不可用，已保留其现有索引: %s",
+                ", ".join(result["unavailable_sources"]),
+            )
+
+    full_sync = library_indexer.startup_sync_is_full()
+    if app.config.get('LIBRARY_SYNC_MODE') == 'background':
+        # Serve the existing index right away; /api/library/stats reports progress.
+        library_indexer.start_background_sync(
+            full=full_sync,
+            probe=bool(app.config.get('LIBRARY_PROBE')),
+            on_done=log_unavailable_sources,
         )
+        app.extensions["media_index_sync"] = None
+    else:
+        index_sync_result = library_indexer.sync(full=full_sync)
+        app.extensions["media_index_sync"] = index_sync_result
+        log_unavailable_sources(index_sync_result)
+        if app.config.get('LIBRARY_PROBE'):
+            library_indexer.start_background_probe()
+    if app.config.get('LIBRARY_WATCH'):
+        app.extensions['library_watcher'] = LibraryWatcher(library_indexer).start()
     activity_store = MediaActivityStore(app_database)
     recommend_service = RecommendService(
         library_service,
@@ -245,14 +277,16 @@ def create_app(test_config=None):
         favorite_service,
         radio_profile_store,
         activity_store=activity_store,
+        probe_cache=library_indexer.probe_cache,
     )
-    vector_index = app.config.get('VECTOR_INDEX') or SQLiteImageVectorStore(app_database)
+    vector_index = app.config.get('VECTOR_INDEX') or SQLiteImageVectorStore(app_database, sidecar_dir=get_vector_sidecar_dir())
     image_vector_service = ImageVectorService(library_service, vector_index)
     similarity_group_store = app.config.get('SIMILARITY_GROUP_STORE') or SQLiteSimilarityGroupStore(app_database)
+    image_similarity_service = ImageSimilarityService(library_service, vector_index)
     download_config_store = DownloadConfigStore(get_download_config_path())
     download_history_store = DownloadHistoryStore(get_download_jobs_path())
     download_source_store = DownloadSourceStore(get_download_sources_path())
-    collection_store = CollectionStore(get_collections_path())
+    collection_store = CollectionStore(app_database, get_collections_path())
     download_source_id = str(app.config.get('DOWNLOAD_SOURCE') or library_service.default_source_id).strip() or library_service.default_source_id
     download_source = library_service.sources_by_id.get(download_source_id) or library_service.sources_by_id[library_service.default_source_id]
     download_manager = DownloadManager(
@@ -456,17 +490,13 @@ def create_app(test_config=None):
         return view_builders.collect_source_media_groups(records, download_source_store)
 
     def _collect_library_records(*, favorites_only: bool = False, search: str = '') -> list[dict]:
-        favorites = favorite_service.load()
-        records = media_index.records(search=search)
-        for record in records:
-            record['is_favorite'] = library_service.is_uri_in_set(record['name'], favorites)
-        return [record for record in records if record['is_favorite']] if favorites_only else records
+        return media_index.records(search=search, favorites_only=favorites_only)
 
     def _build_theme_strip_candidates(records: list[dict]) -> list[dict]:
         return view_builders.build_theme_strip_candidates(records, download_history_store)
 
     def _serialize_library_item(record: dict) -> dict:
-        return view_builders.serialize_library_item(record, metadata_store, library_service)
+        return view_builders.serialize_library_item(record)
 
     def _serialize_timeline_payload(payload: dict) -> dict:
         months = []
@@ -552,10 +582,7 @@ def create_app(test_config=None):
         collection = collection_store.get(collection_id)
         if not collection:
             return None, []
-        favorites = favorite_service.load()
         records = media_index.records_for_uris(collection_store.list_item_uris(collection_id, newest_first=True))
-        for record in records:
-            record['is_favorite'] = library_service.is_uri_in_set(record['name'], favorites)
         return collection, records
 
     def _serialize_collection_summary(collection: dict) -> dict:
@@ -577,19 +604,20 @@ def create_app(test_config=None):
         collection_id: str = '',
         search: str = '',
         month: str = '',
+        cursor: str = '',
     ) -> dict:
-        if not favorites_only and not collection_id and mode != 'image_random':
+        if collection_id or mode != 'image_random':
             indexed_page = media_index.page(
                 search=search,
                 media_type='video' if mode in {'video_latest', 'big_files'} else '',
                 min_size=min_mb * 1024 * 1024 if mode == 'big_files' else 0,
                 month=month,
+                favorites_only=favorites_only,
+                collection_id=collection_id,
                 offset=offset,
                 limit=limit,
+                cursor=cursor,
             )
-            favorites = favorite_service.load()
-            for record in indexed_page['records']:
-                record['is_favorite'] = library_service.is_uri_in_set(record['name'], favorites)
             return {
                 'items': [_serialize_library_item(record) for record in indexed_page.pop('records')],
                 **indexed_page,
@@ -732,7 +760,7 @@ def create_app(test_config=None):
         index_stats = media_index.stats()
         video_count = index_stats['videos']
         image_count = index_stats['images']
-        favorite_count = len(favorite_service.load())
+        favorite_count = favorite_service.count()
 
         # 缩略图缓存信息
         thumb_dir = get_thumbnails_dir()
@@ -1044,9 +1072,8 @@ def create_app(test_config=None):
         total = len(audios)
         page = audios[offset:offset + limit]
         items = []
-        for p in page:
+        for p, metadata in zip(page, radio_service.metadata_for_paths(page)):
             name = library_service.get_relative_path(p)
-            metadata = radio_service.metadata_for(p)
             items.append({
                 'name': name,
                 'media_url': f'/media/{quote(name, safe="/")}',
@@ -1469,6 +1496,7 @@ def create_app(test_config=None):
                 ),
             )
             result = image_vector_service.index_missing_or_stale(config=config, client=client)
+            result['similar_groups'] = image_similarity_service.update_groups(similarity_group_store)
             result['status'] = image_vector_service.status(config)
             return {'success': True, 'data': result}
         except Exception as e:
@@ -1663,7 +1691,7 @@ def create_app(test_config=None):
         from tiklocal.paths import get_thumbnails_dir
 
         index_stats = media_index.stats()
-        favorites = favorite_service.load()
+        library_watcher = app.extensions.get('library_watcher')
 
         # 计算缩略图缓存信息
         thumb_dir = get_thumbnails_dir()
@@ -1676,14 +1704,20 @@ def create_app(test_config=None):
             'audios': index_stats['audios'],
             'indexed_total': index_stats['total'],
             'last_synced_at': index_stats['last_synced_at'],
-            'favorites': len(favorites),
+            'sync': library_indexer.progress(),
+            'database': app_database.connection_stats(),
+            'watch': library_watcher.status() if library_watcher else None,
+            'favorites': favorite_service.count(),
             'cache_count': len(thumb_files),
             'cache_mb': round(thumb_size / (1024 * 1024), 2)
         }
 
     @app.route('/api/library/sync', methods=['POST'])
     def api_library_sync():
-        result = library_indexer.sync()
+        full = str(request.args.get('full', '')).strip().lower() in {'1', 'true', 'yes'}
+        result = library_indexer.sync(full=full)
+        if app.config.get('LIBRARY_PROBE'):
+            library_indexer.start_background_probe()
         return {'success': True, 'data': result}
 
     @app.route('/api/library/timeline')
@@ -1715,6 +1749,7 @@ def create_app(test_config=None):
         if scope != 'all':
             mode = 'all'
         offset = _read_int_arg('offset', 0, minimum=0)
+        cursor = str(request.args.get('cursor', '')).strip()[:512]
         limit = _read_int_arg('limit', 24, minimum=12, maximum=96)
         min_mb = _read_int_arg('min_mb', 50, minimum=1, maximum=10240)
         seed = str(request.args.get('seed', '')).strip()
@@ -1737,6 +1772,7 @@ def create_app(test_config=None):
             collection_id=collection_id,
             search=search,
             month=month,
+            cursor=cursor,
         )
         return {
             'success': True,
@@ -49,6 +49,10 @@ def get_database_path() -> Path:
     return get_data_dir() / 'tiklocal.sqlite3'
 
 
+def get_vector_sidecar_dir() -> Path:
+    return get_data_dir() / 'vectors'
+
+
 def get_download_config_path() -> Path:
     return get_data_dir() / 'download_config.json'
 
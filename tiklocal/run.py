@@ -8,7 +8,7 @@ from pathlib import Path
 from waitress import serve
 from tiklocal.app import create_app
 from tiklocal.thumbs import generate_thumbnails
-from tiklocal.paths import get_data_dir, get_database_path
+from tiklocal.paths import get_data_dir, get_database_path, get_vector_sidecar_dir
 from tiklocal.paths import get_auth_path
 from tiklocal.services.auth import AuthStore
 from tiklocal.services import LibraryService, build_media_sources, normalize_source_id
@@ -21,7 +21,10 @@ from tiklocal.services.embedding import (
     validate_embedding_config,
 )
 from tiklocal.services.database import AppDatabase
+from tiklocal.services.library_index import MAX_CAPTURE_WORKERS
+from tiklocal.services.media_probe import MediaProbeCache
 from tiklocal.services.similarity import (
+    DEFAULT_PROFILE_THRESHOLDS,
     DEFAULT_SIMILARITY_MAX_GROUP_SIZE,
     DEFAULT_SIMILARITY_MIN_GROUP_SIZE,
     DEFAULT_SIMILARITY_SCAN_LIMIT,
@@ -111,6 +114,8 @@ def resolve_embedding_config(config, args=None):
             overrides['image_quality'] = args.quality
         if getattr(args, 'dimensions', None):
             overrides['dimensions'] = args.dimensions
+        if getattr(args, 'vector_encoding', None):
+            overrides['vector_encoding'] = args.vector_encoding
         if overrides:
             validated, error = validate_embedding_config(overrides, partial=True)
             if error:
@@ -119,6 +124,18 @@ def resolve_embedding_config(config, args=None):
     return effective
 
 
+def resolve_library_index_workers(config):
+    """``library_index_workers`` as an int within 1..MAX_CAPTURE_WORKERS, or None if unset."""
+    value = config.get('library_index_workers')
+    if value is None or value == '':
+        return None
+    try:
+        workers = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'library_index_workers 必须是整数，当前为 {value!r}') from None
+    return max(1, min(workers, MAX_CAPTURE_WORKERS))
+
+
 def run_vectorize(config, args, parser):
     media_root = args.media_root or os.environ.get('MEDIA_ROOT') or config.get('media_root')
     media_sources = normalize_media_sources(config, getattr(args, 'media_source', None), media_root=media_root)
@@ -143,7 +160,7 @@ def run_vectorize(config, args, parser):
     library = LibraryService(media_path, media_sources=build_media_sources(media_path, media_sources or None))
     app_database = AppDatabase(get_database_path())
     app_database.migrate()
-    vector_index = SQLiteImageVectorStore(app_database)
+    vector_index = SQLiteImageVectorStore(app_database, sidecar_dir=get_vector_sidecar_dir())
     vector_service = ImageVectorService(library, vector_index)
 
     if args.cleanup:
@@ -170,18 +187,29 @@ def run_vectorize(config, args, parser):
     print(f"  dimensions: {embedding_config.get('dimensions')}")
     print(f"  image_max_size: {embedding_config.get('image_max_size')}")
     print(f"  image_quality: {embedding_config.get('image_quality')}")
+    print(f"  vector_encoding: {embedding_config.get('vector_encoding')}")
     print("Images:")
     print(f"  total: {plan['total_images']}")
     print(f"  indexed current: {plan['indexed_current']}")
     print(f"  missing: {plan['missing']}")
     print(f"  stale: {plan['stale']}")
     print(f"  selected this run: {plan['selected_count']}")
+    reencode = vector_index.pending_reencode(str(embedding_config.get('vector_encoding') or 'float32'))
+    if reencode:
+        print(f"  re-encode locally: {reencode}")
     print(f"  order: {plan['order']}")
     if plan.get('source_id'):
         print(f"  source: @{plan['source_id']}")
 
     if args.dry_run:
         return
+    built = vector_index.build_ann_index()
+    if built:
+        print(f"已补建近邻索引: {built}")
+    if reencode:
+        # Switching vector_encoding converts stored vectors without the embedding API.
+        converted = vector_service.reencode(embedding_config)
+        print(f"已本地转换向量编码: {converted}")
     if plan['selected_count'] == 0:
         print("没有需要向量化的图片。")
         return
@@ -219,6 +247,13 @@ def run_vectorize(config, args, parser):
     print(f"  indexed: {result['indexed']}")
     print(f"  failed: {result['failed']}")
 
+    grouped = ImageSimilarityService(library, vector_index).update_groups(SQLiteSimilarityGroupStore(app_database))
+    if grouped['processed']:
+        print(
+            f"  similar groups: attached {grouped['attached']}, "
+            f"created {grouped['created']}, merged {grouped['merged']}"
+        )
+
 
 def run_analyze_similar(config, args, parser):
     media_root = args.media_root or os.environ.get('MEDIA_ROOT') or config.get('media_root')
@@ -236,11 +271,12 @@ def run_analyze_similar(config, args, parser):
     library = LibraryService(media_path, media_sources=build_media_sources(media_path, media_sources or None))
     app_database = AppDatabase(get_database_path())
     app_database.migrate()
-    vector_index = SQLiteImageVectorStore(app_database)
+    vector_index = SQLiteImageVectorStore(app_database, sidecar_dir=get_vector_sidecar_dir())
     similarity_service = ImageSimilarityService(library, vector_index)
     group_store = SQLiteSimilarityGroupStore(app_database)
 
-    scan_limit = max(50, min(int(args.limit or DEFAULT_SIMILARITY_SCAN_LIMIT), 5000))
+    scan_limit = int(args.limit if args.limit is not None else DEFAULT_SIMILARITY_SCAN_LIMIT)
+    scan_limit = max(50, scan_limit) if scan_limit > 0 else 0
     threshold = max(0.5, min(float(args.threshold), 0.99))
     min_group_size = max(2, min(int(args.min_group_size), 12))
     max_group_size = max(2, min(int(args.max_group_size), 16))
@@ -253,16 +289,21 @@ def run_analyze_similar(config, args, parser):
         if not args.continue_after_clear:
             return
 
+    watermark = vector_index.latest_indexed_at()
     vectors = similarity_service.load_vectors(scan_limit=scan_limit)
     comparisons = max(0, len(vectors) * (len(vectors) - 1) // 2)
-    candidate_pairs = similarity_service.count_candidate_pairs(vectors, threshold=threshold)
+    # One neighbour graph serves the main threshold and every profiled one.
+    graph_threshold = min(threshold, *DEFAULT_PROFILE_THRESHOLDS) if args.profile else threshold
+    graph = similarity_service.build_graph(vectors, threshold=graph_threshold)
+    candidate_pairs = graph.count_pairs(threshold)
     payload = similarity_service.build_groups(
         offset=0,
-        limit=5000,
+        limit=0,
         threshold=threshold,
         min_group_size=min_group_size,
         max_group_size=max_group_size,
-        scan_limit=scan_limit,
+        vectors=vectors,
+        graph=graph,
     )
     groups = payload.get('items') or []
     grouped_images = sum(len(group.get('items') or []) for group in groups)
@@ -273,7 +314,7 @@ def run_analyze_similar(config, args, parser):
         print(f"  @{source.id}: {source.path}")
     print("Analysis:")
     print(f"  vectors loaded: {len(vectors)}")
-    print(f"  scan limit: {scan_limit}")
+    print(f"  scan limit: {scan_limit or 'all'}")
     print(f"  threshold: {threshold}")
     print(f"  min group size: {min_group_size}")
     print(f"  max group size: {max_group_size}")
@@ -286,9 +327,10 @@ def run_analyze_similar(config, args, parser):
     if args.profile:
         print("Threshold profile:")
         for item in similarity_service.profile_thresholds(
-            scan_limit=scan_limit,
             min_group_size=min_group_size,
             max_group_size=max_group_size,
+            vectors=vectors,
+            graph=graph,
         ):
             print(
                 f"  {item['threshold']:.2f}: "
@@ -312,6 +354,7 @@ def run_analyze_similar(config, args, parser):
         min_group_size=min_group_size,
         max_group_size=max_group_size,
         exclusive=True,
+        watermark=watermark,
     )
     print("Done:")
     print(f"  saved groups: {saved}")
@@ -421,6 +464,9 @@ def main():
     serve_parser.add_argument('--media-source', action='append', type=parse_cli_media_source,
                               help='添加媒体源，格式 id=/path/to/media，可重复')
     serve_parser.add_argument('--download-source', default=None, help='下载保存到的媒体源 id')
+    serve_parser.add_argument('--watch', action='store_true', help='后台监听媒体目录变化并实时更新索引')
+    serve_parser.add_argument('--sync-mode', choices=['background', 'blocking'], default=None,
+                              help='启动时的索引同步方式（默认：background，先启动服务再后台同步）')
 
     auth_parser = subparsers.add_parser('auth', help='管理访问认证')
     auth_parser.add_argument('action', choices=['set-password', 'status'], help='认证操作')
@@ -468,6 +514,8 @@ def main():
     vectorize_parser.add_argument('--max-size', type=int, default=None, help='覆盖 embedding.image_max_size')
     vectorize_parser.add_argument('--quality', type=int, default=None, help='覆盖 embedding.image_quality')
     vectorize_parser.add_argument('--dimensions', type=int, default=None, help='覆盖 embedding.dimensions')
+    vectorize_parser.add_argument('--vector-encoding', choices=['float32', 'float16', 'int8'], default=None,
+                                  help='覆盖 embedding.vector_encoding（向量存储精度）')
     vectorize_parser.add_argument('--yes', action='store_true', help='跳过确认提示')
 
     # analyze-similar 子命令
@@ -476,7 +524,7 @@ def main():
     analyze_parser.add_argument('--media-source', action='append', type=parse_cli_media_source,
                                 help='添加媒体源，格式 id=/path/to/media，可重复')
     analyze_parser.add_argument('--limit', type=int, default=DEFAULT_SIMILARITY_SCAN_LIMIT,
-                                help=f'分析最近多少张已有向量的图片（默认：{DEFAULT_SIMILARITY_SCAN_LIMIT}）')
+                                help=f'分析最近多少张已有向量的图片（0 表示全部，默认：{DEFAULT_SIMILARITY_SCAN_LIMIT}）')
     analyze_parser.add_argument('--threshold', type=float, default=DEFAULT_SIMILARITY_THRESHOLD,
                                 help=f'相似度阈值（默认：{DEFAULT_SIMILARITY_THRESHOLD}）')
     analyze_parser.add_argument('--min-group-size', type=int, default=DEFAULT_SIMILARITY_MIN_GROUP_SIZE,
@@ -503,7 +551,17 @@ def main():
             print(f"错误: 媒体目录不可用: {media_root}", file=sys.stderr)
             sys.exit(1)
         print(f"数据目录: {get_data_dir()}")
-        stats = generate_thumbnails(media_path, overwrite=getattr(args, 'overwrite', False), limit=getattr(args, 'limit', 0), show_progress=True)
+        app_database = AppDatabase(get_database_path())
+        app_database.migrate()
+        media_sources = normalize_media_sources(config, media_root=media_root)
+        stats = generate_thumbnails(
+            media_path,
+            overwrite=getattr(args, 'overwrite', False),
+            limit=getattr(args, 'limit', 0),
+            show_progress=True,
+            probe_cache=MediaProbeCache(app_database),
+            library=LibraryService(media_path, media_sources=build_media_sources(media_path, media_sources or None)),
+        )
         # 完成后退出
         return
 
@@ -689,11 +747,20 @@ def main():
         print(f"根证书: {tls_material.ca_cert_path}")
         print(f"CA 指纹: {tls_material.ca_fingerprint}")
 
+    try:
+        library_index_workers = resolve_library_index_workers(config)
+    except ValueError as exc:
+        parser.error(str(exc))
+
     try:
         app = create_app({
             "MEDIA_ROOT": media_path,
             "MEDIA_SOURCES": media_sources or None,
             "DOWNLOAD_SOURCE": normalize_source_id(download_source),
+            "LIBRARY_WATCH": bool(args.watch or config.get('library_watch')),
+            "LIBRARY_SYNC_MODE": args.sync_mode or config.get('library_sync_mode') or 'background',
+            "LIBRARY_INDEX_WORKERS": library_index_workers,
+            "LIBRARY_PROBE": bool(config.get('library_probe', True)),
             "VISION_CONFIG": vision_config,
             "EMBEDDING_CONFIG": embedding_config,
             "INSTANCE_NAME": args.name or config.get('name') or os.environ.get('TIKLOCAL_NAME'),
@@ -1,5 +1,6 @@
 import os
 import mimetypes
+import stat as stat_module
 import json
 import math
 import random
@@ -30,6 +31,35 @@ class MediaRef:
         return f"@{self.source_id}/{self.rel_path}"
 
 
+@dataclass(frozen=True)
+class MediaEntry:
+    path: Path
+    uri: str
+    media_type: str
+    size_bytes: int
+    mtime: float
+
+
+@dataclass(frozen=True)
+class SourceWalk:
+    """Result of walking one media source: files found plus directory mtimes."""
+    source: MediaSource
+    entries: list[MediaEntry]
+    directories: dict[str, float]
+    listed: set[str]
+
+
+def media_type_for_suffix(suffix: str) -> str | None:
+    value = str(suffix or '').lower()
+    if value in VIDEO_EXTENSIONS:
+        return 'video'
+    if value in IMAGE_EXTENSIONS:
+        return 'image'
+    if value in AUDIO_EXTENSIONS:
+        return 'audio'
+    return None
+
+
 def normalize_source_id(value: Any) -> str:
     text = str(value or '').strip().lower()
     cleaned = ''.join(ch for ch in text if ch.isalnum() or ch in {'-', '_'})
@@ -103,41 +133,129 @@ class LibraryService:
         except:
             return False
 
+    def scan_media(self, media_types: set[str] | None = None, recursive=True) -> list['MediaEntry']:
+        """Walk every source once, classifying files by suffix and keeping their stat."""
+        entries: list[MediaEntry] = []
+        for source in self.sources:
+            entries.extend(self.walk_source(source, media_types=media_types, recursive=recursive).entries)
+        return entries
+
     def scan_videos(self, recursive=True) -> list[Path]:
         """Scan for video files."""
-        videos = []
-        for source in self.sources:
-            videos.extend(self._scan_source(source, VIDEO_EXTENSIONS, recursive=recursive))
-        return sorted(videos, key=lambda p: p.stat().st_mtime, reverse=True)
+        entries = self.scan_media({'video'}, recursive=recursive)
+        return [entry.path for entry in sorted(entries, key=lambda e: e.mtime, reverse=True)]
 
     def scan_audios(self, recursive=True) -> list[Path]:
         """Scan for audio files."""
-        audios = []
-        for source in self.sources:
-            audios.extend(self._scan_source(source, AUDIO_EXTENSIONS, recursive=recursive))
-        return sorted(audios, key=lambda p: p.stat().st_mtime, reverse=True)
+        entries = self.scan_media({'audio'}, recursive=recursive)
+        return [entry.path for entry in sorted(entries, key=lambda e: e.mtime, reverse=True)]
 
     def scan_images(self, recursive=True) -> list[Path]:
         """Scan for image files."""
-        images = []
-        for source in self.sources:
-            images.extend(self._scan_source(source, IMAGE_EXTENSIONS, recursive=recursive, include_uppercase=True))
-        return images
-
-    def _scan_source(self, source: MediaSource, extensions: set[str], *, recursive: bool, include_uppercase: bool = False) -> list[Path]:
-        pattern = '**/*' if recursive else '*'
-        items: list[Path] = []
-        if not source.path.exists() or not source.path.is_dir():
-            return items
+        return [entry.path for entry in self.scan_media({'image'}, recursive=recursive)]
+
+    def media_entry(self, path: Path) -> 'MediaEntry | None':
+        """Stat and classify a single path the same way a full walk would."""
+        media_type = media_type_for_suffix(path.suffix)
+        if not media_type:
+            return None
         try:
-            for ext in extensions:
-                items.extend(source.path.glob(f"{pattern}{ext}"))
-                if include_uppercase:
-                    items.extend(source.path.glob(f"{pattern}{ext.upper()}"))
-        except Exception:
-            return []
-        return items
-            
+            stat = path.stat()
+        except OSError:
+            return None
+        return MediaEntry(
+            path=path,
+            uri=self.get_relative_path(path),
+            media_type=media_type,
+            size_bytes=int(stat.st_size),
+            mtime=float(stat.st_mtime),
+        )
+
+    def walk_source(
+        self,
+        source: MediaSource,
+        *,
+        media_types: set[str] | None = None,
+        recursive: bool = True,
+        known_directories: dict[str, float] | None = None,
+    ) -> 'SourceWalk':
+        """Walk one source with os.scandir.
+
+        Directories whose mtime matches ``known_directories`` are not listed again;
+        their subdirectories come from the known state and are only stat'ed, so a
+        file created, removed or renamed is picked up but in-place edits are not.
+        """
+        entries: list[MediaEntry] = []
+        directories: dict[str, float] = {}
+        listed: set[str] = set()
+        walk = SourceWalk(source, entries, directories, listed)
+        earlier_sources = self.sources[:self.sources.index(source)] if source in self.sources else []
+        # URIs belong to the first source containing a file (see ref_for_path), so a
+        # source nested in an earlier one is covered by that walk, and an earlier
+        # source nested in this one is left to its own walk.
+        if any(source.path.is_relative_to(other.path) for other in earlier_sources):
+            return walk
+        try:
+            root_stat = source.path.stat()
+        except OSError:
+            return walk
+        if not stat_module.S_ISDIR(root_stat.st_mode):
+            return walk
+        known = known_directories or {}
+        known_children: dict[str, list[str]] = {}
+        for rel_dir in known:
+            if rel_dir:
+                known_children.setdefault(rel_dir.rpartition('/')[0], []).append(rel_dir)
+        earlier_roots = {str(other.path) for other in earlier_sources}
+        root = str(source.path)
+        pending = [('', float(root_stat.st_mtime))]
+        while pending:
+            rel_dir, dir_mtime = pending.pop()
+            directories[rel_dir] = dir_mtime
+            dir_path = os.path.join(root, rel_dir) if rel_dir else root
+            if known.get(rel_dir) == dir_mtime:
+                if not recursive:
+                    continue
+                for child in known_children.get(rel_dir, ()):
+                    try:
+                        child_stat = os.stat(os.path.join(root, child))
+                    except OSError:
+                        continue
+                    if stat_module.S_ISDIR(child_stat.st_mode):
+                        pending.append((child, float(child_stat.st_mtime)))
+                continue
+            try:
+                with os.scandir(dir_path) as iterator:
+                    dir_entries = list(iterator)
+            except OSError:
+                continue
+            listed.add(rel_dir)
+            prefix = f"{rel_dir}/" if rel_dir else ''
+            for entry in dir_entries:
+                try:
+                    if entry.is_dir():
+                        # Like Path.glob('**'), do not descend into symlinked directories.
+                        if recursive and not entry.is_symlink() and entry.path not in earlier_roots:
+                            pending.append((f"{prefix}{entry.name}", float(entry.stat().st_mtime)))
+                        continue
+                    media_type = media_type_for_suffix(os.path.splitext(entry.name)[1])
+                    if not media_type or (media_types and media_type not in media_types):
+                        continue
+                    is_symlink = entry.is_symlink()
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                path = Path(entry.path)
+                entries.append(MediaEntry(
+                    path=path,
+                    # Symlinked files resolve to their target's URI so aliases collapse.
+                    uri=self.get_relative_path(path) if is_symlink else MediaRef(source.id, f"{prefix}{entry.name}").to_uri(),
+                    media_type=media_type,
+                    size_bytes=int(stat.st_size),
+                    mtime=float(stat.st_mtime),
+                ))
+        return walk
+
     def get_relative_path(self, path: Path) -> str:
         ref = self.ref_for_path(path)
         return ref.to_uri() if ref else str(path)
@@ -234,18 +352,25 @@ class LibraryService:
 
 
 class FavoriteService:
+    """Favorite media URIs, kept in the app database as canonical URIs.
+
+    ``favorites.json`` and the older per-library ``favorite.json`` are imported
+    once each; ``media_favorite_imports`` remembers which files were read.
+    """
+
     def __init__(
         self,
         media_root: str | Path | None = None,
         *,
+        database,
         db_path: Path | None = None,
         library_service: LibraryService | None = None,
     ):
+        self.database = database
         self.db_path = db_path or (Path(media_root) / FAVORITE_FILENAME)
         self.library_service = library_service
         self.legacy_db_path = Path(media_root) / FAVORITE_FILENAME if media_root else None
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self._import_legacy_if_needed()
+        self._import_json_once()
 
     def _normalize(self, filename: str) -> str:
         if self.library_service:
@@ -262,47 +387,55 @@ class FavoriteService:
         except:
             return set()
 
-    def _import_legacy_if_needed(self) -> None:
-        if not self.library_service or not self.legacy_db_path or not self.legacy_db_path.exists():
+    def _import_json_once(self) -> None:
+        paths = [path for path in (self.db_path, self.legacy_db_path) if path and path.exists()]
+        if not paths:
             return
-        existing = self._read_raw(self.db_path)
-        legacy = self._read_raw(self.legacy_db_path)
-        merged = set(existing)
-        for item in legacy:
-            canonical = self.library_service.canonicalize_uri(item)
-            if canonical:
-                merged.add(canonical)
-        if merged != existing:
-            self.save(merged)
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with self.database.connect() as conn:
+            for path in dict.fromkeys(path.resolve() for path in paths):
+                if conn.execute(
+                    "SELECT 1 FROM media_favorite_imports WHERE path = ?",
+                    (str(path),),
+                ).fetchone():
+                    continue
+                uris = {self._normalize(item) for item in self._read_raw(path) if item}
+                conn.executemany(
+                    "INSERT OR IGNORE INTO media_favorites(uri, created_at) VALUES (?, ?)",
+                    [(uri, now) for uri in sorted(uris) if uri],
+                )
+                conn.execute(
+                    "INSERT INTO media_favorite_imports(path, item_count, imported_at) VALUES (?, ?, ?)",
+                    (str(path), len(uris), now),
+                )
 
     def load(self) -> set[str]:
-        values = self._read_raw(self.db_path)
-        if self.library_service:
-            return self.library_service.canonicalize_many(values)
-        return values
+        with self.database.connect(read_only=True) as conn:
+            return {str(row[0]) for row in conn.execute("SELECT uri FROM media_favorites")}
 
-    def save(self, favorites: set[str]):
-        try:
-            with self.db_path.open('w', encoding='utf-8') as f:
-                json.dump(sorted(self._normalize(item) for item in favorites if normalize_media_uri(item)), f, ensure_ascii=False)
-        except Exception as e:
-            print(f"Failed to save favorites: {e}")
+    def count(self) -> int:
+        with self.database.connect(read_only=True) as conn:
+            return int(conn.execute("SELECT COUNT(*) FROM media_favorites").fetchone()[0])
 
     def toggle(self, filename: str) -> bool:
         """Toggle favorite status, returns new state (True=fav, False=unfav)."""
-        favs = self.load()
         key = self._normalize(filename)
-        if key in favs:
-            favs.remove(key)
-            is_fav = False
-        else:
-            favs.add(key)
-            is_fav = True
-        self.save(favs)
-        return is_fav
+        with self.database.connect() as conn:
+            if conn.execute("DELETE FROM media_favorites WHERE uri = ?", (key,)).rowcount:
+                return False
+            conn.execute(
+                "INSERT INTO media_favorites(uri, created_at) VALUES (?, ?)",
+                (key, datetime.datetime.now(datetime.timezone.utc).isoformat()),
+            )
+        return True
 
     def is_favorite(self, filename: str) -> bool:
-        return self._normalize(filename) in self.load()
+        with self.database.connect(read_only=True) as conn:
+            row = conn.execute(
+                "SELECT 1 FROM media_favorites WHERE uri = ?",
+                (self._normalize(filename),),
+            ).fetchone()
+        return row is not None
 
 
 class RecommendService:
@@ -322,7 +455,7 @@ class RecommendService:
         """Get intelligent random selection of files."""
         if self.media_index:
             candidates = [
-                {'uri': item['name'], 'mtime': item['mtime_ts']}
+                {'uri': item['name'], 'mtime': item['mtime_ts'], 'is_favorite': item['is_favorite']}
                 for item in self.media_index.records(media_type=file_type)
             ]
         elif file_type == 'video':
@@ -338,7 +471,7 @@ class RecommendService:
         if not candidates:
             return []
 
-        favs = self.favorites.load()
+        favs = set() if self.media_index else self.favorites.load()
         names = [item['uri'] for item in candidates]
         profiles = self.activity_store.profiles_for(names) if self.activity_store else {}
         dimension_scores = self.activity_store.dimension_scores() if self.activity_store else {}
@@ -349,7 +482,7 @@ class RecommendService:
             try:
                 rel_path = candidate['uri']
                 mtime = candidate['mtime']
-                is_fav = self.library.is_uri_in_set(rel_path, favs)
+                is_fav = candidate.get('is_favorite') or self.library.is_uri_in_set(rel_path, favs)
                 base_score = 2.0 if is_fav else 1.0
                 age_days = max((now - datetime.datetime.fromtimestamp(mtime)).total_seconds() / 86400, 0.0)
                 time_score = math.exp(-age_days / 90.0)
@@ -2,8 +2,6 @@ from __future__ import annotations
 
 import datetime
 import json
-import os
-import threading
 import uuid
 from pathlib import Path
 from typing import Any
@@ -15,6 +13,14 @@ MAX_COLLECTION_DESCRIPTION_LENGTH = 280
 MAX_COLLECTION_ITEMS_MUTATION = 200
 
 
+_COLLECTION_SELECT = """
+    SELECT media_collections.*,
+      (SELECT COUNT(*) FROM media_collection_items
+       WHERE media_collection_items.collection_id = media_collections.id) AS item_count
+    FROM media_collections
+"""
+
+
 def _utc_now_iso() -> str:
     return datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
@@ -31,13 +37,21 @@ def _normalize_text(value: Any) -> str:
 
 
 class CollectionStore:
-    def __init__(self, store_path: Path):
+    """Named collections of media URIs, kept in the app database.
+
+    Each collection item is its own ``media_collection_items`` row, so adding,
+    removing or looking up one URI does not rewrite the whole store. A legacy
+    ``collections.json`` is imported once; ``media_collection_imports``
+    remembers that it was read.
+    """
+
+    def __init__(self, database, store_path: Path | None = None):
+        self.database = database
         self.store_path = store_path
-        self.store_path.parent.mkdir(parents=True, exist_ok=True)
-        self._lock = threading.Lock()
+        self._import_json_once()
 
     def _read(self) -> dict[str, Any]:
-        if not self.store_path.exists():
+        if not self.store_path or not self.store_path.exists():
             return {
                 "version": COLLECTIONS_VERSION,
                 "updated_at": _utc_now_iso(),
@@ -54,6 +68,44 @@ class CollectionStore:
             }
         return self._normalize_payload(payload)
 
+    def _import_json_once(self) -> None:
+        if not self.store_path or not self.store_path.exists():
+            return
+        path = str(self.store_path.resolve())
+        with self.database.connect() as conn:
+            if conn.execute("SELECT 1 FROM media_collection_imports WHERE path = ?", (path,)).fetchone():
+                return
+            collections = self._read()["collections"]
+            for item in collections:
+                conn.execute(
+                    """
+                    INSERT OR IGNORE INTO media_collections(id, name, description, cover_uri, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        item["id"],
+                        item["name"],
+                        item["description"],
+                        item["cover_uri"],
+                        item["created_at"],
+                        item["updated_at"],
+                    ),
+                )
+                conn.executemany(
+                    """
+                    INSERT OR IGNORE INTO media_collection_items(collection_id, uri, position, added_at)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    [
+                        (item["id"], entry["uri"], position, entry["added_at"])
+                        for position, entry in enumerate(item["items"])
+                    ],
+                )
+            conn.execute(
+                "INSERT INTO media_collection_imports(path, item_count, imported_at) VALUES (?, ?, ?)",
+                (path, len(collections), _utc_now_iso()),
+            )
+
     def _normalize_payload(self, payload: Any) -> dict[str, Any]:
         data = payload if isinstance(payload, dict) else {}
         raw_collections = data.get("collections")
@@ -116,27 +168,17 @@ class CollectionStore:
             "items": items,
         }
 
-    def _write(self, payload: dict[str, Any]) -> None:
-        tmp_path = self.store_path.with_name(self.store_path.name + ".tmp")
-        with tmp_path.open("w", encoding="utf-8") as f:
-            json.dump(payload, f, ensure_ascii=False, indent=2)
-        os.replace(tmp_path, self.store_path)
-
     def list(self) -> list[dict[str, Any]]:
-        with self._lock:
-            payload = self._read()
-            return [self._collection_copy(item, include_items=False) for item in payload["collections"]]
+        with self.database.connect(read_only=True) as conn:
+            rows = conn.execute(f"{_COLLECTION_SELECT} ORDER BY updated_at DESC, rowid DESC").fetchall()
+        return [self._collection_copy(row) for row in rows]
 
     def get(self, collection_id: str) -> dict[str, Any] | None:
         key = _normalize_text(collection_id)
         if not key:
             return None
-        with self._lock:
-            payload = self._read()
-            found = self._find_collection(payload["collections"], key)
-            if not found:
-                return None
-            return self._collection_copy(found, include_items=True)
+        with self.database.connect(read_only=True) as conn:
+            return self._get(conn, key)
 
     def create(self, name: str, description: str = "") -> dict[str, Any]:
         clean_name = _normalize_text(name)[:MAX_COLLECTION_NAME_LENGTH]
@@ -145,22 +187,16 @@ class CollectionStore:
         clean_desc = _normalize_text(description)[:MAX_COLLECTION_DESCRIPTION_LENGTH]
 
         now = _utc_now_iso()
-        item = {
-            "id": "col_" + uuid.uuid4().hex[:12],
-            "name": clean_name,
-            "description": clean_desc,
-            "cover_uri": "",
-            "created_at": now,
-            "updated_at": now,
-            "item_count": 0,
-            "items": [],
-        }
-        with self._lock:
-            payload = self._read()
-            payload["collections"].insert(0, item)
-            payload["updated_at"] = now
-            self._write(payload)
-        return self._collection_copy(item, include_items=True)
+        collection_id = "col_" + uuid.uuid4().hex[:12]
+        with self.database.connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO media_collections(id, name, description, cover_uri, created_at, updated_at)
+                VALUES (?, ?, ?, '', ?, ?)
+                """,
+                (collection_id, clean_name, clean_desc, now, now),
+            )
+            return self._get(conn, collection_id)
 
     def update(
         self,
@@ -174,52 +210,37 @@ class CollectionStore:
         if not key:
             return None
 
-        with self._lock:
-            payload = self._read()
-            found = self._find_collection(payload["collections"], key)
-            if not found:
+        changes: dict[str, str] = {}
+        if name is not None:
+            clean = _normalize_text(name)[:MAX_COLLECTION_NAME_LENGTH]
+            if not clean:
+                raise ValueError("name 不能为空。")
+            changes["name"] = clean
+        if description is not None:
+            changes["description"] = _normalize_text(description)[:MAX_COLLECTION_DESCRIPTION_LENGTH]
+        with self.database.connect() as conn:
+            if not self._exists(conn, key):
                 return None
-
-            if name is not None:
-                clean = _normalize_text(name)[:MAX_COLLECTION_NAME_LENGTH]
-                if not clean:
-                    raise ValueError("name 不能为空。")
-                found["name"] = clean
-            if description is not None:
-                found["description"] = _normalize_text(description)[:MAX_COLLECTION_DESCRIPTION_LENGTH]
             if cover_uri is not None:
                 normalized_cover = _normalize_uri(cover_uri)
-                if normalized_cover and all(entry["uri"] != normalized_cover for entry in found["items"]):
+                if normalized_cover and not self._has_item(conn, key, normalized_cover):
                     raise ValueError("cover_uri 不在集合条目中。")
-                found["cover_uri"] = normalized_cover
-
-            found["item_count"] = len(found["items"])
-            if not found["cover_uri"] and found["items"]:
-                found["cover_uri"] = found["items"][-1]["uri"]
-            if found["cover_uri"] and all(entry["uri"] != found["cover_uri"] for entry in found["items"]):
-                found["cover_uri"] = found["items"][-1]["uri"] if found["items"] else ""
-
-            now = _utc_now_iso()
-            found["updated_at"] = now
-            payload["updated_at"] = now
-            payload["collections"].sort(key=lambda item: item.get("updated_at", ""), reverse=True)
-            self._write(payload)
-            return self._collection_copy(found, include_items=True)
+                changes["cover_uri"] = normalized_cover
+            changes["updated_at"] = _utc_now_iso()
+            conn.execute(
+                f"UPDATE media_collections SET {', '.join(f'{column} = ?' for column in changes)} WHERE id = ?",
+                [*changes.values(), key],
+            )
+            self._repair_cover(conn, key)
+            return self._get(conn, key)
 
     def delete(self, collection_id: str) -> bool:
         key = _normalize_text(collection_id)
         if not key:
             return False
-        with self._lock:
-            payload = self._read()
-            collections = payload["collections"]
-            next_collections = [item for item in collections if item.get("id") != key]
-            if len(next_collections) == len(collections):
-                return False
-            payload["collections"] = next_collections
-            payload["updated_at"] = _utc_now_iso()
-            self._write(payload)
-            return True
+        with self.database.connect() as conn:
+            # Items go with their collection through ON DELETE CASCADE.
+            return conn.execute("DELETE FROM media_collections WHERE id = ?", (key,)).rowcount > 0
 
     def add_items(self, collection_id: str, uris: list[str]) -> dict[str, Any] | None:
         key = _normalize_text(collection_id)
@@ -229,87 +250,81 @@ class CollectionStore:
         if not normalized:
             return self.get(collection_id)
 
-        with self._lock:
-            payload = self._read()
-            found = self._find_collection(payload["collections"], key)
-            if not found:
+        with self.database.connect() as conn:
+            if not self._exists(conn, key):
                 return None
-
-            seen = {entry["uri"] for entry in found["items"]}
             now = _utc_now_iso()
-            changed = False
+            next_position = int(conn.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM media_collection_items WHERE collection_id = ?",
+                (key,),
+            ).fetchone()[0])
+            changed = 0
             for uri in normalized:
-                if uri in seen:
-                    continue
-                found["items"].append({"uri": uri, "added_at": now})
-                seen.add(uri)
-                changed = True
+                changed += conn.execute(
+                    """
+                    INSERT OR IGNORE INTO media_collection_items(collection_id, uri, position, added_at)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    (key, uri, next_position + changed, now),
+                ).rowcount
             if changed:
-                found["item_count"] = len(found["items"])
-                if not found["cover_uri"]:
-                    found["cover_uri"] = found["items"][-1]["uri"]
-                found["updated_at"] = now
-                payload["updated_at"] = now
-                payload["collections"].sort(key=lambda item: item.get("updated_at", ""), reverse=True)
-                self._write(payload)
-            return self._collection_copy(found, include_items=True)
+                conn.execute("UPDATE media_collections SET updated_at = ? WHERE id = ?", (now, key))
+                self._repair_cover(conn, key)
+            return self._get(conn, key)
 
     def remove_items(self, collection_id: str, uris: list[str]) -> dict[str, Any] | None:
         key = _normalize_text(collection_id)
         if not key:
             return None
-        normalized = set(self._normalize_mutation_uris(uris))
+        normalized = self._normalize_mutation_uris(uris)
         if not normalized:
             return self.get(collection_id)
 
-        with self._lock:
-            payload = self._read()
-            found = self._find_collection(payload["collections"], key)
-            if not found:
+        with self.database.connect() as conn:
+            if not self._exists(conn, key):
                 return None
-
-            next_items = [entry for entry in found["items"] if entry["uri"] not in normalized]
-            if len(next_items) == len(found["items"]):
-                return self._collection_copy(found, include_items=True)
-
-            found["items"] = next_items
-            found["item_count"] = len(next_items)
-            if found["cover_uri"] and all(entry["uri"] != found["cover_uri"] for entry in next_items):
-                found["cover_uri"] = next_items[-1]["uri"] if next_items else ""
-            elif not found["cover_uri"] and next_items:
-                found["cover_uri"] = next_items[-1]["uri"]
-
-            now = _utc_now_iso()
-            found["updated_at"] = now
-            payload["updated_at"] = now
-            payload["collections"].sort(key=lambda item: item.get("updated_at", ""), reverse=True)
-            self._write(payload)
-            return self._collection_copy(found, include_items=True)
+            removed = conn.execute(
+                """
+                DELETE FROM media_collection_items
+                WHERE collection_id = ? AND uri IN (SELECT value FROM json_each(?))
+                """,
+                (key, json.dumps(normalized)),
+            ).rowcount
+            if removed:
+                conn.execute("UPDATE media_collections SET updated_at = ? WHERE id = ?", (_utc_now_iso(), key))
+                self._repair_cover(conn, key)
+            return self._get(conn, key)
 
     def list_for_media(self, uri: str) -> list[dict[str, Any]]:
         key = _normalize_uri(uri)
         if not key:
             return []
-        with self._lock:
-            payload = self._read()
-            result: list[dict[str, Any]] = []
-            for item in payload["collections"]:
-                if any(entry["uri"] == key for entry in item["items"]):
-                    result.append(self._collection_copy(item, include_items=False))
-            return result
+        with self.database.connect(read_only=True) as conn:
+            rows = conn.execute(
+                f"""
+                {_COLLECTION_SELECT}
+                WHERE id IN (SELECT collection_id FROM media_collection_items WHERE uri = ?)
+                ORDER BY updated_at DESC, rowid DESC
+                """,
+                (key,),
+            ).fetchall()
+        return [self._collection_copy(row) for row in rows]
 
     def list_item_uris(self, collection_id: str, *, newest_first: bool = True) -> list[str]:
-        data = self.get(collection_id)
-        if not data:
-            return []
-        items = data.get("items") if isinstance(data, dict) else []
-        if not isinstance(items, list):
+        key = _normalize_text(collection_id)
+        if not key:
             return []
-        uris = [str(entry.get("uri") or "") for entry in items if isinstance(entry, dict)]
-        uris = [uri for uri in uris if uri]
-        if newest_first:
-            uris.reverse()
-        return uris
+        direction = "DESC" if newest_first else "ASC"
+        with self.database.connect(read_only=True) as conn:
+            rows = conn.execute(
+                f"""
+                SELECT uri FROM media_collection_items
+                WHERE collection_id = ?
+                ORDER BY position {direction}
+                """,
+                (key,),
+            ).fetchall()
+        return [str(row[0]) for row in rows]
 
     def _normalize_mutation_uris(self, uris: Any) -> list[str]:
         if not isinstance(uris, list):
@@ -326,35 +341,64 @@ class CollectionStore:
                 break
         return normalized
 
-    def _find_collection(self, collections: list[dict[str, Any]], collection_id: str) -> dict[str, Any] | None:
-        for item in collections:
-            if item.get("id") == collection_id:
-                return item
-        return None
-
-    def _collection_copy(self, item: dict[str, Any], *, include_items: bool) -> dict[str, Any]:
-        data = {
-            "id": str(item.get("id") or ""),
-            "name": str(item.get("name") or ""),
-            "description": str(item.get("description") or ""),
-            "cover_uri": str(item.get("cover_uri") or ""),
-            "created_at": str(item.get("created_at") or ""),
-            "updated_at": str(item.get("updated_at") or ""),
-            "item_count": int(item.get("item_count") or 0),
-        }
-        if include_items:
-            items = item.get("items")
-            normalized_items: list[dict[str, str]] = []
-            if isinstance(items, list):
-                for entry in items:
-                    if not isinstance(entry, dict):
-                        continue
-                    uri = _normalize_uri(entry.get("uri"))
-                    if not uri:
-                        continue
-                    normalized_items.append({
-                        "uri": uri,
-                        "added_at": _normalize_text(entry.get("added_at")) or data["created_at"] or _utc_now_iso(),
-                    })
-            data["items"] = normalized_items
+    @staticmethod
+    def _exists(conn, collection_id: str) -> bool:
+        return conn.execute("SELECT 1 FROM media_collections WHERE id = ?", (collection_id,)).fetchone() is not None
+
+    @staticmethod
+    def _has_item(conn, collection_id: str, uri: str) -> bool:
+        return conn.execute(
+            "SELECT 1 FROM media_collection_items WHERE collection_id = ? AND uri = ?",
+            (collection_id, uri),
+        ).fetchone() is not None
+
+    def _repair_cover(self, conn, collection_id: str) -> None:
+        """Point the cover at the newest item when it is unset or no longer in the collection."""
+        cover_uri = str(conn.execute(
+            "SELECT cover_uri FROM media_collections WHERE id = ?",
+            (collection_id,),
+        ).fetchone()[0] or "")
+        if cover_uri and self._has_item(conn, collection_id, cover_uri):
+            return
+        newest = conn.execute(
+            """
+            SELECT uri FROM media_collection_items
+            WHERE collection_id = ?
+            ORDER BY position DESC
+            LIMIT 1
+            """,
+            (collection_id,),
+        ).fetchone()
+        next_cover = str(newest[0]) if newest else ""
+        if next_cover != cover_uri:
+            conn.execute("UPDATE media_collections SET cover_uri = ? WHERE id = ?", (next_cover, collection_id))
+
+    def _get(self, conn, collection_id: str) -> dict[str, Any] | None:
+        row = conn.execute(f"{_COLLECTION_SELECT} WHERE id = ?", (collection_id,)).fetchone()
+        if not row:
+            return None
+        data = self._collection_copy(row)
+        data["items"] = [
+            {"uri": str(item["uri"]), "added_at": str(item["added_at"])}
+            for item in conn.execute(
+                """
+                SELECT uri, added_at FROM media_collection_items
+                WHERE collection_id = ?
+                ORDER BY position
+                """,
+                (collection_id,),
+            )
+        ]
         return data
+
+    @staticmethod
+    def _collection_copy(row) -> dict[str, Any]:
+        return {
+            "id": str(row["id"] or ""),
+            "name": str(row["name"] or ""),
+            "description": str(row["description"] or ""),
+            "cover_uri": str(row["cover_uri"] or ""),
+            "created_at": str(row["created_at"] or ""),
+            "updated_at": str(row["updated_at"] or ""),
+            "item_count": int(row["item_count"] or 0),
+        }
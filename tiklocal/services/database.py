@@ -1,6 +1,8 @@
 import datetime
 import json
 import sqlite3
+import threading
+import weakref
 from dataclasses import dataclass
 from pathlib import Path, PurePosixPath
 from typing import Callable
@@ -267,6 +269,438 @@ def _migrate_008_add_time_metadata_version(conn: sqlite3.Connection) -> None:
         )
 
 
+def _migrate_009_create_media_directories(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_directories (
+          source_id TEXT NOT NULL,
+          rel_dir TEXT NOT NULL,
+          mtime REAL NOT NULL,
+          synced_at TEXT NOT NULL,
+          PRIMARY KEY (source_id, rel_dir)
+        )
+        """
+    )
+
+
+# Library queries filter on this exact expression; the partial indexes below
+# only apply when a query repeats it verbatim. The unary plus keeps the IN list
+# from driving a media_type-leading index, which would force a sort on every
+# page without ANALYZE statistics.
+VISUAL_MEDIA_FILTER = "+media_type IN ('video', 'image')"
+
+
+def _migrate_010_add_media_items_covering_indexes(conn: sqlite3.Connection) -> None:
+    # idx_media_items_time_version came from an earlier migration 9; databases
+    # that ran it still carry the index until this one drops it.
+    for name in (
+        "idx_media_items_type_mtime",
+        "idx_media_items_capture_month",
+        "idx_media_items_time_version",
+    ):
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    indexes = {
+        # Library pages ordered by mtime, and the keyset seek on (mtime, uri).
+        "idx_media_items_visual_mtime": f"(mtime DESC, uri, media_type) WHERE {VISUAL_MEDIA_FILTER}",
+        # Single-type pages (video, big files), per-type counts and stats().
+        "idx_media_items_type_mtime_uri": "(media_type, mtime DESC, uri, size_bytes)",
+        # Month pages and timeline covers ordered by capture time.
+        "idx_media_items_visual_month_captured": (
+            f"(capture_month, captured_at DESC, uri, media_type) WHERE {VISUAL_MEDIA_FILTER}"
+        ),
+        # Timeline month and year aggregates, answered from the index alone.
+        "idx_media_items_visual_month_rollup": (
+            f"(capture_month, media_type, mtime) WHERE {VISUAL_MEDIA_FILTER}"
+        ),
+        "idx_media_items_visual_year_month": (
+            f"(capture_year, capture_month, media_type) WHERE {VISUAL_MEDIA_FILTER}"
+        ),
+        "idx_media_items_time_version_dir": "(time_metadata_version, source_id, parent_path)",
+    }
+    for name, definition in indexes.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON media_items{definition}")
+
+
+def _migrate_011_create_media_search(conn: sqlite3.Connection) -> None:
+    # Caption and tag text per uri. The integer id is the FTS rowid; unlike the
+    # implicit rowid of media_items it survives VACUUM. MediaIndexStore adds and
+    # removes search rows alongside media_items in its batched writes. The FTS
+    # table needs FTS5 with the trigram tokenizer (SQLite 3.34+); without it the
+    # table is skipped and MediaIndexStore searches with LIKE only.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_search_text (
+          id INTEGER PRIMARY KEY,
+          uri TEXT NOT NULL UNIQUE,
+          caption TEXT NOT NULL DEFAULT '',
+          tags TEXT NOT NULL DEFAULT ''
+        )
+        """
+    )
+    conn.execute("INSERT OR IGNORE INTO media_search_text(uri) SELECT uri FROM media_items")
+    conn.execute("SAVEPOINT media_search_fts")
+    try:
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS media_search USING fts5(
+              filename, rel_path, caption, tags,
+              tokenize = 'trigram'
+            )
+            """
+        )
+    except sqlite3.OperationalError:
+        conn.execute("ROLLBACK TO media_search_fts")
+        conn.execute("RELEASE media_search_fts")
+        return
+    conn.execute("RELEASE media_search_fts")
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS media_search_text_update AFTER UPDATE OF caption, tags ON media_search_text
+        BEGIN
+          UPDATE media_search SET caption = new.caption, tags = new.tags WHERE rowid = new.id;
+        END
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO media_search(rowid, filename, rel_path, caption, tags)
+        SELECT t.id, m.filename, m.rel_path, t.caption, t.tags
+        FROM media_items m JOIN media_search_text t ON t.uri = m.uri
+        """
+    )
+
+
+def _migrate_012_create_media_month_rollups(conn: sqlite3.Connection) -> None:
+    # The backfill is a frozen copy of MediaIndexStore.refresh_month_rollups and
+    # its cover sampler as of this version, so later changes there cannot break
+    # upgrades from older schemas.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_month_rollups (
+          capture_month TEXT PRIMARY KEY,
+          capture_year TEXT NOT NULL,
+          item_count INTEGER NOT NULL,
+          image_count INTEGER NOT NULL,
+          video_count INTEGER NOT NULL,
+          latest_mtime REAL NOT NULL,
+          covers TEXT NOT NULL DEFAULT '[]'
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_media_month_rollups_year
+        ON media_month_rollups(capture_year, item_count)
+        """
+    )
+    conn.execute(
+        f"""
+        INSERT OR REPLACE INTO media_month_rollups(
+          capture_month, capture_year, item_count, image_count, video_count, latest_mtime
+        )
+        SELECT
+          capture_month,
+          substr(capture_month, 1, 4),
+          COUNT(*),
+          SUM(CASE WHEN media_type = 'image' THEN 1 ELSE 0 END),
+          SUM(CASE WHEN media_type = 'video' THEN 1 ELSE 0 END),
+          MAX(mtime)
+        FROM media_items
+        WHERE {VISUAL_MEDIA_FILTER}
+        GROUP BY capture_month
+        """
+    )
+    candidates: dict[str, list[dict]] = {}
+    for month, uri, media_type in conn.execute(
+        f"""
+        SELECT capture_month, uri, media_type
+        FROM (
+          SELECT capture_month, uri, media_type, ROW_NUMBER() OVER (
+            PARTITION BY capture_month ORDER BY captured_at DESC, uri
+          ) AS position
+          FROM media_items
+          WHERE {VISUAL_MEDIA_FILTER}
+        )
+        WHERE position <= 120
+        ORDER BY capture_month, position
+        """
+    ):
+        candidates.setdefault(str(month), []).append({"uri": str(uri), "media_type": str(media_type)})
+    conn.executemany(
+        "UPDATE media_month_rollups SET covers = ? WHERE capture_month = ?",
+        [(json.dumps(_migration_012_covers(rows, 18)), month) for month, rows in candidates.items()],
+    )
+
+
+def _migration_012_covers(rows: list[dict], limit: int) -> list[dict]:
+    # Frozen copy of MediaIndexStore._sample_timeline_records: covers spread
+    # over the month, at most a quarter of them videos, topped up with images.
+    if len(rows) <= limit:
+        return rows
+    targets = {round(position * (len(rows) - 1) / max(1, limit - 1)) for position in range(limit)}
+    video_limit = max(1, limit // 4)
+    selected: list[dict] = []
+    deferred_videos: list[dict] = []
+    for row in (rows[index] for index in sorted(targets)):
+        if row["media_type"] == "video" and sum(item["media_type"] == "video" for item in selected) >= video_limit:
+            deferred_videos.append(row)
+        else:
+            selected.append(row)
+    selected_uris = {row["uri"] for row in selected}
+    for row in rows:
+        if len(selected) >= limit:
+            break
+        if row["uri"] not in selected_uris and row["media_type"] != "video":
+            selected.append(row)
+            selected_uris.add(row["uri"])
+    selected.extend(deferred_videos[:max(0, limit - len(selected))])
+    return selected[:limit]
+
+
+def _migrate_013_create_media_favorites(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_favorites (
+          uri TEXT PRIMARY KEY,
+          created_at TEXT NOT NULL
+        )
+        """
+    )
+    # JSON favorite files already read, so an unfavorite is not undone on the
+    # next start by importing the same file again.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_favorite_imports (
+          path TEXT PRIMARY KEY,
+          item_count INTEGER NOT NULL,
+          imported_at TEXT NOT NULL
+        )
+        """
+    )
+
+
+def _migrate_014_create_media_collections(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_collections (
+          id TEXT PRIMARY KEY,
+          name TEXT NOT NULL,
+          description TEXT NOT NULL DEFAULT '',
+          cover_uri TEXT NOT NULL DEFAULT '',
+          created_at TEXT NOT NULL,
+          updated_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_collection_items (
+          collection_id TEXT NOT NULL REFERENCES media_collections(id) ON DELETE CASCADE,
+          uri TEXT NOT NULL,
+          position INTEGER NOT NULL,
+          added_at TEXT NOT NULL,
+          PRIMARY KEY (collection_id, uri)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_media_collection_items_position
+        ON media_collection_items(collection_id, position)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_media_collection_items_uri
+        ON media_collection_items(uri)
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_collection_imports (
+          path TEXT PRIMARY KEY,
+          item_count INTEGER NOT NULL,
+          imported_at TEXT NOT NULL
+        )
+        """
+    )
+
+
+def _migrate_015_create_media_meta(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_meta (
+          uri TEXT PRIMARY KEY,
+          width INTEGER,
+          height INTEGER,
+          caption TEXT NOT NULL DEFAULT '',
+          tags TEXT NOT NULL DEFAULT '[]',
+          payload TEXT NOT NULL DEFAULT '{}',
+          updated_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_meta_imports (
+          path TEXT PRIMARY KEY,
+          item_count INTEGER NOT NULL,
+          imported_at TEXT NOT NULL
+        )
+        """
+    )
+
+
+def _migrate_016_add_media_meta_probe(conn: sqlite3.Connection) -> None:
+    columns = {
+        str(row[1])
+        for row in conn.execute("PRAGMA table_info(media_meta)").fetchall()
+    }
+    additions = {
+        "duration": "REAL",
+        "codec": "TEXT NOT NULL DEFAULT ''",
+        "probe_version": "INTEGER NOT NULL DEFAULT 0",
+        "probe_size": "INTEGER",
+        "probe_mtime": "REAL",
+    }
+    for name, definition in additions.items():
+        if name not in columns:
+            conn.execute(f"ALTER TABLE media_meta ADD COLUMN {name} {definition}")
+
+
+def _migrate_017_create_media_probe_cache(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_probe_cache (
+          uri TEXT PRIMARY KEY,
+          size_bytes INTEGER NOT NULL,
+          mtime REAL NOT NULL,
+          payload TEXT NOT NULL,
+          probed_at TEXT NOT NULL
+        )
+        """
+    )
+
+
+def _migrate_018_create_image_vector_state(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS image_vector_state (
+          id INTEGER PRIMARY KEY CHECK (id = 1),
+          generation INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute("INSERT OR IGNORE INTO image_vector_state(id, generation) VALUES (1, 0)")
+    # Every row change bumps the generation, so in-memory vector caches notice
+    # writes from other processes (e.g. a CLI vectorize next to the server).
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS image_vectors_generation_{event.lower()}
+            AFTER {event} ON image_vectors
+            BEGIN
+              UPDATE image_vector_state SET generation = generation + 1 WHERE id = 1;
+            END
+            """
+        )
+
+
+def _migrate_019_create_image_vector_lsh(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS image_vector_lsh (
+          uri TEXT PRIMARY KEY REFERENCES image_vectors(uri) ON DELETE CASCADE,
+          version INTEGER NOT NULL,
+          codes BLOB NOT NULL
+        )
+        """
+    )
+
+
+def _migrate_020_create_media_similarity_state(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_similarity_state (
+          kind TEXT PRIMARY KEY,
+          threshold REAL NOT NULL,
+          min_group_size INTEGER NOT NULL,
+          max_group_size INTEGER NOT NULL,
+          watermark TEXT NOT NULL,
+          updated_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_media_similarity_group_items_uri
+        ON media_similarity_group_items(uri)
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_image_vectors_indexed_at ON image_vectors(indexed_at, uri)")
+
+
+def _migrate_021_add_image_vector_encoding(conn: sqlite3.Connection) -> None:
+    columns = {
+        str(row[1])
+        for row in conn.execute("PRAGMA table_info(image_vectors)").fetchall()
+    }
+    additions = {
+        "embedding_encoding": "TEXT NOT NULL DEFAULT 'float32'",
+        "embedding_scale": "REAL NOT NULL DEFAULT 1.0",
+    }
+    for name, definition in additions.items():
+        if name not in columns:
+            conn.execute(f"ALTER TABLE image_vectors ADD COLUMN {name} {definition}")
+
+
+def _migrate_022_add_media_index_startup_count(conn: sqlite3.Connection) -> None:
+    columns = {
+        str(row[1])
+        for row in conn.execute("PRAGMA table_info(media_index_state)").fetchall()
+    }
+    if "startups_since_full_sync" not in columns:
+        conn.execute(
+            "ALTER TABLE media_index_state ADD COLUMN startups_since_full_sync INTEGER NOT NULL DEFAULT 0"
+        )
+
+
+# Search text for one media_meta row: the caption and its non-blank tags.
+_MEDIA_META_SEARCH_TAGS = """
+COALESCE((SELECT group_concat(trim(value), ' ') FROM json_each({row}.tags) WHERE trim(value) != ''), '')
+"""
+
+
+def _migrate_023_sync_media_search_text(conn: sqlite3.Connection) -> None:
+    # media_search_text mirrors captions and tags from media_meta on every
+    # write, so startup no longer copies all of media_meta into it.
+    for event in ("INSERT", "UPDATE OF caption, tags"):
+        name = "media_meta_search_insert" if event == "INSERT" else "media_meta_search_update"
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON media_meta
+            BEGIN
+              INSERT INTO media_search_text(uri, caption, tags)
+              VALUES (new.uri, new.caption, {_MEDIA_META_SEARCH_TAGS.format(row="new").strip()})
+              ON CONFLICT(uri) DO UPDATE SET caption = excluded.caption, tags = excluded.tags
+              WHERE media_search_text.caption IS NOT excluded.caption
+                OR media_search_text.tags IS NOT excluded.tags;
+            END
+            """
+        )
+    conn.execute(
+        f"""
+        INSERT INTO media_search_text(uri, caption, tags)
+        SELECT uri, caption, {_MEDIA_META_SEARCH_TAGS.format(row="media_meta").strip()}
+        FROM media_meta
+        WHERE caption != '' OR tags != '[]'
+        ON CONFLICT(uri) DO UPDATE SET caption = excluded.caption, tags = excluded.tags
+        WHERE media_search_text.caption IS NOT excluded.caption
+          OR media_search_text.tags IS NOT excluded.tags
+        """
+    )
+
+
 MIGRATIONS = [
     Migration(1, "create_image_vectors", _migrate_001_create_image_vectors),
     Migration(2, "create_media_similarity_groups", _migrate_002_create_media_similarity_groups),
@@ -276,23 +710,110 @@ MIGRATIONS = [
     Migration(6, "add_media_capture_time", _migrate_006_add_media_capture_time),
     Migration(7, "add_capture_calendar_buckets", _migrate_007_add_capture_calendar_buckets),
     Migration(8, "add_time_metadata_version", _migrate_008_add_time_metadata_version),
+    Migration(9, "create_media_directories", _migrate_009_create_media_directories),
+    Migration(10, "add_media_items_covering_indexes", _migrate_010_add_media_items_covering_indexes),
+    Migration(11, "create_media_search", _migrate_011_create_media_search),
+    Migration(12, "create_media_month_rollups", _migrate_012_create_media_month_rollups),
+    Migration(13, "create_media_favorites", _migrate_013_create_media_favorites),
+    Migration(14, "create_media_collections", _migrate_014_create_media_collections),
+    Migration(15, "create_media_meta", _migrate_015_create_media_meta),
+    Migration(16, "add_media_meta_probe", _migrate_016_add_media_meta_probe),
+    Migration(17, "create_media_probe_cache", _migrate_017_create_media_probe_cache),
+    Migration(18, "create_image_vector_state", _migrate_018_create_image_vector_state),
+    Migration(19, "create_image_vector_lsh", _migrate_019_create_image_vector_lsh),
+    Migration(20, "create_media_similarity_state", _migrate_020_create_media_similarity_state),
+    Migration(21, "add_image_vector_encoding", _migrate_021_add_image_vector_encoding),
+    Migration(22, "add_media_index_startup_count", _migrate_022_add_media_index_startup_count),
+    Migration(23, "sync_media_search_text", _migrate_023_sync_media_search_text),
 ]
 
 
 class AppDatabase:
+    """Application SQLite database with one reusable connection per thread.
+
+    ``connect()`` hands back the calling thread's connection, so PRAGMAs run once
+    per thread instead of once per query. Use it as ``with db.connect() as conn``:
+    the block commits (or rolls back) but leaves the connection open for reuse.
+    A thread's connections are closed once the thread has exited, so per-request
+    and per-job threads do not accumulate them.
+    """
+
     def __init__(self, db_path: Path):
         self.db_path = db_path
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: list[sqlite3.Connection] = []
+        self._opened = 0
+        self._reused = 0
+
+    def connect(self, *, read_only: bool = False) -> sqlite3.Connection:
+        attr = "read_conn" if read_only else "conn"
+        conn = getattr(self._local, attr, None)
+        if conn is not None:
+            with self._lock:
+                self._reused += 1
+            return conn
+        conn = self._open(read_only=read_only)
+        setattr(self._local, attr, conn)
+        with self._lock:
+            self._opened += 1
+            self._connections.append(conn)
+        weakref.finalize(threading.current_thread(), self._release, conn)
+        return conn
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            if conn not in self._connections:
+                return
+            self._connections.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
 
-    def connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path)
+    def _open(self, *, read_only: bool) -> sqlite3.Connection:
+        if read_only and not self.db_path.exists():
+            # mode=ro cannot create the file; fall back to a normal connection.
+            read_only = False
+        if read_only:
+            conn = sqlite3.connect(
+                f"{self.db_path.resolve().as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+            )
+        else:
+            # Connections never leave their thread; the flag only lets close()
+            # release every thread's connection at shutdown.
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
         conn.row_factory = sqlite3.Row
         conn.execute("PRAGMA foreign_keys = ON")
         conn.execute("PRAGMA busy_timeout = 5000")
-        conn.execute("PRAGMA journal_mode = WAL")
-        conn.execute("PRAGMA synchronous = NORMAL")
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
         return conn
 
+    def connection_stats(self) -> dict:
+        with self._lock:
+            return {
+                "opened": self._opened,
+                "reused": self._reused,
+                "open": len(self._connections),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
     def migrate(self) -> None:
         with self.connect() as conn:
             conn.execute(
@@ -401,7 +922,7 @@ class MediaActivityStore:
         if not unique:
             return {}
         results: dict[str, dict] = {}
-        with self.database.connect() as conn:
+        with self.database.connect(read_only=True) as conn:
             for start in range(0, len(unique), 500):
                 chunk = unique[start:start + 500]
                 placeholders = ",".join("?" for _ in chunk)
@@ -413,7 +934,7 @@ class MediaActivityStore:
         return results
 
     def dimension_scores(self) -> dict[tuple[str, str], float]:
-        with self.database.connect() as conn:
+        with self.database.connect(read_only=True) as conn:
             rows = conn.execute("SELECT * FROM preference_dimensions").fetchall()
         return {
             (str(row["dimension_type"]), str(row["dimension_value"])):
@@ -8,6 +8,10 @@ JPEG_SOI = b"\xff\xd8"
 JPEG_SOS = 0xDA
 JPEG_EOI = 0xD9
 JPEG_COM = 0xFE
+JPEG_APP1 = 0xE1
+JPEG_MAX_HEADER_SEGMENTS = 256
+EXIF_HEADER = b"Exif\x00\x00"
+EXIF_IFD_POINTER = 0x8769
 
 
 def _decode_comment(data: bytes) -> str:
@@ -19,49 +23,119 @@ def _decode_comment(data: bytes) -> str:
     return data.decode("utf-8", errors="replace").strip("\x00\r\n\t ")
 
 
-def read_jpeg_comments(path: Path) -> list[str]:
-    comments: list[str] = []
+def read_jpeg_segments(path: Path, markers: set[int]) -> list[tuple[int, bytes]] | None:
+    """Return wanted header segments, reading only their bytes.
+
+    Segments before the scan data are walked by seeking over their lengths, so a
+    large photo costs a few small reads instead of loading the whole file.
+    Returns None when the file cannot be opened or is not a JPEG; a read error
+    part way through returns the segments found so far.
+    """
+    segments: list[tuple[int, bytes]] = []
     try:
-        data = path.read_bytes()
+        handle = path.open("rb")
     except OSError:
-        return comments
-    if not data.startswith(JPEG_SOI):
-        return comments
-
-    idx = 2
-    size = len(data)
-    while idx + 4 <= size:
-        if data[idx] != 0xFF:
-            idx += 1
-            continue
-        while idx < size and data[idx] == 0xFF:
-            idx += 1
-        if idx >= size:
-            break
+        return None
+    with handle:
+        try:
+            if handle.read(2) != JPEG_SOI:
+                return None
+        except OSError:
+            return None
+        try:
+            for _ in range(JPEG_MAX_HEADER_SEGMENTS):
+                byte = handle.read(1)
+                if not byte:
+                    break
+                if byte[0] != 0xFF:
+                    continue
+                while byte and byte[0] == 0xFF:
+                    byte = handle.read(1)
+                if not byte:
+                    break
+
+                marker = byte[0]
+                if marker in {JPEG_SOS, JPEG_EOI} or 0xD0 <= marker <= 0xD7:
+                    break
+                length_bytes = handle.read(2)
+                if len(length_bytes) < 2:
+                    break
+                segment_length = int.from_bytes(length_bytes, "big")
+                if segment_length < 2:
+                    break
+                if marker in markers:
+                    payload = handle.read(segment_length - 2)
+                    if len(payload) < segment_length - 2:
+                        break
+                    segments.append((marker, payload))
+                else:
+                    handle.seek(segment_length - 2, 1)
+        except OSError:
+            pass
+    return segments
 
-        marker = data[idx]
-        idx += 1
-        if marker in {JPEG_SOS, JPEG_EOI} or 0xD0 <= marker <= 0xD7:
-            break
-        if idx + 2 > size:
-            break
 
-        segment_length = int.from_bytes(data[idx:idx + 2], "big")
-        if segment_length < 2:
-            break
-        segment_start = idx + 2
-        segment_end = segment_start + segment_length - 2
-        if segment_end > size:
-            break
-
-        if marker == JPEG_COM:
-            comment = _decode_comment(data[segment_start:segment_end])
-            if comment:
-                comments.append(comment)
-        idx = segment_end
+def read_jpeg_comments(path: Path) -> list[str]:
+    comments: list[str] = []
+    for _, payload in read_jpeg_segments(path, {JPEG_COM}) or []:
+        comment = _decode_comment(payload)
+        if comment:
+            comments.append(comment)
     return comments
 
 
+def _tiff_ascii_tags(tiff: bytes, offset: int, wanted: set[int], byte_order: str) -> tuple[dict[int, str], int]:
+    """Read ASCII tags from one TIFF IFD; also return the Exif sub-IFD offset."""
+    values: dict[int, str] = {}
+    exif_offset = 0
+    if offset + 2 > len(tiff):
+        return values, exif_offset
+    count = int.from_bytes(tiff[offset:offset + 2], byte_order)
+    for index in range(count):
+        entry = offset + 2 + index * 12
+        if entry + 12 > len(tiff):
+            break
+        tag = int.from_bytes(tiff[entry:entry + 2], byte_order)
+        field_type = int.from_bytes(tiff[entry + 2:entry + 4], byte_order)
+        length = int.from_bytes(tiff[entry + 4:entry + 8], byte_order)
+        if tag == EXIF_IFD_POINTER:
+            exif_offset = int.from_bytes(tiff[entry + 8:entry + 12], byte_order)
+        elif tag in wanted and field_type == 2:
+            if length <= 4:
+                raw = tiff[entry + 8:entry + 8 + length]
+            else:
+                start = int.from_bytes(tiff[entry + 8:entry + 12], byte_order)
+                raw = tiff[start:start + length]
+            values[tag] = raw.split(b"\x00", 1)[0].decode("ascii", errors="ignore")
+    return values, exif_offset
+
+
+def read_exif_ascii_tags(path: Path, tags: set[int]) -> dict[int, str] | None:
+    """Read ASCII EXIF tags from IFD0 and the Exif sub-IFD of a JPEG.
+
+    Returns None when the file is not a JPEG, so callers can fall back to Pillow.
+    """
+    segments = read_jpeg_segments(path, {JPEG_APP1})
+    if segments is None:
+        return None
+    values: dict[int, str] = {}
+    for _, payload in segments:
+        if not payload.startswith(EXIF_HEADER):
+            continue
+        tiff = payload[len(EXIF_HEADER):]
+        byte_order = {b"II": "little", b"MM": "big"}.get(tiff[:2])
+        if not byte_order or len(tiff) < 8:
+            continue
+        ifd0 = int.from_bytes(tiff[4:8], byte_order)
+        found, exif_offset = _tiff_ascii_tags(tiff, ifd0, tags, byte_order)
+        if exif_offset:
+            sub_found, _ = _tiff_ascii_tags(tiff, exif_offset, tags, byte_order)
+            found = {**sub_found, **found}
+        values.update(found)
+        break
+    return values
+
+
 def parse_prompt_model_comment(comment: str) -> dict[str, str] | None:
     text = str(comment or "").strip()
     if not text.startswith("Prompt:"):
@@ -4,6 +4,8 @@ import io
 import json
 import math
 import os
+import struct
+import threading
 from array import array
 from pathlib import Path
 from typing import Any
@@ -12,6 +14,20 @@ import requests
 from PIL import Image, ImageOps
 
 from tiklocal.services.database import AppDatabase
+from tiklocal.services.embedding_lsh import (
+    LSH_VERSION,
+    LSHBuckets,
+    blob_to_codes,
+    codes_to_blob,
+    lsh_codes,
+    lsh_codes_for_matrix,
+)
+from tiklocal.services.embedding_sidecar import SidecarVectors, VectorSidecar
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 EMBEDDING_BASE_URL_MAX_LENGTH = 512
@@ -22,6 +38,9 @@ EMBEDDING_IMAGE_MAX_SIZE_MIN = 128
 EMBEDDING_IMAGE_MAX_SIZE_MAX = 2048
 EMBEDDING_IMAGE_QUALITY_MIN = 50
 EMBEDDING_IMAGE_QUALITY_MAX = 95
+# How image_vectors.embedding is stored; recorded per row.
+VECTOR_ENCODINGS = ("float32", "float16", "int8")
+_VECTOR_ENCODING_ITEMSIZE = {"float32": 4, "float16": 2, "int8": 1}
 
 DEFAULT_EMBEDDING_CONFIG = {
     "enabled": False,
@@ -30,6 +49,7 @@ DEFAULT_EMBEDDING_CONFIG = {
     "dimensions": 768,
     "image_max_size": 512,
     "image_quality": 82,
+    "vector_encoding": "float32",
 }
 
 
@@ -41,7 +61,7 @@ def merge_embedding_config(base: dict[str, Any], override: dict[str, Any] | None
     merged = dict(base)
     if not override:
         return merged
-    for key in ("enabled", "base_url", "model_name", "dimensions", "image_max_size", "image_quality"):
+    for key in ("enabled", "base_url", "model_name", "dimensions", "image_max_size", "image_quality", "vector_encoding"):
         if key in override:
             merged[key] = override[key]
     return merged
@@ -105,6 +125,12 @@ def validate_embedding_config(
             return None, f"image_quality 必须在 {EMBEDDING_IMAGE_QUALITY_MIN} 到 {EMBEDDING_IMAGE_QUALITY_MAX} 之间。"
         cleaned["image_quality"] = image_quality
 
+    if "vector_encoding" in payload or not partial:
+        vector_encoding = str(payload.get("vector_encoding", DEFAULT_EMBEDDING_CONFIG["vector_encoding"])).strip().lower()
+        if vector_encoding not in VECTOR_ENCODINGS:
+            return None, "vector_encoding 必须是 float32、float16 或 int8。"
+        cleaned["vector_encoding"] = vector_encoding
+
     return cleaned, None
 
 
@@ -259,21 +285,276 @@ class OpenAICompatibleImageEmbeddingClient:
         return ""
 
 
+# Everything but the embedding BLOB, for reads that only need metadata.
+_VECTOR_METADATA_COLUMNS = """
+  uri, source_id, rel_path, model, dimensions, image_max_size, image_quality,
+  mtime, size_bytes, embedding_norm, embedding_encoding, indexed_at
+"""
+
+
+def encode_embedding(embedding, encoding: str = "float32") -> tuple[bytes, float, array]:
+    """Encode a vector for ``image_vectors.embedding``.
+
+    Returns (blob, scale, the float32 values the blob decodes to). float16
+    halves the float32 size; int8 quarters it by storing round(value / scale)
+    with one scale per vector (its largest magnitude / 127).
+    """
+    values = array("f", [float(value) for value in embedding])
+    if encoding == "float16":
+        blob = struct.pack(f"={len(values)}e", *values)
+        return blob, 1.0, array("f", struct.unpack(f"={len(values)}e", blob))
+    if encoding == "int8":
+        peak = max((abs(value) for value in values), default=0.0)
+        scale = peak / 127 if peak > 0 else 1.0
+        quantized = array("b", [max(-127, min(127, round(value / scale))) for value in values])
+        return quantized.tobytes(), scale, array("f", [value * scale for value in quantized])
+    return values.tobytes(), 1.0, values
+
+
+def decode_embedding(blob: bytes, encoding: str = "float32", scale: float = 1.0) -> array:
+    if encoding == "float16":
+        return array("f", struct.unpack(f"={len(blob) // 2}e", blob))
+    if encoding == "int8":
+        quantized = array("b")
+        quantized.frombytes(blob)
+        return array("f", [value * scale for value in quantized])
+    values = array("f")
+    values.frombytes(blob)
+    return values
+
+
+def _row_encoding(row) -> str:
+    return str(row["embedding_encoding"] or "float32")
+
+
+def _row_fits(row, dimensions: int) -> bool:
+    """Non-zero vector whose blob holds ``dimensions`` values in its encoding."""
+    width = _VECTOR_ENCODING_ITEMSIZE.get(_row_encoding(row), 0)
+    return float(row["embedding_norm"] or 0) > 0 and len(row["embedding"]) == dimensions * width
+
+
+def _decode_rows(rows, dimensions: int):
+    """Decode embedding rows of any encoding into one float32 (rows, dimensions) matrix."""
+    matrix = np.empty((len(rows), dimensions), dtype=np.float32)
+    for encoding, dtype in (("float32", np.float32), ("float16", np.float16), ("int8", np.int8)):
+        positions = [index for index, row in enumerate(rows) if _row_encoding(row) == encoding]
+        if not positions:
+            continue
+        block = np.frombuffer(b"".join(rows[index]["embedding"] for index in positions), dtype=dtype)
+        block = block.reshape(len(positions), dimensions).astype(np.float32)
+        if encoding == "int8":
+            block *= np.asarray([float(rows[index]["embedding_scale"]) for index in positions], dtype=np.float32)[:, None]
+        matrix[positions] = block
+    return matrix
+
+# Below these row counts exact search is fast enough that LSH candidates
+# would only cost recall.
+LSH_MIN_ROWS = 2000
+LSH_MIN_ROWS_NUMPY = 20000
+ANN_BUILD_BATCH_SIZE = 1000
+
+
+class _VectorMatrix:
+    """In-memory embeddings of one (model, dimensions) with a uri -> row map.
+
+    With NumPy the rows are unit vectors in one float32 matrix that grows by
+    doubling; without it they are ``array('f')`` values. Either way rows are
+    decoded from their stored encoding once, when they enter the matrix. Removing
+    a row moves the last one into its slot, so rows stay contiguous. Rows with
+    a zero norm or a mismatched length are left out, as queries skip them.
+
+    Large matrices whose rows all have LSH codes rank only the LSH candidates
+    of the query instead of every row.
+    """
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self.uris: list[str] = []
+        self.rows: dict[str, int] = {}
+        self.norms: list[float] = []
+        self.lsh = LSHBuckets()
+        self._vectors = np.empty((0, dimensions), dtype=np.float32) if np is not None else []
+
+    @classmethod
+    def from_rows(cls, dimensions: int, rows) -> "_VectorMatrix":
+        matrix = cls(dimensions)
+        rows = [row for row in rows if _row_fits(row, dimensions)]
+        matrix.uris = [str(row["uri"]) for row in rows]
+        matrix.rows = {uri: index for index, uri in enumerate(matrix.uris)}
+        matrix.norms = [float(row["embedding_norm"]) for row in rows]
+        if np is not None:
+            matrix._vectors = _decode_rows(rows, dimensions) / np.asarray(matrix.norms, dtype=np.float32)[:, None]
+        else:
+            matrix._vectors = [
+                decode_embedding(row["embedding"], _row_encoding(row), float(row["embedding_scale"]))
+                for row in rows
+            ]
+        for row in rows:
+            codes = blob_to_codes(row["lsh_codes"])
+            if codes is not None:
+                matrix.lsh.add(str(row["uri"]), codes)
+        return matrix
+
+    @classmethod
+    def from_sidecar(cls, dimensions: int, loaded: SidecarVectors) -> "_VectorMatrix":
+        """Adopt sidecar rows as they are; a memory-mapped matrix is copied only where written."""
+        matrix = cls(dimensions)
+        matrix.uris = loaded.uris
+        matrix.rows = {uri: index for index, uri in enumerate(matrix.uris)}
+        matrix.norms = loaded.norms
+        matrix._vectors = loaded.vectors
+        for uri, codes in zip(loaded.uris, loaded.codes):
+            if codes is not None:
+                matrix.lsh.add(uri, codes)
+        return matrix
+
+    def set(self, uri: str, values: array, norm: float, codes: tuple[int, ...] | None = None) -> None:
+        """Insert or replace ``uri`` with its decoded float32 ``values``."""
+        if norm <= 0 or len(values) != self.dimensions:
+            self.remove(uri)
+            return
+        if codes is not None:
+            self.lsh.add(uri, codes)
+        else:
+            self.lsh.remove(uri)
+        index = self.rows.get(uri)
+        if index is None:
+            index = len(self.uris)
+            self.uris.append(uri)
+            self.rows[uri] = index
+            self.norms.append(norm)
+            if np is None:
+                self._vectors.append(None)
+            elif index >= len(self._vectors):
+                grown = np.empty((max(16, index * 2), self.dimensions), dtype=np.float32)
+                grown[:index] = self._vectors[:index]
+                self._vectors = grown
+        else:
+            self.norms[index] = norm
+        if np is not None:
+            self._vectors[index] = np.asarray(values, dtype=np.float32) / np.float32(norm)
+        else:
+            self._vectors[index] = array("f", values)
+
+    def remove(self, uri: str) -> None:
+        index = self.rows.pop(uri, None)
+        if index is None:
+            return
+        self.lsh.remove(uri)
+        last = len(self.uris) - 1
+        if index != last:
+            moved = self.uris[last]
+            self.uris[index] = moved
+            self.rows[moved] = index
+            self.norms[index] = self.norms[last]
+            self._vectors[index] = self._vectors[last]
+        self.uris.pop()
+        self.norms.pop()
+        if np is None:
+            self._vectors.pop()
+
+    def sidecar_entry(self, uri: str):
+        """(unit vector, norm, LSH codes) as a sidecar records ``uri``, or None if absent."""
+        index = self.rows.get(uri)
+        if index is None:
+            return None
+        return self._vectors[index], self.norms[index], self.lsh.codes.get(uri)
+
+    def embedding(self, uri: str):
+        """The stored (unnormalized) vector for ``uri``, or None."""
+        index = self.rows.get(uri)
+        if index is None:
+            return None
+        if np is not None:
+            return self._vectors[index] * np.float32(self.norms[index])
+        # A copy, so callers cannot change the cached row.
+        return array("f", self._vectors[index])
+
+    def nearest(self, uri: str, limit: int) -> list[tuple[str, float]]:
+        """Up to ``limit`` other rows as (uri, cosine score), best first."""
+        index = self.rows.get(uri)
+        count = len(self.uris)
+        if index is None or limit <= 0 or count <= 1:
+            return []
+        min_rows = LSH_MIN_ROWS_NUMPY if np is not None else LSH_MIN_ROWS
+        if count >= min_rows and len(self.lsh) == count:
+            candidates = [self.rows[candidate] for candidate in self.lsh.candidates(uri)]
+            # Too few candidates would shrink the result; rank everything instead.
+            if len(candidates) >= limit:
+                return self._rank(index, candidates, limit)
+        return self._rank(index, None, limit)
+
+    def _rank(self, index: int, candidates: list[int] | None, limit: int) -> list[tuple[str, float]]:
+        """Top ``limit`` of ``candidates`` (row numbers; None means every other row)."""
+        if np is not None:
+            matrix = self._vectors[:len(self.uris)]
+            if candidates is None:
+                rows = None
+                scores = matrix @ matrix[index]
+                scores[index] = -np.inf
+                k = min(limit, len(self.uris) - 1)
+            else:
+                rows = np.fromiter(candidates, dtype=np.intp, count=len(candidates))
+                scores = matrix[rows] @ matrix[index]
+                k = min(limit, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [
+                (self.uris[int(rows[position]) if rows is not None else int(position)], float(scores[position]))
+                for position in top
+            ]
+        query = self._vectors[index]
+        query_norm = self.norms[index]
+        if candidates is None:
+            candidates = [row for row in range(len(self.uris)) if row != index]
+        scored = [
+            (
+                self.uris[row],
+                sum(a * b for a, b in zip(query, self._vectors[row])) / (query_norm * self.norms[row]),
+            )
+            for row in candidates
+        ]
+        scored.sort(key=lambda item: -item[1])
+        return scored[:limit]
+
+
 class SQLiteImageVectorStore:
-    def __init__(self, database: AppDatabase):
+    """Image embeddings in ``image_vectors``.
+
+    Similarity reads go through one in-memory ``_VectorMatrix`` per
+    (model, dimensions), built on first use. This store's own writes patch the
+    cached matrices in place; any other change to the table (seen as a new
+    ``image_vector_state.generation``) drops them for a lazy rebuild. LSH
+    codes for approximate search are kept in ``image_vector_lsh``.
+
+    With ``sidecar_dir`` and NumPy, each matrix is also kept as a
+    memory-mapped ``VectorSidecar`` file: a cold start maps it instead of
+    decoding every BLOB, and this store's writes append to it.
+    """
+
+    def __init__(self, database: AppDatabase, *, sidecar_dir: Path | None = None):
         self.database = database
+        self._matrices: dict[tuple[str, int], _VectorMatrix] = {}
+        self._generation: int | None = None
+        self._lock = threading.Lock()
+        self._sidecar = VectorSidecar(sidecar_dir) if sidecar_dir is not None else None
+        # Keys whose sidecar file is at the cached generation.
+        self._sidecar_keys: set[tuple[str, int]] = set()
 
     def is_available(self) -> bool:
         return True
 
     def get_all_metadata(self) -> dict[str, dict[str, Any]]:
-        with self.database.connect() as conn:
-            rows = conn.execute("SELECT * FROM image_vectors").fetchall()
+        with self.database.connect(read_only=True) as conn:
+            rows = conn.execute(f"SELECT {_VECTOR_METADATA_COLUMNS} FROM image_vectors").fetchall()
         return {str(row["uri"]): self._row_metadata(row) for row in rows}
 
     def get_metadata(self, uri: str) -> dict[str, Any] | None:
-        with self.database.connect() as conn:
-            row = conn.execute("SELECT * FROM image_vectors WHERE uri = ?", (uri,)).fetchone()
+        with self.database.connect(read_only=True) as conn:
+            row = conn.execute(
+                f"SELECT {_VECTOR_METADATA_COLUMNS} FROM image_vectors WHERE uri = ?",
+                (uri,),
+            ).fetchone()
         return self._row_metadata(row) if row else None
 
     def upsert_image(
@@ -283,16 +564,24 @@ class SQLiteImageVectorStore:
         embedding: list[float],
         metadata: dict[str, Any],
     ) -> None:
-        blob = self._embedding_to_blob(embedding)
-        norm = self._embedding_norm(embedding)
+        encoding = str(metadata.get("vector_encoding") or "float32")
+        if encoding not in VECTOR_ENCODINGS:
+            encoding = "float32"
+        blob, scale, values = encode_embedding(embedding, encoding)
+        # The norm of what was stored, so decoded rows normalize to unit length.
+        norm = self._embedding_norm(values)
+        model = str(metadata.get("model") or "")
+        dimensions = int(metadata.get("dimensions") or 0)
+        codes = lsh_codes(values, dimensions) if norm > 0 and len(values) == dimensions else None
         with self.database.connect() as conn:
-            conn.execute(
+            cursor = conn.execute(
                 """
                 INSERT INTO image_vectors (
                   uri, source_id, rel_path, model, dimensions, image_max_size, image_quality,
-                  mtime, size_bytes, embedding, embedding_norm, indexed_at
+                  mtime, size_bytes, embedding, embedding_norm, embedding_encoding,
+                  embedding_scale, indexed_at
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ON CONFLICT(uri) DO UPDATE SET
                   source_id = excluded.source_id,
                   rel_path = excluded.rel_path,
@@ -304,82 +593,382 @@ class SQLiteImageVectorStore:
                   size_bytes = excluded.size_bytes,
                   embedding = excluded.embedding,
                   embedding_norm = excluded.embedding_norm,
+                  embedding_encoding = excluded.embedding_encoding,
+                  embedding_scale = excluded.embedding_scale,
                   indexed_at = excluded.indexed_at
                 """,
                 (
                     uri,
                     str(metadata.get("source_id") or ""),
                     str(metadata.get("rel_path") or ""),
-                    str(metadata.get("model") or ""),
-                    int(metadata.get("dimensions") or 0),
+                    model,
+                    dimensions,
                     int(metadata.get("image_max_size") or 0),
                     int(metadata.get("image_quality") or 0),
                     float(metadata.get("mtime") or 0),
                     int(metadata.get("size_bytes") or 0),
                     blob,
                     norm,
+                    encoding,
+                    scale,
                     str(metadata.get("indexed_at") or ""),
                 ),
             )
+            if codes is not None:
+                self._save_codes(conn, [(uri, codes)])
+            else:
+                conn.execute("DELETE FROM image_vector_lsh WHERE uri = ?", (uri,))
+            generation = self._read_generation(conn)
+
+        def patch() -> dict[tuple[str, int], list]:
+            changes = {}
+            for key, matrix in self._matrices.items():
+                if key == (model, dimensions):
+                    matrix.set(uri, values, norm, codes)
+                    changes[key] = [(uri, matrix.sidecar_entry(uri))]
+                elif uri in matrix.rows:
+                    matrix.remove(uri)
+                    changes[key] = [(uri, None)]
+            return changes
+
+        self._patch_cache(generation - cursor.rowcount, generation, patch)
 
     def delete(self, ids: list[str]) -> None:
         if not ids:
             return
         with self.database.connect() as conn:
-            conn.executemany("DELETE FROM image_vectors WHERE uri = ?", [(item_id,) for item_id in ids])
+            cursor = conn.executemany("DELETE FROM image_vectors WHERE uri = ?", [(item_id,) for item_id in ids])
+            generation = self._read_generation(conn)
+
+        def patch() -> dict[tuple[str, int], list]:
+            changes = {}
+            for key, matrix in self._matrices.items():
+                for item_id in ids:
+                    if item_id in matrix.rows:
+                        matrix.remove(item_id)
+                        changes.setdefault(key, []).append((item_id, None))
+            return changes
+
+        self._patch_cache(generation - max(0, cursor.rowcount), generation, patch)
 
     def query_similar(self, uri: str, *, limit: int = 12) -> list[dict[str, Any]]:
-        with self.database.connect() as conn:
-            query_row = conn.execute("SELECT * FROM image_vectors WHERE uri = ?", (uri,)).fetchone()
+        with self.database.connect(read_only=True) as conn:
+            query_row = conn.execute(
+                "SELECT model, dimensions FROM image_vectors WHERE uri = ?",
+                (uri,),
+            ).fetchone()
             if not query_row:
                 return []
-            query_embedding = self._blob_to_embedding(query_row["embedding"])
-            query_norm = float(query_row["embedding_norm"] or 0)
+            matrix = self._matrix(conn, str(query_row["model"]), int(query_row["dimensions"]))
+            with self._lock:
+                ranked = matrix.nearest(uri, limit)
+            if not ranked:
+                return []
             rows = conn.execute(
-                """
-                SELECT * FROM image_vectors
-                WHERE uri != ? AND model = ? AND dimensions = ?
+                f"""
+                SELECT {_VECTOR_METADATA_COLUMNS} FROM image_vectors
+                WHERE uri IN (SELECT value FROM json_each(?))
                 """,
-                (uri, query_row["model"], int(query_row["dimensions"])),
+                (json.dumps([candidate for candidate, _ in ranked]),),
             ).fetchall()
-
-        if query_norm <= 0:
-            return []
-        scored: list[dict[str, Any]] = []
-        for row in rows:
-            candidate_embedding = self._blob_to_embedding(row["embedding"])
-            candidate_norm = float(row["embedding_norm"] or 0)
-            if candidate_norm <= 0:
-                continue
-            score = self._cosine_similarity(query_embedding, query_norm, candidate_embedding, candidate_norm)
-            scored.append({
-                "uri": str(row["uri"]),
-                "metadata": self._row_metadata(row),
+        rows_by_uri = {str(row["uri"]): row for row in rows}
+        return [
+            {
+                "uri": candidate,
+                "metadata": self._row_metadata(rows_by_uri[candidate]),
                 "distance": float(1.0 - score),
-            })
-        scored.sort(key=lambda item: float(item.get("distance") or 0))
-        return scored[:limit]
+            }
+            for candidate, score in ranked
+            if candidate in rows_by_uri
+        ]
 
     def list_vectors(self, *, limit: int = 1000) -> list[dict[str, Any]]:
-        safe_limit = max(1, min(int(limit), 5000))
-        with self.database.connect() as conn:
+        """Newest vectors first; ``limit`` 0 returns all of them."""
+        safe_limit = int(limit) if int(limit) > 0 else -1
+        with self.database.connect(read_only=True) as conn:
             rows = conn.execute(
-                """
-                SELECT * FROM image_vectors
+                f"""
+                SELECT {_VECTOR_METADATA_COLUMNS} FROM image_vectors
                 ORDER BY mtime DESC, uri ASC
                 LIMIT ?
                 """,
                 (safe_limit,),
             ).fetchall()
-        return [
-            {
-                "uri": str(row["uri"]),
-                "embedding": self._blob_to_embedding(row["embedding"]),
-                "embedding_norm": float(row["embedding_norm"] or 0),
-                "metadata": self._row_metadata(row),
+            matrices = {
+                key: self._matrix(conn, *key)
+                for key in {(str(row["model"]), int(row["dimensions"])) for row in rows}
             }
-            for row in rows
-        ]
+        result = []
+        with self._lock:
+            for row in rows:
+                uri = str(row["uri"])
+                embedding = matrices[(str(row["model"]), int(row["dimensions"]))].embedding(uri)
+                result.append({
+                    "uri": uri,
+                    # Zero or malformed vectors are not cached; they never match anything.
+                    "embedding": embedding if embedding is not None else array("f", bytes(4 * int(row["dimensions"]))),
+                    "embedding_norm": float(row["embedding_norm"] or 0) if embedding is not None else 0.0,
+                    "metadata": self._row_metadata(row),
+                })
+        return result
+
+    def build_ann_index(self, *, batch_size: int = ANN_BUILD_BATCH_SIZE) -> int:
+        """Compute LSH codes for vectors stored without current ones; return how many.
+
+        New vectors get codes in ``upsert_image``; this fills in rows written
+        before the index existed or under an older ``LSH_VERSION``.
+        """
+        built = 0
+        after = ""
+        while True:
+            with self.database.connect(read_only=True) as conn:
+                rows = conn.execute(
+                    """
+                    SELECT image_vectors.uri, dimensions, embedding, embedding_norm,
+                      embedding_encoding, embedding_scale
+                    FROM image_vectors
+                    LEFT JOIN image_vector_lsh ON image_vector_lsh.uri = image_vectors.uri
+                      AND image_vector_lsh.version = ?
+                    WHERE image_vector_lsh.uri IS NULL AND image_vectors.uri > ?
+                    ORDER BY image_vectors.uri
+                    LIMIT ?
+                    """,
+                    (LSH_VERSION, after, max(1, int(batch_size))),
+                ).fetchall()
+            if not rows:
+                break
+            after = str(rows[-1]["uri"])
+            valid = [row for row in rows if _row_fits(row, int(row["dimensions"]))]
+            items: list[tuple[str, tuple[int, ...]]] = []
+            for dimensions in {int(row["dimensions"]) for row in valid}:
+                group = [row for row in valid if int(row["dimensions"]) == dimensions]
+                if np is not None:
+                    codes = lsh_codes_for_matrix(_decode_rows(group, dimensions), dimensions)
+                else:
+                    codes = [
+                        lsh_codes(decode_embedding(row["embedding"], _row_encoding(row), float(row["embedding_scale"])), dimensions)
+                        for row in group
+                    ]
+                items.extend((str(row["uri"]), code) for row, code in zip(group, codes))
+            if items:
+                with self.database.connect() as conn:
+                    self._save_codes(conn, items)
+                built += len(items)
+        if built:
+            with self.database.connect() as conn:
+                conn.execute("UPDATE image_vector_state SET generation = generation + 1 WHERE id = 1")
+        return built
+
+    def pending_reencode(self, encoding: str) -> int:
+        """How many stored vectors are not in ``encoding``."""
+        with self.database.connect(read_only=True) as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM image_vectors WHERE embedding_encoding != ?",
+                (encoding,),
+            ).fetchone()
+        return int(row[0])
+
+    def reencode(self, encoding: str, *, batch_size: int = ANN_BUILD_BATCH_SIZE) -> int:
+        """Transcode stored vectors into ``encoding`` locally; return how many.
+
+        Each vector is decoded and encoded again, with its norm and LSH codes
+        recomputed from the new values, so changing ``vector_encoding`` does
+        not need the embedding API. The updates bump the generation, so cached
+        matrices and sidecars are rebuilt on the next read or compaction.
+        """
+        if encoding not in VECTOR_ENCODINGS:
+            raise ValueError(f"unknown vector encoding: {encoding}")
+        converted = 0
+        after = ""
+        while True:
+            with self.database.connect(read_only=True) as conn:
+                rows = conn.execute(
+                    """
+                    SELECT uri, dimensions, embedding, embedding_encoding, embedding_scale
+                    FROM image_vectors
+                    WHERE embedding_encoding != ? AND uri > ?
+                    ORDER BY uri
+                    LIMIT ?
+                    """,
+                    (encoding, after, max(1, int(batch_size))),
+                ).fetchall()
+            if not rows:
+                break
+            after = str(rows[-1]["uri"])
+            updates = []
+            codes: list[tuple[str, tuple[int, ...]]] = []
+            uncoded = []
+            for row in rows:
+                values = decode_embedding(row["embedding"], _row_encoding(row), float(row["embedding_scale"]))
+                blob, scale, values = encode_embedding(values, encoding)
+                norm = self._embedding_norm(values)
+                updates.append((blob, norm, encoding, scale, str(row["uri"])))
+                dimensions = int(row["dimensions"])
+                if norm > 0 and len(values) == dimensions:
+                    codes.append((str(row["uri"]), lsh_codes(values, dimensions)))
+                else:
+                    uncoded.append((str(row["uri"]),))
+            with self.database.connect() as conn:
+                conn.executemany(
+                    """
+                    UPDATE image_vectors
+                    SET embedding = ?, embedding_norm = ?, embedding_encoding = ?, embedding_scale = ?
+                    WHERE uri = ?
+                    """,
+                    updates,
+                )
+                self._save_codes(conn, codes)
+                conn.executemany("DELETE FROM image_vector_lsh WHERE uri = ?", uncoded)
+            converted += len(updates)
+        return converted
+
+    def _save_codes(self, conn, items: list[tuple[str, tuple[int, ...]]]) -> None:
+        conn.executemany(
+            """
+            INSERT INTO image_vector_lsh(uri, version, codes)
+            VALUES (?, ?, ?)
+            ON CONFLICT(uri) DO UPDATE SET version = excluded.version, codes = excluded.codes
+            """,
+            [(uri, LSH_VERSION, codes_to_blob(codes)) for uri, codes in items],
+        )
+
+    def latest_indexed_at(self) -> str:
+        with self.database.connect(read_only=True) as conn:
+            row = conn.execute("SELECT MAX(indexed_at) FROM image_vectors").fetchone()
+        return str(row[0] or "")
+
+    def vectors_indexed_since(self, watermark: str) -> list[dict[str, Any]]:
+        """Metadata of vectors indexed after ``watermark``, oldest first."""
+        with self.database.connect(read_only=True) as conn:
+            rows = conn.execute(
+                f"""
+                SELECT {_VECTOR_METADATA_COLUMNS} FROM image_vectors
+                WHERE indexed_at > ?
+                ORDER BY indexed_at ASC, uri ASC
+                """,
+                (str(watermark or ""),),
+            ).fetchall()
+        return [self._row_metadata(row) for row in rows]
+
+    def compact_sidecars(self) -> int:
+        """Bring the sidecars up to date; return how many were (re)written.
+
+        Writes the sidecar of every stored (model, dimensions) that is missing,
+        stale or holding dead rows, and deletes those of models no longer
+        stored. Queries wait while a sidecar is written, so this runs after
+        indexing and cleanup rather than on the read path.
+        """
+        if self._sidecar is None or np is None:
+            return 0
+        with self.database.connect(read_only=True) as conn:
+            keys = {
+                (str(row["model"]), int(row["dimensions"]))
+                for row in conn.execute("SELECT DISTINCT model, dimensions FROM image_vectors")
+            }
+            for key in keys:
+                self._matrix(conn, *key)
+        rewritten = 0
+        with self._lock:
+            for key in keys:
+                matrix = self._matrices.get(key)
+                if matrix is None:
+                    continue
+                if key in self._sidecar_keys and self._sidecar.row_count(*key) == len(matrix.uris):
+                    continue
+                if self._write_sidecar(key, self._generation, matrix):
+                    self._sidecar_keys.add(key)
+                    rewritten += 1
+                else:
+                    self._sidecar_keys.discard(key)
+        try:
+            self._sidecar.remove_except(keys)
+        except OSError:
+            pass
+        return rewritten
+
+    def _read_generation(self, conn) -> int:
+        row = conn.execute("SELECT generation FROM image_vector_state WHERE id = 1").fetchone()
+        return int(row[0]) if row else 0
+
+    def _matrix(self, conn, model: str, dimensions: int) -> _VectorMatrix:
+        """Cached matrix for (model, dimensions), rebuilt when the table changed elsewhere.
+
+        A rebuild maps the sidecar if it is at the current generation, and
+        otherwise reads the table. A stale sidecar is left for
+        ``compact_sidecars``: rewriting it here would put a full file write on
+        the first query after every write from another process.
+        """
+        generation = self._read_generation(conn)
+        key = (model, dimensions)
+        with self._lock:
+            if generation != self._generation:
+                self._matrices = {}
+                self._sidecar_keys = set()
+                self._generation = generation
+            matrix = self._matrices.get(key)
+        if matrix is not None:
+            return matrix
+        loaded = None
+        if self._sidecar is not None and np is not None:
+            loaded = self._sidecar.load(model, dimensions, generation)
+        if loaded is not None:
+            matrix = _VectorMatrix.from_sidecar(dimensions, loaded)
+        else:
+            matrix = self._load_matrix(conn, model, dimensions)
+        with self._lock:
+            if self._generation == generation:
+                cached = self._matrices.setdefault(key, matrix)
+                if cached is matrix and loaded is not None:
+                    self._sidecar_keys.add(key)
+                matrix = cached
+        return matrix
+
+    def _load_matrix(self, conn, model: str, dimensions: int) -> _VectorMatrix:
+        rows = conn.execute(
+            """
+            SELECT image_vectors.uri, embedding, embedding_norm, embedding_encoding, embedding_scale,
+              image_vector_lsh.codes AS lsh_codes
+            FROM image_vectors
+            LEFT JOIN image_vector_lsh ON image_vector_lsh.uri = image_vectors.uri
+              AND image_vector_lsh.version = ?
+            WHERE model = ? AND dimensions = ?
+            """,
+            (LSH_VERSION, model, dimensions),
+        ).fetchall()
+        return _VectorMatrix.from_rows(dimensions, rows)
+
+    def _write_sidecar(self, key: tuple[str, int], generation: int, matrix: _VectorMatrix) -> bool:
+        try:
+            self._sidecar.write(
+                *key,
+                generation,
+                matrix.uris,
+                matrix.norms,
+                [matrix.lsh.codes.get(uri) for uri in matrix.uris],
+                matrix._vectors[:len(matrix.uris)],
+            )
+        except OSError:
+            return False
+        return True
+
+    def _patch_cache(self, before: int, after: int, patch) -> None:
+        """Apply this store's own committed write to the cached matrices.
+
+        ``patch`` returns the sidecar changes per key, appended to every
+        in-sync sidecar. If the cache was not at ``before`` it missed some
+        other write; leave it alone and the next read rebuilds it.
+        """
+        with self._lock:
+            if self._generation != before:
+                return
+            changes = patch()
+            self._generation = after
+            # Every in-sync sidecar records the new generation, changed or not.
+            for key in list(self._sidecar_keys):
+                try:
+                    self._sidecar.append(*key, after, changes.get(key, []))
+                except OSError:
+                    self._sidecar_keys.discard(key)
 
     def _row_metadata(self, row) -> dict[str, Any]:
         return {
@@ -394,26 +983,13 @@ class SQLiteImageVectorStore:
             "image_max_size": int(row["image_max_size"]),
             "image_quality": int(row["image_quality"]),
             "input_kind": "image",
+            "vector_encoding": str(row["embedding_encoding"]),
             "indexed_at": str(row["indexed_at"]),
         }
 
-    def _embedding_to_blob(self, embedding: list[float]) -> bytes:
-        return array("f", [float(value) for value in embedding]).tobytes()
-
-    def _blob_to_embedding(self, blob: bytes) -> array:
-        values = array("f")
-        values.frombytes(blob)
-        return values
-
     def _embedding_norm(self, embedding: list[float]) -> float:
         return math.sqrt(sum(float(value) * float(value) for value in embedding))
 
-    def _cosine_similarity(self, query_embedding, query_norm: float, candidate_embedding, candidate_norm: float) -> float:
-        if len(query_embedding) != len(candidate_embedding):
-            return -1.0
-        dot = sum(float(left) * float(right) for left, right in zip(query_embedding, candidate_embedding))
-        return dot / (query_norm * candidate_norm)
-
 
 class ImageVectorService:
     def __init__(self, library_service, vector_index):
@@ -549,6 +1125,7 @@ class ImageVectorService:
             force=force,
         )
         records = plan["selected"]
+        reencoded = self.reencode(config)
         processed = 0
         indexed = 0
         failed = 0
@@ -567,10 +1144,13 @@ class ImageVectorService:
                     errors.append({"uri": uri, "error": str(exc)})
                 if progress_callback:
                     progress_callback(index, len(records), record, "failed", str(exc))
+        if indexed:
+            self._compact_sidecars()
         return {
             "total_images": plan["total_images"],
             "processed": processed,
             "indexed": indexed,
+            "reencoded": reencoded,
             "skipped": 0,
             "failed": failed,
             "errors": errors,
@@ -602,14 +1182,31 @@ class ImageVectorService:
             "image_max_size": int(config.get("image_max_size") or 0),
             "image_quality": int(config.get("image_quality") or 0),
             "input_kind": "image",
+            "vector_encoding": str(config.get("vector_encoding") or "float32"),
             "indexed_at": datetime.datetime.utcnow().isoformat() + "Z",
         }
         self.vector_index.upsert_image(uri=uri, embedding=embedding, metadata=metadata)
 
+    def reencode(self, config: dict[str, Any]) -> int:
+        """Convert stored vectors to the configured ``vector_encoding`` locally."""
+        reencode = getattr(self.vector_index, "reencode", None)
+        if reencode is None:
+            return 0
+        converted = reencode(str(config.get("vector_encoding") or "float32"))
+        if converted:
+            self._compact_sidecars()
+        return converted
+
     def cleanup_missing(self) -> dict[str, Any]:
         records = self.build_image_records()
         valid_uris = {str(item["uri"]) for item in records}
         metadata_by_id = self.vector_index.get_all_metadata()
         orphaned = [uri for uri in metadata_by_id if uri not in valid_uris]
         self.vector_index.delete(orphaned)
+        self._compact_sidecars()
         return {"deleted": len(orphaned)}
+
+    def _compact_sidecars(self) -> None:
+        compact = getattr(self.vector_index, "compact_sidecars", None)
+        if compact is not None:
+            compact()
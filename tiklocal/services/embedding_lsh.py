@@ -0,0 +1,111 @@
+"""Random-hyperplane LSH over image embeddings.
+
+Each vector gets one ``LSH_BITS``-bit code per table: bit ``b`` is the sign
+of its projection on a fixed random hyperplane. Vectors at a small angle
+agree on most bits, so nearest-neighbour candidates are the rows sharing a
+bucket, or a bucket one bit away, in any table. Codes depend only on the
+vector and its dimensions, so new vectors are added without retraining and
+the codes are stored in ``image_vector_lsh`` across restarts.
+"""
+
+from __future__ import annotations
+
+import functools
+import random
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+LSH_VERSION = 1
+LSH_TABLES = 8
+LSH_BITS = 12
+LSH_SEED = 20240601
+
+
+@functools.lru_cache(maxsize=8)
+def _planes(dimensions: int) -> tuple[array, ...]:
+    rng = random.Random(f"{LSH_SEED}:{dimensions}")
+    return tuple(
+        array("f", [rng.gauss(0.0, 1.0) for _ in range(dimensions)])
+        for _ in range(LSH_TABLES * LSH_BITS)
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def _plane_matrix(dimensions: int):
+    return np.asarray(_planes(dimensions), dtype=np.float32)
+
+
+def lsh_codes(vector, dimensions: int) -> tuple[int, ...]:
+    """One bucket code per table for ``vector`` (any float sequence)."""
+    if np is not None:
+        return lsh_codes_for_matrix(np.asarray(vector, dtype=np.float32)[None, :], dimensions)[0]
+    bits = [sum(a * b for a, b in zip(plane, vector)) > 0 for plane in _planes(dimensions)]
+    return tuple(
+        sum(1 << bit for bit in range(LSH_BITS) if bits[table * LSH_BITS + bit])
+        for table in range(LSH_TABLES)
+    )
+
+
+def lsh_codes_for_matrix(matrix, dimensions: int) -> list[tuple[int, ...]]:
+    """Codes for every row of a (rows, dimensions) NumPy matrix."""
+    bits = (matrix @ _plane_matrix(dimensions).T > 0).reshape(len(matrix), LSH_TABLES, LSH_BITS)
+    weights = 1 << np.arange(LSH_BITS, dtype=np.int64)
+    return [tuple(int(code) for code in row) for row in bits @ weights]
+
+
+def codes_to_blob(codes: tuple[int, ...]) -> bytes:
+    return array("I", codes).tobytes()
+
+
+def blob_to_codes(blob: bytes | None) -> tuple[int, ...] | None:
+    if not blob:
+        return None
+    codes = array("I")
+    codes.frombytes(blob)
+    return tuple(codes) if len(codes) == LSH_TABLES else None
+
+
+class LSHBuckets:
+    """In-memory buckets for the rows of one vector matrix."""
+
+    def __init__(self):
+        self.codes: dict[str, tuple[int, ...]] = {}
+        self._tables: list[dict[int, set[str]]] = [{} for _ in range(LSH_TABLES)]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def add(self, uri: str, codes: tuple[int, ...]) -> None:
+        self.remove(uri)
+        self.codes[uri] = codes
+        for table, code in zip(self._tables, codes):
+            table.setdefault(code, set()).add(uri)
+
+    def remove(self, uri: str) -> None:
+        codes = self.codes.pop(uri, None)
+        if codes is None:
+            return
+        for table, code in zip(self._tables, codes):
+            bucket = table.get(code)
+            if bucket is not None:
+                bucket.discard(uri)
+                if not bucket:
+                    del table[code]
+
+    def candidates(self, uri: str) -> set[str]:
+        """Rows sharing a bucket, or a bucket one bit away, with ``uri`` in any table."""
+        codes = self.codes.get(uri)
+        if codes is None:
+            return set()
+        found: set[str] = set()
+        for table, code in zip(self._tables, codes):
+            for probe in (code, *(code ^ (1 << bit) for bit in range(LSH_BITS))):
+                bucket = table.get(probe)
+                if bucket:
+                    found.update(bucket)
+        found.discard(uri)
+        return found
@@ -0,0 +1,184 @@
+"""Memory-mapped copy of the in-memory vector matrices, for fast cold loads.
+
+One pair of files per (model, dimensions) in the sidecar directory:
+
+``<key>.f32``
+    A 64-byte header followed by fixed-stride float32 unit rows. Rows are
+    only ever appended; replacing a vector appends a new row.
+``<key>.idx``
+    JSON lines. The first is ``["tiklocal-vectors", version, LSH version,
+    token, model, dimensions, generation]``; each later line is ``[generation, uri, row,
+    norm, lsh codes or null]`` (set), ``[generation, uri]`` (remove) or
+    ``[generation]`` (a write that did not touch this key).
+
+A sidecar is used only when its last generation equals
+``image_vector_state.generation``, so SQLite stays the source of truth: any
+write the sidecar did not see makes it stale, and the store reads the table
+instead until ``compact_sidecars`` rewrites it. The random ``token`` ties an index to the row file it was written
+with. Dead rows left by replacements and removals are dropped by ``write``,
+which the store calls only when compacting. Needs NumPy; without it the store
+never reads or writes sidecars.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import secrets
+from pathlib import Path
+from typing import Any
+
+from tiklocal.services.embedding_lsh import LSH_VERSION
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SIDECAR_VERSION = 1
+SIDECAR_MAGIC = "tiklocal-vectors"
+_HEADER_SIZE = 64
+
+
+class SidecarVectors:
+    """Rows of one sidecar as loaded by ``VectorSidecar.load``.
+
+    ``vectors`` is a copy-on-write memory map of the row file when the live
+    rows are still exactly the file's rows in order; otherwise the live rows
+    gathered into memory.
+    """
+
+    def __init__(self, uris: list[str], norms: list[float], codes: list, vectors):
+        self.uris = uris
+        self.norms = norms
+        self.codes = codes
+        self.vectors = vectors
+
+
+class VectorSidecar:
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+
+    def paths(self, model: str, dimensions: int) -> tuple[Path, Path]:
+        digest = hashlib.sha1(f"{model}\0{dimensions}".encode("utf-8")).hexdigest()[:16]
+        return self.directory / f"{digest}.f32", self.directory / f"{digest}.idx"
+
+    def row_count(self, model: str, dimensions: int) -> int:
+        """Rows in the row file, live or dead; 0 if there is none."""
+        rows_path, _ = self.paths(model, dimensions)
+        try:
+            return max(0, rows_path.stat().st_size - _HEADER_SIZE) // (4 * dimensions)
+        except OSError:
+            return 0
+
+    def load(self, model: str, dimensions: int, generation: int) -> SidecarVectors | None:
+        """The sidecar's rows if it is intact and at ``generation``, else None."""
+        rows_path, index_path = self.paths(model, dimensions)
+        try:
+            text = index_path.read_text(encoding="utf-8")
+            # One parse for the whole file; a torn last line fails it.
+            entries = json.loads("[" + ",".join(text.splitlines()) + "]")
+            with rows_path.open("rb") as handle:
+                header = handle.read(_HEADER_SIZE)
+            row_count = (rows_path.stat().st_size - _HEADER_SIZE) // (4 * dimensions)
+        except (OSError, ValueError):
+            return None
+        if not entries or len(entries[0]) != 7:
+            return None
+        magic, version, lsh_version, token, stored_model, stored_dimensions, last = entries[0]
+        expected = (SIDECAR_MAGIC, SIDECAR_VERSION, LSH_VERSION, model, dimensions)
+        if (magic, version, lsh_version, stored_model, stored_dimensions) != expected:
+            return None
+        if header.rstrip(b"\0") != str(token).encode("ascii", "replace"):
+            return None
+        live: dict[str, tuple[int, float, Any]] = {}
+        for entry in entries[1:]:
+            if int(entry[0]) < last:
+                return None
+            last = int(entry[0])
+            if len(entry) == 5:
+                live[entry[1]] = (int(entry[2]), float(entry[3]), entry[4])
+            elif len(entry) == 2:
+                live.pop(entry[1], None)
+        if last != generation or any(row >= row_count for row, _, _ in live.values()):
+            return None
+        ordered = sorted(live.items(), key=lambda item: item[1][0])
+        positions = [row for _, (row, _, _) in ordered]
+        if row_count == 0:
+            vectors = np.empty((0, dimensions), dtype=np.float32)
+        else:
+            vectors = np.memmap(rows_path, dtype=np.float32, mode="c", offset=_HEADER_SIZE, shape=(row_count, dimensions))
+            if positions != list(range(row_count)):
+                vectors = np.ascontiguousarray(vectors[positions])
+        return SidecarVectors(
+            [uri for uri, _ in ordered],
+            [norm for _, (_, norm, _) in ordered],
+            [tuple(codes) if codes else None for _, (_, _, codes) in ordered],
+            vectors,
+        )
+
+    def write(self, model: str, dimensions: int, generation: int, uris, norms, codes, vectors) -> None:
+        """Replace the sidecar with these rows (unit float32 vectors), dead-row free."""
+        rows_path, index_path = self.paths(model, dimensions)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        token = secrets.token_hex(16)
+        lines = [json.dumps([SIDECAR_MAGIC, SIDECAR_VERSION, LSH_VERSION, token, model, dimensions, generation])]
+        lines.extend(
+            json.dumps([generation, uri, row, norm, list(code) if code else None], ensure_ascii=False)
+            for row, (uri, norm, code) in enumerate(zip(uris, norms, codes))
+        )
+        rows_temp = rows_path.with_name(f"{rows_path.name}.{token}.tmp")
+        index_temp = index_path.with_name(f"{index_path.name}.{token}.tmp")
+        try:
+            with rows_temp.open("wb") as handle:
+                handle.write(token.encode("ascii").ljust(_HEADER_SIZE, b"\0"))
+                handle.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            index_temp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+            # Rows first: an index is only trusted next to the row file with its token.
+            os.replace(rows_temp, rows_path)
+            os.replace(index_temp, index_path)
+        finally:
+            rows_temp.unlink(missing_ok=True)
+            index_temp.unlink(missing_ok=True)
+
+    def append(self, model: str, dimensions: int, generation: int, changes: list[tuple[str, Any]]) -> None:
+        """Record one write at ``generation``.
+
+        ``changes`` holds (uri, (unit vector, norm, codes)) for vectors set in
+        this key and (uri, None) for removals; it may be empty.
+        """
+        rows_path, index_path = self.paths(model, dimensions)
+        lines = []
+        stride = 4 * dimensions
+        with rows_path.open("r+b") as handle:
+            handle.seek(0, os.SEEK_END)
+            # Round up past any torn row an interrupted append left behind.
+            row = -(-(handle.tell() - _HEADER_SIZE) // stride)
+            for uri, change in changes:
+                if change is None:
+                    lines.append([generation, uri])
+                    continue
+                vector, norm, codes = change
+                handle.seek(_HEADER_SIZE + row * stride)
+                handle.write(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+                lines.append([generation, uri, row, norm, list(codes) if codes else None])
+                row += 1
+        with index_path.open("a", encoding="utf-8") as handle:
+            for line in lines or [[generation]]:
+                handle.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    def remove_except(self, keep: set[tuple[str, int]]) -> int:
+        """Delete sidecars of keys not in ``keep``; return how many."""
+        wanted = {path for key in keep for path in self.paths(*key)}
+        removed = 0
+        for path in self.directory.glob("*.idx"):
+            if path in wanted:
+                continue
+            for stale in (path, path.with_suffix(".f32")):
+                try:
+                    stale.unlink()
+                except FileNotFoundError:
+                    pass
+            removed += 1
+        return removed
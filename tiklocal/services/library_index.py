@@ -1,11 +1,124 @@
+import base64
 import datetime
+import json
+import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from PIL import Image
 
-from tiklocal.services import AUDIO_EXTENSIONS, IMAGE_EXTENSIONS, VIDEO_EXTENSIONS
-from tiklocal.services.database import AppDatabase
+from tiklocal.services import MediaEntry
+from tiklocal.services.database import VISUAL_MEDIA_FILTER, AppDatabase
+from tiklocal.services.embedded_metadata import read_exif_ascii_tags
+from tiklocal.services.media_probe import MediaProbeCache, probe_duration, probe_stream
+
+
+WRITE_BATCH_SIZE = 1000
+
+_MEDIA_ITEM_INSERT = """
+INSERT INTO media_items(
+  uri, source_id, rel_path, filename, parent_path, media_type,
+  extension, size_bytes, mtime, captured_at, captured_local_date,
+  capture_year, capture_month, time_source, time_confidence,
+  time_metadata_version, discovered_at, indexed_at
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_CAPTURE_UPDATE = """
+  size_bytes = excluded.size_bytes,
+  mtime = excluded.mtime,
+  captured_at = excluded.captured_at,
+  captured_local_date = excluded.captured_local_date,
+  capture_year = excluded.capture_year,
+  capture_month = excluded.capture_month,
+  time_source = excluded.time_source,
+  time_confidence = excluded.time_confidence,
+  time_metadata_version = excluded.time_metadata_version,
+  indexed_at = excluded.indexed_at
+"""
+
+# Unchanged rows are left alone so a resync does not rewrite every page (and
+# grow the WAL) just to bump indexed_at.
+_CAPTURE_CHANGED = """
+  media_items.size_bytes IS NOT excluded.size_bytes
+  OR media_items.mtime IS NOT excluded.mtime
+  OR media_items.captured_at IS NOT excluded.captured_at
+  OR media_items.captured_local_date IS NOT excluded.captured_local_date
+  OR media_items.time_source IS NOT excluded.time_source
+  OR media_items.time_confidence IS NOT excluded.time_confidence
+  OR media_items.time_metadata_version IS NOT excluded.time_metadata_version
+"""
+
+_SNAPSHOT_UPSERT_SQL = f"""
+{_MEDIA_ITEM_INSERT}
+ON CONFLICT(uri) DO UPDATE SET
+  source_id = excluded.source_id,
+  rel_path = excluded.rel_path,
+  filename = excluded.filename,
+  parent_path = excluded.parent_path,
+  media_type = excluded.media_type,
+  extension = excluded.extension,
+{_CAPTURE_UPDATE}
+WHERE {_CAPTURE_CHANGED}
+  OR media_items.source_id IS NOT excluded.source_id
+  OR media_items.rel_path IS NOT excluded.rel_path
+  OR media_items.media_type IS NOT excluded.media_type
+"""
+
+_UPSERT_SQL = f"""
+{_MEDIA_ITEM_INSERT}
+ON CONFLICT(uri) DO UPDATE SET
+{_CAPTURE_UPDATE}
+WHERE {_CAPTURE_CHANGED}
+"""
+
+SEARCH_TRIGRAM = 3
+# Weights follow the media_search columns (filename, rel_path, caption, tags):
+# a filename hit outranks a folder name.
+SEARCH_RANK = "bm25(media_search, 4.0, 1.0, 2.0, 3.0)"
+SEARCH_LIKE_COLUMNS = (
+    "media_items.filename",
+    "media_items.rel_path",
+    "media_search_text.caption",
+    "media_search_text.tags",
+)
+
+# Library records carry their favorite flag; the lookup is one primary-key probe.
+_RECORD_COLUMNS = """
+  media_items.*,
+  EXISTS (SELECT 1 FROM media_favorites WHERE media_favorites.uri = media_items.uri) AS is_favorite,
+  (SELECT width FROM media_meta WHERE media_meta.uri = media_items.uri) AS width,
+  (SELECT height FROM media_meta WHERE media_meta.uri = media_items.uri) AS height
+"""
+
+_PROBE_UPSERT_SQL = """
+INSERT INTO media_meta(
+  uri, width, height, duration, codec, probe_version, probe_size, probe_mtime, updated_at
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(uri) DO UPDATE SET
+  width = COALESCE(excluded.width, media_meta.width),
+  height = COALESCE(excluded.height, media_meta.height),
+  duration = excluded.duration,
+  codec = excluded.codec,
+  probe_version = excluded.probe_version,
+  probe_size = excluded.probe_size,
+  probe_mtime = excluded.probe_mtime,
+  updated_at = excluded.updated_at
+"""
+
+_SEARCH_DELETE_SQL = """
+DELETE FROM media_search
+WHERE rowid = (SELECT id FROM media_search_text WHERE uri = ?)
+"""
+
+
+# Rows per month handed to the cover sampler, and covers kept per month.
+TIMELINE_COVER_CANDIDATES = 120
+TIMELINE_PREVIEW_LIMIT = 18
 
 
 class MediaIndexStore:
@@ -13,64 +126,78 @@ class MediaIndexStore:
 
     def __init__(self, database: AppDatabase):
         self.database = database
+        self._full_text: bool | None = None
 
     def replace_snapshot(
         self,
         records: list[dict],
         *,
         synced_source_ids: set[str] | None = None,
+        stale_directories: dict[str, set[str]] | None = None,
+        directories: dict[str, dict[str, float]] | None = None,
     ) -> dict:
+        """Write a sync result.
+
+        Rows missing from ``records`` are deleted for every source in
+        ``synced_source_ids`` (a full walk), and only inside the listed or removed
+        directories in ``stale_directories`` (an incremental walk). ``directories``
+        replaces the stored directory mtimes of the given sources.
+        """
         now = datetime.datetime.now(datetime.timezone.utc).isoformat()
-        source_ids = sorted(
-            {str(record["source_id"]) for record in records}
-            if synced_source_ids is None
-            else synced_source_ids
-        )
+        record_source_ids = {str(record["source_id"]) for record in records}
+        full_sources = record_source_ids if synced_source_ids is None else set(synced_source_ids)
+        stale_parents = {
+            (source_id, rel_dir or ".")
+            for source_id, rel_dirs in (stale_directories or {}).items()
+            for rel_dir in rel_dirs
+        }
         with self.database.connect() as conn:
-            conn.execute("CREATE TEMP TABLE media_index_seen(uri TEXT PRIMARY KEY)")
+            # One bulk read replaces the per-row "seen" bookkeeping: unchanged rows
+            # are skipped entirely and deletions fall out of the same map. An
+            # incremental write reads only its stale directories and records.
+            existing = self._existing_rows(
+                conn,
+                full_sources,
+                parents={parent for parent in stale_parents if parent[0] not in full_sources},
+                uris=[record["uri"] for record in records if str(record["source_id"]) not in full_sources],
+            )
+            changed = []
+            added = []
+            months: set[str] = set()
             for record in records:
                 values = self._record_values(record, now)
-                conn.execute(
-                    """
-                    INSERT INTO media_items(
-                      uri, source_id, rel_path, filename, parent_path, media_type,
-                      extension, size_bytes, mtime, captured_at, captured_local_date,
-                      capture_year, capture_month, time_source, time_confidence,
-                      time_metadata_version, discovered_at, indexed_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ON CONFLICT(uri) DO UPDATE SET
-                      source_id = excluded.source_id,
-                      rel_path = excluded.rel_path,
-                      filename = excluded.filename,
-                      parent_path = excluded.parent_path,
-                      media_type = excluded.media_type,
-                      extension = excluded.extension,
-                      size_bytes = excluded.size_bytes,
-                      mtime = excluded.mtime,
-                      captured_at = excluded.captured_at,
-                      captured_local_date = excluded.captured_local_date,
-                      capture_year = excluded.capture_year,
-                      capture_month = excluded.capture_month,
-                      time_source = excluded.time_source,
-                      time_confidence = excluded.time_confidence,
-                      time_metadata_version = excluded.time_metadata_version,
-                      indexed_at = excluded.indexed_at
-                    """,
-                    values,
+                current = existing.get(values[0])
+                if current is None or current[1] != self._signature(values):
+                    changed.append(values)
+                    months.add(values[12])
+                    if current is not None:
+                        months.add(current[1][6][:7])
+                if current is None:
+                    added.append(values)
+            for start in range(0, len(changed), WRITE_BATCH_SIZE):
+                conn.executemany(_SNAPSHOT_UPSERT_SQL, changed[start:start + WRITE_BATCH_SIZE])
+            # A uri's name and path never change, so only new rows need search text.
+            self._index_search(conn, added, full_text=self._has_full_text())
+
+            seen = {record["uri"] for record in records}
+            removed = [
+                (uri,)
+                for uri, (parent, signature) in existing.items()
+                if uri not in seen
+                and (signature[0] in full_sources or (signature[0], parent) in stale_parents)
+            ]
+            for start in range(0, len(removed), WRITE_BATCH_SIZE):
+                conn.executemany("DELETE FROM media_items WHERE uri = ?", removed[start:start + WRITE_BATCH_SIZE])
+                if self._has_full_text():
+                    conn.executemany(_SEARCH_DELETE_SQL, removed[start:start + WRITE_BATCH_SIZE])
+            months.update(existing[uri][1][6][:7] for (uri,) in removed)
+            self.refresh_month_rollups(conn, months)
+            for source_id, mtimes in (directories or {}).items():
+                conn.execute("DELETE FROM media_directories WHERE source_id = ?", (source_id,))
+                conn.executemany(
+                    "INSERT INTO media_directories(source_id, rel_dir, mtime, synced_at) VALUES (?, ?, ?, ?)",
+                    [(source_id, rel_dir, mtime, now) for rel_dir, mtime in mtimes.items()],
                 )
-                conn.execute("INSERT OR IGNORE INTO media_index_seen(uri) VALUES (?)", (record["uri"],))
-            deleted = 0
-            if source_ids:
-                placeholders = ",".join("?" for _ in source_ids)
-                deleted = conn.execute(
-                    f"""
-                    DELETE FROM media_items
-                    WHERE source_id IN ({placeholders})
-                      AND uri NOT IN (SELECT uri FROM media_index_seen)
-                    """,
-                    source_ids,
-                ).rowcount
-            conn.execute("DROP TABLE media_index_seen")
             item_count = int(conn.execute("SELECT COUNT(*) FROM media_items").fetchone()[0])
             conn.execute(
                 """
@@ -84,7 +211,9 @@ class MediaIndexStore:
             )
         return {
             "indexed": len(records),
-            "deleted": max(deleted, 0),
+            "written": len(changed),
+            "deleted": len(removed),
+            "total": item_count,
             "last_synced_at": now,
         }
 
@@ -93,29 +222,15 @@ class MediaIndexStore:
             return 0
         now = datetime.datetime.now(datetime.timezone.utc).isoformat()
         with self.database.connect() as conn:
-            for record in records:
-                conn.execute(
-                    """
-                    INSERT INTO media_items(
-                      uri, source_id, rel_path, filename, parent_path, media_type,
-                      extension, size_bytes, mtime, captured_at, captured_local_date,
-                      capture_year, capture_month, time_source, time_confidence,
-                      time_metadata_version, discovered_at, indexed_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ON CONFLICT(uri) DO UPDATE SET
-                      size_bytes = excluded.size_bytes,
-                      mtime = excluded.mtime,
-                      captured_at = excluded.captured_at,
-                      captured_local_date = excluded.captured_local_date,
-                      capture_year = excluded.capture_year,
-                      capture_month = excluded.capture_month,
-                      time_source = excluded.time_source,
-                      time_confidence = excluded.time_confidence,
-                      time_metadata_version = excluded.time_metadata_version,
-                      indexed_at = excluded.indexed_at
-                    """,
-                    self._record_values(record, now),
-                )
+            for start in range(0, len(records), WRITE_BATCH_SIZE):
+                chunk = [self._record_values(record, now) for record in records[start:start + WRITE_BATCH_SIZE]]
+                months = self._months_for_uris(conn, [values[0] for values in chunk])
+                conn.executemany(_UPSERT_SQL, chunk)
+                full_text = self._has_full_text()
+                if full_text:
+                    conn.executemany(_SEARCH_DELETE_SQL, [(values[0],) for values in chunk])
+                self._index_search(conn, chunk, full_text=full_text)
+                self.refresh_month_rollups(conn, months | {values[12] for values in chunk})
             count = conn.execute("SELECT COUNT(*) FROM media_items").fetchone()[0]
             conn.execute(
                 """
@@ -129,19 +244,70 @@ class MediaIndexStore:
 
     def delete(self, uri: str) -> bool:
         with self.database.connect() as conn:
+            months = self._months_for_uris(conn, [uri])
             deleted = conn.execute("DELETE FROM media_items WHERE uri = ?", (uri,)).rowcount
             if deleted:
+                if self._has_full_text():
+                    conn.execute(_SEARCH_DELETE_SQL, (uri,))
+                self.refresh_month_rollups(conn, months)
                 conn.execute(
                     "UPDATE media_index_state SET item_count = MAX(0, item_count - 1) WHERE id = 1"
                 )
         return bool(deleted)
 
-    def records(self, *, search: str = "", media_type: str = "") -> list[dict]:
-        where, params = self._filters(search=search, media_type=media_type)
+    def pending_probes(self, version: int, *, after: str = "", limit: int = 256) -> list[dict]:
+        """Return index rows after ``after`` whose probe is missing, older than
+        ``version``, or taken from a different size or mtime, in uri order."""
+        with self.database.connect(read_only=True) as conn:
+            rows = conn.execute(
+                """
+                SELECT media_items.uri, media_items.media_type, media_items.size_bytes, media_items.mtime
+                FROM media_items
+                LEFT JOIN media_meta ON media_meta.uri = media_items.uri
+                WHERE media_items.uri > ?
+                  AND (
+                    media_meta.uri IS NULL
+                    OR media_meta.probe_version < ?
+                    OR media_meta.probe_size IS NOT media_items.size_bytes
+                    OR media_meta.probe_mtime IS NOT media_items.mtime
+                  )
+                ORDER BY media_items.uri
+                LIMIT ?
+                """,
+                (after, int(version), max(1, int(limit))),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def save_probes(self, probes: list[dict]) -> int:
+        """Store probe results; a failed probe is recorded too so it is not retried
+        until the file changes or the probe version moves."""
+        now = _utc_now()
+        values = [
+            (
+                str(probe["uri"]),
+                probe.get("width") or None,
+                probe.get("height") or None,
+                probe.get("duration") or None,
+                str(probe.get("codec") or ""),
+                int(probe["probe_version"]),
+                int(probe["size_bytes"]),
+                float(probe["mtime"]),
+                now,
+            )
+            for probe in probes
+        ]
         with self.database.connect() as conn:
+            for start in range(0, len(values), WRITE_BATCH_SIZE):
+                conn.executemany(_PROBE_UPSERT_SQL, values[start:start + WRITE_BATCH_SIZE])
+        return len(values)
+
+    def records(self, *, search: str = "", media_type: str = "", favorites_only: bool = False) -> list[dict]:
+        where, params = self._filters(media_type=media_type, favorites_only=favorites_only)
+        source, search_params, _ = self._search_source(search, full_text=self._has_full_text())
+        with self.database.connect(read_only=True) as conn:
             rows = conn.execute(
-                f"SELECT * FROM media_items {where} ORDER BY mtime DESC, uri",
-                params,
+                f"SELECT {_RECORD_COLUMNS} {source} {where} ORDER BY mtime DESC, media_items.uri",
+                [*search_params, *params],
             ).fetchall()
         return [self._to_library_record(row) for row in rows]
 
@@ -152,36 +318,116 @@ class MediaIndexStore:
         media_type: str = "",
         min_size: int = 0,
         month: str = "",
+        favorites_only: bool = False,
+        collection_id: str = "",
         offset: int = 0,
         limit: int = 48,
+        cursor: str = "",
     ) -> dict:
+        """Return one page of index records.
+
+        Pass the previous page's ``next_cursor`` to seek past its last row instead
+        of re-reading the skipped prefix; the cursor also carries the total counted
+        for the first page, so later pages cost the same as the first. A search
+        is answered from the full-text index, best matches first; a collection
+        page lists its items most recently added first.
+        """
         where, params = self._filters(
-            search=search,
             media_type=media_type,
             min_size=min_size,
             month=month,
+            favorites_only=favorites_only,
         )
-        safe_offset = max(0, int(offset))
         safe_limit = max(1, min(int(limit), 96))
-        order_by = "captured_at DESC, uri" if self.is_month_key(month) else "mtime DESC, uri"
-        with self.database.connect() as conn:
-            total = int(conn.execute(
-                f"SELECT COUNT(*) FROM media_items {where}",
-                params,
-            ).fetchone()[0])
-            rows = conn.execute(
-                f"SELECT * FROM media_items {where} ORDER BY {order_by} LIMIT ? OFFSET ?",
-                [*params, safe_limit, safe_offset],
-            ).fetchall()
+        sort_column = "captured_at" if self.is_month_key(month) else "mtime"
+        order_by = f"{sort_column} DESC, uri"
+        position = self._decode_cursor(cursor)
+        if collection_id:
+            source = """
+                FROM media_collection_items
+                JOIN media_items ON media_items.uri = media_collection_items.uri
+                  AND media_collection_items.collection_id = ?
+            """
+            source_params: list[object] = [collection_id]
+            source_order = "media_collection_items.position DESC"
+        else:
+            source, source_params, ranked = self._search_source(search, full_text=self._has_full_text())
+            source_order = f"{sort_column} DESC, media_items.uri"
+            if ranked:
+                source_order = f"{SEARCH_RANK}, {source_order}"
+        with self.database.connect(read_only=True) as conn:
+            if source_params:
+                # Search and collection pages start from their match set. Their
+                # order is not the mtime index, so the cursor only carries the
+                # offset and total.
+                params = [*source_params, *params]
+                if position is None:
+                    safe_offset = max(0, int(offset))
+                    total = int(conn.execute(f"SELECT COUNT(*) {source} {where}", params).fetchone()[0])
+                else:
+                    _, _, safe_offset, total = position
+                rows = conn.execute(
+                    f"SELECT {_RECORD_COLUMNS} {source} {where} ORDER BY {source_order} LIMIT ? OFFSET ?",
+                    [*params, safe_limit + 1, safe_offset],
+                ).fetchall()
+            elif position is None:
+                safe_offset = max(0, int(offset))
+                total = int(conn.execute(
+                    f"SELECT COUNT(*) FROM media_items {where}",
+                    params,
+                ).fetchone()[0])
+                rows = conn.execute(
+                    f"SELECT {_RECORD_COLUMNS} FROM media_items {where} ORDER BY {order_by} LIMIT ? OFFSET ?",
+                    [*params, safe_limit + 1, safe_offset],
+                ).fetchall()
+            else:
+                sort_value, last_uri, safe_offset, total = position
+                rows = conn.execute(
+                    f"""
+                    SELECT {_RECORD_COLUMNS} FROM media_items {where}
+                      AND {sort_column} <= ? AND ({sort_column} < ? OR uri > ?)
+                    ORDER BY {order_by}
+                    LIMIT ?
+                    """,
+                    # The leading range bound lets SQLite seek the index even when
+                    # the values are bound parameters.
+                    [*params, sort_value, sort_value, last_uri, safe_limit + 1],
+                ).fetchall()
+        has_more = len(rows) > safe_limit
+        rows = rows[:safe_limit]
+        next_offset = safe_offset + len(rows)
+        next_cursor = (
+            self._encode_cursor(rows[-1][sort_column], rows[-1]["uri"], next_offset, total)
+            if has_more
+            else ""
+        )
         return {
             "records": [self._to_library_record(row) for row in rows],
             "total": total,
             "offset": safe_offset,
             "limit": safe_limit,
-            "next_offset": safe_offset + safe_limit,
-            "has_more": safe_offset + safe_limit < total,
+            "next_offset": next_offset,
+            "next_cursor": next_cursor,
+            "has_more": has_more,
         }
 
+    @staticmethod
+    def _encode_cursor(sort_value: float, uri: str, offset: int, total: int) -> str:
+        raw = json.dumps([float(sort_value), str(uri), int(offset), int(total)], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple[float, str, int, int] | None:
+        token = str(cursor or "").strip()
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            sort_value, uri, offset, total = json.loads(raw.decode("utf-8"))
+            return float(sort_value), str(uri), max(0, int(offset)), max(0, int(total))
+        except (ValueError, TypeError, UnicodeDecodeError):
+            return None
+
     def timeline_months(
         self,
         *,
@@ -191,75 +437,71 @@ class MediaIndexStore:
     ) -> dict:
         """Return compact month chapters without probing media metadata."""
         safe_limit = max(1, min(int(limit), 36))
-        safe_preview_limit = max(1, min(int(preview_limit), 18))
+        safe_preview_limit = max(1, min(int(preview_limit), TIMELINE_PREVIEW_LIMIT))
         before_key = before if self.is_month_key(before) else ""
-        month_expr = "capture_month"
-        before_clause = f"AND {month_expr} < ?" if before_key else ""
+        before_clause = "WHERE capture_month < ?" if before_key else ""
         params: list[object] = [before_key] if before_key else []
         params.append(safe_limit + 1)
 
-        with self.database.connect() as conn:
+        with self.database.connect(read_only=True) as conn:
+            # Counts and covers come from media_month_rollups, which the write
+            # paths keep current, so this reads a few dozen small rows.
             year_rows = conn.execute(
-                f"""
+                """
                 SELECT
                   capture_year AS year,
-                  COUNT(*) AS item_count,
-                  COUNT(DISTINCT {month_expr}) AS month_count
-                FROM media_items
-                WHERE media_type IN ('image', 'video')
+                  SUM(item_count) AS item_count,
+                  COUNT(*) AS month_count
+                FROM media_month_rollups
                 GROUP BY year
-                HAVING year IS NOT NULL
                 ORDER BY year DESC
                 """
             ).fetchall()
             month_rows = conn.execute(
                 f"""
                 SELECT
-                  {month_expr} AS month_key,
-                  COUNT(*) AS item_count,
-                  SUM(CASE WHEN media_type = 'image' THEN 1 ELSE 0 END) AS image_count,
-                  SUM(CASE WHEN media_type = 'video' THEN 1 ELSE 0 END) AS video_count,
-                  MAX(mtime) AS latest_mtime
-                FROM media_items
-                WHERE media_type IN ('image', 'video')
-                  {before_clause}
-                GROUP BY month_key
-                HAVING month_key IS NOT NULL
+                  capture_month AS month_key,
+                  item_count,
+                  image_count,
+                  video_count,
+                  latest_mtime,
+                  covers
+                FROM media_month_rollups
+                {before_clause}
                 ORDER BY month_key DESC
                 LIMIT ?
                 """,
                 params,
             ).fetchall()
 
-            has_more = len(month_rows) > safe_limit
-            visible_rows = month_rows[:safe_limit]
-            months: list[dict] = []
-            for month_row in visible_rows:
-                month_key = str(month_row["month_key"])
-                # A bounded candidate window keeps dense months cheap while still
-                # giving the sampler enough temporal spread for stable covers.
-                candidates = conn.execute(
-                    f"""
-                    SELECT *
-                    FROM media_items
-                    WHERE media_type IN ('image', 'video')
-                      AND {month_expr} = ?
-                    ORDER BY captured_at DESC, uri
-                    LIMIT 120
-                    """,
-                    (month_key,),
-                ).fetchall()
-                months.append({
-                    "key": month_key,
-                    "count": int(month_row["item_count"] or 0),
-                    "image_count": int(month_row["image_count"] or 0),
-                    "video_count": int(month_row["video_count"] or 0),
-                    "latest_mtime": float(month_row["latest_mtime"] or 0),
-                    "records": [
-                        self._to_library_record(row)
-                        for row in self._sample_timeline_records(candidates, safe_preview_limit)
-                    ],
-                })
+        has_more = len(month_rows) > safe_limit
+        visible_rows = month_rows[:safe_limit]
+        covers = {}
+        for month_row in visible_rows:
+            stored = json.loads(month_row["covers"] or "[]")
+            sampled = stored
+            if safe_preview_limit < len(stored):
+                sampled = self._sample_timeline_records(stored, safe_preview_limit)
+            covers[str(month_row["month_key"])] = [str(row["uri"]) for row in sampled]
+        records = {
+            record["name"]: record
+            for record in self.records_for_uris([uri for uris in covers.values() for uri in uris])
+        }
+        months = [
+            {
+                "key": str(month_row["month_key"]),
+                "count": int(month_row["item_count"] or 0),
+                "image_count": int(month_row["image_count"] or 0),
+                "video_count": int(month_row["video_count"] or 0),
+                "latest_mtime": float(month_row["latest_mtime"] or 0),
+                "records": [
+                    records[uri]
+                    for uri in covers[str(month_row["month_key"])]
+                    if uri in records
+                ],
+            }
+            for month_row in visible_rows
+        ]
 
         next_before = str(visible_rows[-1]["month_key"]) if visible_rows and has_more else ""
         return {
@@ -281,19 +523,19 @@ class MediaIndexStore:
         if not wanted:
             return []
         found: dict[str, dict] = {}
-        with self.database.connect() as conn:
+        with self.database.connect(read_only=True) as conn:
             for start in range(0, len(wanted), 500):
                 chunk = wanted[start:start + 500]
                 placeholders = ",".join("?" for _ in chunk)
                 rows = conn.execute(
-                    f"SELECT * FROM media_items WHERE uri IN ({placeholders})",
+                    f"SELECT {_RECORD_COLUMNS} FROM media_items WHERE uri IN ({placeholders})",
                     chunk,
                 ).fetchall()
                 found.update({str(row["uri"]): self._to_library_record(row) for row in rows})
         return [found[uri] for uri in wanted if uri in found]
 
     def stats(self) -> dict:
-        with self.database.connect() as conn:
+        with self.database.connect(read_only=True) as conn:
             counts = {
                 str(row["media_type"]): int(row["count"])
                 for row in conn.execute(
@@ -309,17 +551,171 @@ class MediaIndexStore:
             "last_synced_at": str(state["last_synced_at"]) if state else "",
         }
 
-    def time_states(self) -> dict[str, dict]:
-        """Return cached capture metadata so unchanged files are not reopened."""
-        with self.database.connect() as conn:
+    def time_states(
+        self,
+        directories: dict[str, set[str]] | None = None,
+        *,
+        uris: list[str] | None = None,
+    ) -> dict[str, dict]:
+        """Return cached capture metadata so unchanged files are not reopened.
+
+        ``directories`` or ``uris`` limit the lookup to the given rows.
+        """
+        query = """
+            SELECT uri, size_bytes, mtime, captured_at, captured_local_date,
+                   time_source, time_confidence, time_metadata_version
+            FROM media_items
+        """
+        with self.database.connect(read_only=True) as conn:
+            if uris is not None:
+                wanted = list(dict.fromkeys(uris))
+                rows = []
+                for start in range(0, len(wanted), 500):
+                    chunk = wanted[start:start + 500]
+                    placeholders = ",".join("?" for _ in chunk)
+                    rows.extend(conn.execute(f"{query} WHERE uri IN ({placeholders})", chunk).fetchall())
+            elif directories is None:
+                rows = conn.execute(query).fetchall()
+            else:
+                rows = [
+                    row
+                    for source_id, rel_dirs in directories.items()
+                    for rel_dir in rel_dirs
+                    for row in conn.execute(
+                        f"{query} WHERE source_id = ? AND parent_path = ?",
+                        (source_id, rel_dir or "."),
+                    ).fetchall()
+                ]
+        return {str(row["uri"]): dict(row) for row in rows}
+
+    def outdated_directories(self, version: int) -> dict[str, set[str]]:
+        """Return directories holding rows indexed with an older time metadata version."""
+        with self.database.connect(read_only=True) as conn:
             rows = conn.execute(
                 """
-                SELECT uri, size_bytes, mtime, captured_at, captured_local_date,
-                       time_source, time_confidence, time_metadata_version
+                SELECT DISTINCT time_metadata_version, source_id, parent_path
                 FROM media_items
-                """
+                WHERE time_metadata_version < ?
+                """,
+                (version,),
             ).fetchall()
-        return {str(row["uri"]): dict(row) for row in rows}
+        outdated: dict[str, set[str]] = {}
+        for row in rows:
+            parent = str(row["parent_path"])
+            outdated.setdefault(str(row["source_id"]), set()).add("" if parent == "." else parent)
+        return outdated
+
+    def count_startup(self) -> int:
+        """Record one application start; return the starts since the last full sync."""
+        with self.database.connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO media_index_state(id, last_synced_at, item_count, startups_since_full_sync)
+                VALUES (1, '', 0, 1)
+                ON CONFLICT(id) DO UPDATE SET
+                  startups_since_full_sync = startups_since_full_sync + 1
+                """
+            )
+            row = conn.execute("SELECT startups_since_full_sync FROM media_index_state WHERE id = 1").fetchone()
+        return int(row[0])
+
+    def mark_full_sync(self) -> None:
+        with self.database.connect() as conn:
+            conn.execute("UPDATE media_index_state SET startups_since_full_sync = 0 WHERE id = 1")
+
+    def directory_states(self) -> dict[str, dict[str, float]]:
+        """Return the directory mtimes recorded by the last sync, per source."""
+        with self.database.connect(read_only=True) as conn:
+            rows = conn.execute("SELECT source_id, rel_dir, mtime FROM media_directories").fetchall()
+        states: dict[str, dict[str, float]] = {}
+        for row in rows:
+            states.setdefault(str(row["source_id"]), {})[str(row["rel_dir"])] = float(row["mtime"])
+        return states
+
+    def _has_full_text(self) -> bool:
+        """Whether migration 11 could create the FTS5 trigram table on this SQLite."""
+        if self._full_text is None:
+            with self.database.connect(read_only=True) as conn:
+                self._full_text = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'media_search'"
+                ).fetchone() is not None
+        return self._full_text
+
+    @staticmethod
+    def _index_search(conn, values: list[tuple], *, full_text: bool = True) -> None:
+        """Add search rows for media_items values; caption text carries over by uri."""
+        for start in range(0, len(values), WRITE_BATCH_SIZE):
+            chunk = values[start:start + WRITE_BATCH_SIZE]
+            conn.executemany(
+                "INSERT OR IGNORE INTO media_search_text(uri) VALUES (?)",
+                [(row[0],) for row in chunk],
+            )
+            if not full_text:
+                continue
+            # Scalar subqueries: FTS5 takes single-row VALUES inserts several times
+            # faster than INSERT ... SELECT.
+            conn.executemany(
+                """
+                INSERT INTO media_search(rowid, filename, rel_path, caption, tags) VALUES (
+                  (SELECT id FROM media_search_text WHERE uri = :uri), :filename, :rel_path,
+                  (SELECT caption FROM media_search_text WHERE uri = :uri),
+                  (SELECT tags FROM media_search_text WHERE uri = :uri)
+                )
+                """,
+                [{"uri": row[0], "filename": row[3], "rel_path": row[2]} for row in chunk],
+            )
+
+    @staticmethod
+    def _existing_rows(
+        conn,
+        source_ids: set[str],
+        *,
+        parents: set[tuple[str, str]] = frozenset(),
+        uris: list[str] = (),
+    ) -> dict[str, tuple[str, tuple]]:
+        """Load ``uri -> (parent_path, signature)`` in bulk.
+
+        Covers every row of ``source_ids``, every row directly inside the
+        ``(source_id, parent_path)`` pairs in ``parents``, and the rows of ``uris``.
+        """
+        columns = """
+            SELECT uri, parent_path, source_id, rel_path, media_type, size_bytes, mtime,
+                   captured_at, captured_local_date, time_source, time_confidence,
+                   time_metadata_version
+            FROM media_items
+        """
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        rows: dict[str, tuple[str, tuple]] = {}
+        queries = [(f"{columns} WHERE source_id = ?", (source_id,)) for source_id in sorted(source_ids)]
+        if parents:
+            queries.append((
+                f"""
+                {columns}
+                WHERE (source_id, parent_path) IN (
+                  SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?)
+                )
+                """,
+                (json.dumps(sorted(parents)),),
+            ))
+        for start in range(0, len(uris), WRITE_BATCH_SIZE):
+            queries.append((
+                f"{columns} WHERE uri IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(uris[start:start + WRITE_BATCH_SIZE])),),
+            ))
+        for sql, params in queries:
+            cursor.execute(sql, params)
+            for row in cursor:
+                rows[row[0]] = (row[1], row[2:])
+        return rows
+
+    @staticmethod
+    def _signature(values: tuple) -> tuple:
+        # Same column order as _existing_rows; discovered_at/indexed_at are ignored.
+        return (
+            values[1], values[2], values[5], values[7], values[8], values[9],
+            values[10], values[13], values[14], values[15],
+        )
 
     @staticmethod
     def _record_values(record: dict, now: str) -> tuple:
@@ -348,7 +744,9 @@ class MediaIndexStore:
             "time_source": str(row["time_source"] or "filesystem_mtime"),
             "time_confidence": str(row["time_confidence"] or "fallback"),
             "size_bytes": int(row["size_bytes"]),
-            "is_favorite": False,
+            "is_favorite": bool(row["is_favorite"]) if "is_favorite" in row.keys() else False,
+            "width": int(row["width"] or 0) if "width" in row.keys() else 0,
+            "height": int(row["height"] or 0) if "height" in row.keys() else 0,
         }
 
     @staticmethod
@@ -360,10 +758,10 @@ class MediaIndexStore:
     def _filters(
         cls,
         *,
-        search: str,
         media_type: str,
         min_size: int = 0,
         month: str = "",
+        favorites_only: bool = False,
     ) -> tuple[str, list[object]]:
         clauses: list[str] = []
         params: list[object] = []
@@ -371,24 +769,128 @@ class MediaIndexStore:
             clauses.append("media_type = ?")
             params.append(media_type)
         else:
-            clauses.append("media_type IN ('video', 'image')")
+            clauses.append(VISUAL_MEDIA_FILTER)
         if min_size > 0:
             clauses.append("size_bytes >= ?")
             params.append(int(min_size))
         if cls.is_month_key(month):
             clauses.append("capture_month = ?")
             params.append(month)
-        term = str(search or "").strip()
-        if term:
-            clauses.append("(filename LIKE ? ESCAPE '\\' OR rel_path LIKE ? ESCAPE '\\')")
-            escaped = cls._like_term(term)
-            params.extend((escaped, escaped))
+        if favorites_only:
+            clauses.append("media_items.uri IN (SELECT uri FROM media_favorites)")
         return f"WHERE {' AND '.join(clauses)}", params
 
+    @classmethod
+    def _search_source(cls, search: str, *, full_text: bool = True) -> tuple[str, list[object], bool]:
+        """Return the FROM clause for a search, its parameters, and whether it is ranked.
+
+        Every whitespace separated term must match a filename, path, caption or
+        tag as a case-insensitive substring. Terms of three or more characters
+        go through the trigram index; shorter ones (common for Chinese words)
+        cannot, and fall back to LIKE, as every term does without ``full_text``.
+        Without a search this is plain media_items.
+        """
+        terms = str(search or "").split()
+        if not terms:
+            return "FROM media_items", [], False
+        phrases = [term for term in terms if len(term) >= SEARCH_TRIGRAM] if full_text else []
+        params: list[object] = []
+        if phrases:
+            source = """
+                FROM media_search
+                JOIN media_search_text ON media_search_text.id = media_search.rowid
+                JOIN media_items ON media_items.uri = media_search_text.uri
+                  AND media_search MATCH ?
+            """
+            params.append(" AND ".join('"' + term.replace('"', '""') + '"' for term in phrases))
+        else:
+            source = """
+                FROM media_items
+                JOIN media_search_text ON media_search_text.uri = media_items.uri
+            """
+        for term in terms:
+            if term in phrases:
+                continue
+            source += "  AND (" + " OR ".join(f"{column} LIKE ? ESCAPE '\\'" for column in SEARCH_LIKE_COLUMNS) + ")"
+            params.extend([cls._like_term(term)] * len(SEARCH_LIKE_COLUMNS))
+        return source, params, bool(phrases)
+
     @staticmethod
     def is_month_key(value: str) -> bool:
         return bool(re.fullmatch(r"\d{4}-(0[1-9]|1[0-2])", str(value or "")))
 
+    @classmethod
+    def refresh_month_rollups(cls, conn, months: set[str]) -> None:
+        """Recompute the timeline rollup rows of ``months`` from media_items.
+
+        Write paths call this with every month a changed, added or removed row
+        belonged to, before and after the change, inside their own transaction.
+        """
+        keys = sorted(months)
+        for start in range(0, len(keys), WRITE_BATCH_SIZE):
+            chunk = json.dumps(keys[start:start + WRITE_BATCH_SIZE])
+            conn.execute(
+                "DELETE FROM media_month_rollups WHERE capture_month IN (SELECT value FROM json_each(?))",
+                (chunk,),
+            )
+            conn.execute(
+                f"""
+                INSERT INTO media_month_rollups(
+                  capture_month, capture_year, item_count, image_count, video_count, latest_mtime
+                )
+                SELECT
+                  capture_month,
+                  substr(capture_month, 1, 4),
+                  COUNT(*),
+                  SUM(CASE WHEN media_type = 'image' THEN 1 ELSE 0 END),
+                  SUM(CASE WHEN media_type = 'video' THEN 1 ELSE 0 END),
+                  MAX(mtime)
+                FROM media_items
+                WHERE {VISUAL_MEDIA_FILTER}
+                  AND capture_month IN (SELECT value FROM json_each(?))
+                GROUP BY capture_month
+                """,
+                (chunk,),
+            )
+            # A bounded candidate window per month keeps dense months cheap while
+            # still giving the sampler enough temporal spread for stable covers.
+            # The correlated LIMIT reads only the newest entries of each month.
+            candidate_rows = conn.execute(
+                f"""
+                SELECT json_each.value AS month_key, uri, media_type, captured_at
+                FROM json_each(?)
+                JOIN media_items ON media_items.rowid IN (
+                  SELECT rowid FROM media_items
+                  WHERE {VISUAL_MEDIA_FILTER}
+                    AND capture_month = json_each.value
+                  ORDER BY captured_at DESC, uri
+                  LIMIT ?
+                )
+                """,
+                (chunk, TIMELINE_COVER_CANDIDATES),
+            ).fetchall()
+            candidates: dict[str, list] = {}
+            for row in sorted(candidate_rows, key=lambda row: (-float(row[3]), str(row[1]))):
+                candidates.setdefault(str(row[0]), []).append({"uri": str(row[1]), "media_type": str(row[2])})
+            conn.executemany(
+                "UPDATE media_month_rollups SET covers = ? WHERE capture_month = ?",
+                [
+                    (json.dumps(cls._sample_timeline_records(rows, TIMELINE_PREVIEW_LIMIT)), month_key)
+                    for month_key, rows in candidates.items()
+                ],
+            )
+
+    @staticmethod
+    def _months_for_uris(conn, uris: list[str]) -> set[str]:
+        months: set[str] = set()
+        for start in range(0, len(uris), WRITE_BATCH_SIZE):
+            rows = conn.execute(
+                "SELECT capture_month FROM media_items WHERE uri IN (SELECT value FROM json_each(?))",
+                (json.dumps(uris[start:start + WRITE_BATCH_SIZE]),),
+            ).fetchall()
+            months.update(str(row[0]) for row in rows)
+        return months
+
     @staticmethod
     def _sample_timeline_records(rows, limit: int):
         """Pick stable, time-spread covers and avoid a video-heavy chapter."""
@@ -427,6 +929,17 @@ class MediaIndexStore:
         return selected[:limit]
 
 
+# 2: EXIF capture times also come from DateTimeOriginal/Digitized in the Exif sub-IFD.
+TIME_METADATA_VERSION = 2
+DEFAULT_CAPTURE_WORKERS = min(8, os.cpu_count() or 1)
+MAX_CAPTURE_WORKERS = 32
+# Directory mtimes miss files edited in place, so every Nth start walks everything.
+FULL_SYNC_EVERY_STARTUPS = 10
+CAPTURE_BATCH_SIZE = 512
+# Bump to re-probe every file, like TIME_METADATA_VERSION for capture times.
+MEDIA_PROBE_VERSION = 1
+PROBE_BATCH_SIZE = 256
+
 _FILENAME_DATE_PATTERNS = (
     re.compile(r"(?<!\d)(?P<year>19\d{2}|20\d{2})[-_]?\s?(?P<month>0[1-9]|1[0-2])[-_]?\s?(?P<day>0[1-9]|[12]\d|3[01])(?:[T_ -]?(?P<hour>[01]\d|2[0-3])[:._-]?(?P<minute>[0-5]\d)[:._-]?(?P<second>[0-5]\d))?(?!\d)"),
 )
@@ -438,7 +951,7 @@ def _capture_payload(value: datetime.datetime, source: str, confidence: str) ->
         "captured_local_date": value.strftime("%Y-%m-%dT%H:%M:%S"),
         "time_source": source,
         "time_confidence": confidence,
-        "time_metadata_version": 1,
+        "time_metadata_version": TIME_METADATA_VERSION,
     }
 
 
@@ -454,20 +967,27 @@ def _parse_embedded_datetime(value: object) -> datetime.datetime | None:
     return None
 
 
+_EXIF_CAPTURE_TAGS = (
+    (36867, "exif_original"),
+    (36868, "exif_digitized"),
+    (306, "exif_datetime"),
+)
+
+
 def _image_capture_time(path: Path) -> dict | None:
-    try:
-        with Image.open(path) as image:
-            exif = image.getexif()
-            for tag, source in (
-                (36867, "exif_original"),
-                (36868, "exif_digitized"),
-                (306, "exif_datetime"),
-            ):
-                parsed = _parse_embedded_datetime(exif.get(tag))
-                if parsed:
-                    return _capture_payload(parsed, source, "high")
-    except Exception:
-        return None
+    # JPEG headers are parsed directly so indexing never decodes the image body.
+    tags = read_exif_ascii_tags(path, {tag for tag, _ in _EXIF_CAPTURE_TAGS})
+    if tags is None:
+        try:
+            with Image.open(path) as image:
+                exif = image.getexif()
+                tags = {tag: exif.get(tag) for tag, _ in _EXIF_CAPTURE_TAGS}
+        except Exception:
+            return None
+    for tag, source in _EXIF_CAPTURE_TAGS:
+        parsed = _parse_embedded_datetime(tags.get(tag))
+        if parsed:
+            return _capture_payload(parsed, source, "high")
     return None
 
 
@@ -505,90 +1025,367 @@ def discover_capture_time(path: Path, media_type: str, mtime: float) -> dict:
     )
 
 
+def image_media_info(path: Path) -> dict:
+    """Read image width, height and format; Pillow stops at the header."""
+    info = {"width": None, "height": None, "duration": None, "codec": ""}
+    try:
+        with Image.open(path) as image:
+            info["width"], info["height"] = image.size
+            info["codec"] = str(image.format or "").lower()
+    except Exception:
+        pass
+    return info
+
+
+def ffprobe_media_info(payload: dict, media_type: str) -> dict:
+    """Pick width, height, duration and codec out of a cached ffprobe payload."""
+    stream = probe_stream(payload, "video" if media_type == "video" else "audio")
+    try:
+        width = int(stream.get("width") or 0)
+        height = int(stream.get("height") or 0)
+    except (TypeError, ValueError):
+        width = height = 0
+    return {
+        "width": width if width > 0 and height > 0 else None,
+        "height": height if width > 0 and height > 0 else None,
+        "duration": probe_duration(payload),
+        "codec": str(stream.get("codec_name") or ""),
+    }
+
+
+def _utc_now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
 class LibraryIndexer:
     """Translate the filesystem library into stable index records."""
 
-    def __init__(self, library_service, store: MediaIndexStore):
+    def __init__(
+        self,
+        library_service,
+        store: MediaIndexStore,
+        *,
+        capture_workers: int = DEFAULT_CAPTURE_WORKERS,
+        probe_cache: MediaProbeCache | None = None,
+    ):
         self.library = library_service
         self.store = store
-
-    def sync(self) -> dict:
-        time_states = self.store.time_states()
-        available_source_ids = {
-            source.id
-            for source in self.library.sources
-            if source.path.exists() and source.path.is_dir()
+        self.probe_cache = probe_cache or MediaProbeCache(store.database)
+        self.capture_workers = max(1, min(int(capture_workers or 1), MAX_CAPTURE_WORKERS))
+        self._sync_lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._probe_progress = {
+            "running": False,
+            "probed": 0,
+            "finished_at": "",
+            "error": "",
+        }
+        self._progress = {
+            "running": False,
+            "phase": "idle",
+            "full": False,
+            "discovered": 0,
+            "processed": 0,
+            "total": 0,
+            "started_at": "",
+            "finished_at": "",
+            "error": "",
+            "last_result": None,
         }
-        paths = (
-            self.library.scan_videos()
-            + self.library.scan_images()
-            + self.library.scan_audios()
+
+    def sync(self, *, full: bool = False, source_ids: set[str] | None = None) -> dict:
+        """Bring the index in line with the filesystem.
+
+        Sources with recorded directory mtimes are walked incrementally: only
+        directories whose mtime moved are listed and their files stat'ed. ``full``
+        ignores the recorded state, which also catches files edited in place.
+        ``source_ids`` limits the sync to some sources.
+        """
+        with self._sync_lock:
+            self._progress.update(
+                running=True,
+                phase="walking",
+                full=full,
+                discovered=0,
+                processed=0,
+                total=0,
+                started_at=_utc_now(),
+                finished_at="",
+                error="",
+            )
+            try:
+                result = self._sync(full=full, source_ids=source_ids)
+            except Exception as exc:
+                self._progress.update(running=False, phase="failed", finished_at=_utc_now(), error=str(exc))
+                raise
+            if full and source_ids is None:
+                self.store.mark_full_sync()
+            self._progress.update(running=False, phase="idle", finished_at=_utc_now(), last_result=result)
+            return result
+
+    def startup_sync_is_full(self) -> bool:
+        """Count this start; True when the startup sync should be a full one.
+
+        Incremental syncs trust directory mtimes, which do not change when a
+        file is rewritten in place. A full sync every
+        ``FULL_SYNC_EVERY_STARTUPS`` starts picks such edits up eventually.
+        """
+        return self.store.count_startup() >= FULL_SYNC_EVERY_STARTUPS
+
+    def start_background_sync(self, *, full: bool = False, probe: bool = False, on_done=None) -> threading.Thread:
+        """Run ``sync`` on a daemon thread; follow it through ``progress()``.
+
+        ``on_done`` is called with the sync result once it succeeds. ``probe``
+        then runs ``probe_media`` on the same thread.
+        """
+
+        def run() -> None:
+            try:
+                result = self.sync(full=full)
+            except Exception:
+                return  # Recorded in progress()["error"].
+            if on_done:
+                on_done(result)
+            if probe:
+                self._probe_quietly()
+
+        self._progress.update(running=True, phase="queued", started_at=_utc_now(), error="")
+        thread = threading.Thread(target=run, name="tiklocal-library-sync", daemon=True)
+        thread.start()
+        return thread
+
+    def start_background_probe(self) -> threading.Thread:
+        """Run ``probe_media`` on a daemon thread."""
+        thread = threading.Thread(target=self._probe_quietly, name="tiklocal-media-probe", daemon=True)
+        thread.start()
+        return thread
+
+    def probe_media(self) -> int:
+        """Record width, height, duration and codec for indexed files that lack them.
+
+        Rows are read in uri order in batches and probed on the capture thread
+        pool, so library pages never probe on the request path. Audio and video
+        go through ``probe_cache``, so radio and thumbnails reuse the same
+        ffprobe results. Each batch is
+        saved before the next one starts: an interrupted pass resumes where the
+        stored probes stop. Returns how many files were probed, or 0 when
+        another pass is already running.
+        """
+        if not self._probe_lock.acquire(blocking=False):
+            return 0
+        try:
+            self._probe_progress.update(running=True, probed=0, finished_at="", error="")
+            probed = 0
+            after = ""
+            with ThreadPoolExecutor(max_workers=self.capture_workers) as executor:
+                while pending := self.store.pending_probes(MEDIA_PROBE_VERSION, after=after, limit=PROBE_BATCH_SIZE):
+                    after = pending[-1]["uri"]
+                    probed += self.store.save_probes(self._probe_batch(pending, executor))
+                    self._probe_progress["probed"] = probed
+            return probed
+        except Exception as exc:
+            self._probe_progress["error"] = str(exc)
+            raise
+        finally:
+            self._probe_progress.update(running=False, finished_at=_utc_now())
+            self._probe_lock.release()
+
+    def _probe_quietly(self) -> None:
+        try:
+            self.probe_media()
+        except Exception:
+            pass  # Recorded in progress()["probe"]["error"].
+
+    def _probe_batch(self, rows: list[dict], executor: ThreadPoolExecutor) -> list[dict]:
+        images: list[tuple[dict, Path]] = []
+        streams: list[tuple[dict, Path]] = []
+        for row in rows:
+            path = self.library.resolve_path(row["uri"])
+            if not path or not path.is_file():
+                continue
+            (images if row["media_type"] == "image" else streams).append((row, path))
+        payloads = self.probe_cache.probe_files(
+            [(row["uri"], path, row["size_bytes"], row["mtime"]) for row, path in streams],
+            executor=executor,
+        )
+        results = [
+            {**row, **info, "probe_version": MEDIA_PROBE_VERSION}
+            for (row, _), info in zip(images, executor.map(image_media_info, [path for _, path in images]))
+        ]
+        # A file ffprobe could not run on has no payload and is retried next pass.
+        results.extend(
+            {
+                **row,
+                **ffprobe_media_info(payloads[row["uri"]], row["media_type"]),
+                "probe_version": MEDIA_PROBE_VERSION,
+            }
+            for row, _ in streams
+            if row["uri"] in payloads
+        )
+        return results
+
+    def progress(self) -> dict:
+        return {**self._progress, "probe": dict(self._probe_progress)}
+
+    def _sync(self, *, full: bool, source_ids: set[str] | None) -> dict:
+        started_at = time.perf_counter()
+        directory_states = {} if full else self.store.directory_states()
+        # Rows from an older time metadata version must be re-probed even though
+        # their directories did not change; forgetting the mtime forces a listing.
+        for source_id, rel_dirs in self.store.outdated_directories(TIME_METADATA_VERSION).items():
+            for rel_dir in rel_dirs:
+                directory_states.get(source_id, {}).pop(rel_dir, None)
+        available_source_ids: set[str] = set()
+        full_source_ids: set[str] = set()
+        stale_directories: dict[str, set[str]] = {}
+        changed_directories: dict[str, dict[str, float]] = {}
+        entries = []
+        listed_count = 0
+        sources = [
+            source for source in self.library.sources
+            if source_ids is None or source.id in source_ids
+        ]
+        for source in sources:
+            if not source.path.is_dir():
+                continue
+            available_source_ids.add(source.id)
+            known = directory_states.get(source.id)
+            walk = self.library.walk_source(source, known_directories=known)
+            entries.extend(walk.entries)
+            self._progress["discovered"] = len(entries)
+            listed_count += len(walk.listed)
+            if known is None:
+                full_source_ids.add(source.id)
+            else:
+                stale = walk.listed | (set(known) - set(walk.directories))
+                if stale:
+                    stale_directories[source.id] = stale
+            if walk.directories != known:
+                changed_directories[source.id] = walk.directories
+        time_states = (
+            self.store.time_states()
+            if full_source_ids
+            else self.store.time_states(stale_directories)
         )
+        walked_at = time.perf_counter()
+        pending = [
+            entry for entry in entries
+            if self._cached_capture(entry, time_states) is None and self.library.parse_uri(entry.uri)
+        ]
+        self._progress.update(phase="indexing", total=len(pending))
+        captures = self._discover_captures(pending)
+        captured_at = time.perf_counter()
         records_by_uri = {
             record["uri"]: record
-            for path in paths
-            if (record := self._record_for_path(path, time_states))
+            for entry in entries
+            if (record := self._record_for_entry(entry, time_states, captures.get(entry.uri)))
         }
+        self._progress["phase"] = "writing"
         result = self.store.replace_snapshot(
             list(records_by_uri.values()),
-            synced_source_ids=available_source_ids,
+            synced_source_ids=full_source_ids,
+            stale_directories=stale_directories,
+            directories=changed_directories,
         )
+        result["timings_ms"] = {
+            "walk": round((walked_at - started_at) * 1000, 1),
+            "capture": round((captured_at - walked_at) * 1000, 1),
+            "write": round((time.perf_counter() - captured_at) * 1000, 1),
+        }
+        result["captured"] = len(pending)
+        result["mode"] = "incremental" if not full_source_ids else "full"
+        result["listed_directories"] = listed_count
         result["unavailable_sources"] = [
-            source.id for source in self.library.sources if source.id not in available_source_ids
+            source.id for source in sources if source.id not in available_source_ids
         ]
         return result
 
     def register_uris(self, uris: list[str]) -> int:
-        time_states = self.store.time_states()
-        records = []
-        for uri in uris:
-            path = self.library.resolve_path(uri)
-            record = self._record_for_path(path, time_states) if path else None
-            if record:
-                records.append(record)
+        paths = [path for uri in uris if (path := self.library.resolve_path(uri))]
+        return self.register_paths(paths)
+
+    def register_paths(self, paths: list[Path]) -> int:
+        entries = [entry for path in paths if (entry := self.library.media_entry(path))]
+        time_states = self.store.time_states(uris=[entry.uri for entry in entries])
+        records = [
+            record
+            for entry in entries
+            if (record := self._record_for_entry(entry, time_states))
+        ]
         return self.store.upsert(records)
 
     def _record_for_path(self, path: Path, time_states: dict[str, dict] | None = None) -> dict | None:
-        try:
-            stat = path.stat()
-            uri = self.library.get_relative_path(path)
-            ref = self.library.parse_uri(uri)
-            if not ref:
-                return None
-            suffix = path.suffix.lower()
-            if suffix in VIDEO_EXTENSIONS:
-                media_type = "video"
-            elif suffix in IMAGE_EXTENSIONS:
-                media_type = "image"
-            elif suffix in AUDIO_EXTENSIONS:
-                media_type = "audio"
-            else:
-                return None
-            existing = (time_states or {}).get(uri) or {}
-            unchanged = (
-                int(existing.get("size_bytes") or -1) == int(stat.st_size)
-                and float(existing.get("mtime") or -1) == float(stat.st_mtime)
-                and bool(existing.get("captured_local_date"))
-                and int(existing.get("time_metadata_version") or 0) >= 1
-            )
-            capture = {
-                "captured_at": float(existing.get("captured_at") or stat.st_mtime),
-                "captured_local_date": str(existing.get("captured_local_date") or ""),
-                "time_source": str(existing.get("time_source") or "filesystem_mtime"),
-                "time_confidence": str(existing.get("time_confidence") or "fallback"),
-                "time_metadata_version": int(existing.get("time_metadata_version") or 0),
-            } if unchanged else discover_capture_time(path, media_type, float(stat.st_mtime))
-            return {
-                "uri": uri,
-                "source_id": ref.source_id,
-                "rel_path": ref.rel_path,
-                "filename": path.name,
-                "parent_path": str(Path(ref.rel_path).parent).replace("\\", "/"),
-                "media_type": media_type,
-                "extension": suffix,
-                "size_bytes": int(stat.st_size),
-                "mtime": float(stat.st_mtime),
-                **capture,
-            }
-        except OSError:
+        entry = self.library.media_entry(path)
+        return self._record_for_entry(entry, time_states) if entry else None
+
+    def _record_for_entry(
+        self,
+        entry: MediaEntry,
+        time_states: dict[str, dict] | None = None,
+        capture: dict | None = None,
+    ) -> dict | None:
+        """Build an index record from an already-stat'ed walk entry."""
+        ref = self.library.parse_uri(entry.uri)
+        if not ref:
             return None
+        capture = (
+            capture
+            or self._cached_capture(entry, time_states)
+            or discover_capture_time(entry.path, entry.media_type, entry.mtime)
+        )
+        return {
+            "uri": entry.uri,
+            "source_id": ref.source_id,
+            "rel_path": ref.rel_path,
+            "filename": entry.path.name,
+            "parent_path": str(Path(ref.rel_path).parent).replace("\\", "/"),
+            "media_type": entry.media_type,
+            "extension": entry.path.suffix.lower(),
+            "size_bytes": entry.size_bytes,
+            "mtime": entry.mtime,
+            **capture,
+        }
+
+    @staticmethod
+    def _cached_capture(entry: MediaEntry, time_states: dict[str, dict] | None) -> dict | None:
+        existing = (time_states or {}).get(entry.uri) or {}
+        unchanged = (
+            int(existing.get("size_bytes") or -1) == entry.size_bytes
+            and float(existing.get("mtime") or -1) == entry.mtime
+            and bool(existing.get("captured_local_date"))
+            and int(existing.get("time_metadata_version") or 0) >= TIME_METADATA_VERSION
+        )
+        if not unchanged:
+            return None
+        return {
+            "captured_at": float(existing.get("captured_at") or entry.mtime),
+            "captured_local_date": str(existing.get("captured_local_date") or ""),
+            "time_source": str(existing.get("time_source") or "filesystem_mtime"),
+            "time_confidence": str(existing.get("time_confidence") or "fallback"),
+            "time_metadata_version": int(existing.get("time_metadata_version") or 0),
+        }
+
+    def _discover_captures(self, entries: list[MediaEntry]) -> dict[str, dict]:
+        """Probe capture times on a bounded thread pool; image headers are I/O bound."""
+        captures: dict[str, dict] = {}
+        if not entries:
+            return captures
+        done = 0
+
+        def probe(entry: MediaEntry) -> tuple[str, dict]:
+            return entry.uri, discover_capture_time(entry.path, entry.media_type, entry.mtime)
+
+        if self.capture_workers == 1:
+            for done, entry in enumerate(entries, start=1):
+                captures[entry.uri] = discover_capture_time(entry.path, entry.media_type, entry.mtime)
+                self._progress["processed"] = done
+            return captures
+
+        with ThreadPoolExecutor(max_workers=self.capture_workers) as executor:
+            # Submit in slices so a 300k-file first index does not queue 300k futures.
+            for start in range(0, len(entries), CAPTURE_BATCH_SIZE):
+                for uri, capture in executor.map(probe, entries[start:start + CAPTURE_BATCH_SIZE]):
+                    captures[uri] = capture
+                    done += 1
+                    self._progress["processed"] = done
+        return captures
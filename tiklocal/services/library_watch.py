@@ -0,0 +1,295 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+
+from tiklocal.services import media_type_for_suffix
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Minimal ctypes binding for Linux inotify; no third-party dependency."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: str) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code), path)
+        return wd
+
+    def read_events(self, timeout: float) -> list[tuple[int, int, str]]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+def inotify_available() -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+        return hasattr(libc, "inotify_init1")
+    except OSError:
+        return False
+
+
+class LibraryWatcher:
+    """Keep media_items live by watching media sources from a background thread.
+
+    On Linux the sources are watched with inotify and file events are applied
+    through ``LibraryIndexer.register_paths`` / ``MediaIndexStore.delete`` after a
+    per-source debounce; directory changes also run an incremental sync of
+    that source. Elsewhere, or when the inotify watch limit is reached, the
+    watcher polls with incremental syncs instead. A source whose new
+    subdirectories could not all be watched is polled the same way while the
+    rest stay on inotify.
+    """
+
+    def __init__(
+        self,
+        indexer,
+        *,
+        debounce: float = 2.0,
+        max_delay: float = 10.0,
+        poll_interval: float = 60.0,
+        use_inotify: bool = True,
+    ):
+        self.indexer = indexer
+        self.library = indexer.library
+        self.debounce = max(0.05, float(debounce))
+        self.max_delay = max(self.debounce, float(max_delay))
+        self.poll_interval = max(1.0, float(poll_interval))
+        self.use_inotify = use_inotify
+        self.mode = "stopped"
+        self.last_error = ""
+        self.applied_events = 0
+
+        self._shutdown = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._inotify: _Inotify | None = None
+        self._watches: dict[int, str] = {}
+        self._pending_paths: dict[str, set[str]] = {}
+        self._dirty_sources: set[str] = set()
+        # Sources with directories inotify could not watch; synced every poll_interval.
+        self._polled_sources: set[str] = set()
+        self._next_poll_at = 0.0
+        self._first_event_at: dict[str, float] = {}
+        self._last_event_at: dict[str, float] = {}
+
+    def start(self) -> "LibraryWatcher":
+        if self._thread and self._thread.is_alive():
+            return self
+        self._shutdown.clear()
+        self._thread = threading.Thread(target=self._run, name="tiklocal-library-watch", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._shutdown.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.mode = "stopped"
+
+    def status(self) -> dict:
+        return {
+            "mode": self.mode,
+            "watched_directories": len(self._watches),
+            "polled_sources": sorted(self._polled_sources),
+            "applied_events": self.applied_events,
+            "last_error": self.last_error,
+        }
+
+    def _run(self) -> None:
+        if self.use_inotify and inotify_available():
+            try:
+                self._inotify = _Inotify()
+                for source in self.library.sources:
+                    if source.path.is_dir():
+                        self._watch_tree(str(source.path))
+                self.mode = "inotify"
+                self._inotify_loop()
+                return
+            except OSError as exc:
+                # ENOSPC means fs.inotify.max_user_watches is exhausted.
+                self.last_error = str(exc)
+                self._close_inotify()
+        self.mode = "polling"
+        self._poll_loop()
+
+    def _poll_loop(self) -> None:
+        while not self._shutdown.wait(self.poll_interval):
+            self._sync_sources(None)
+
+    def _inotify_loop(self) -> None:
+        try:
+            while not self._shutdown.is_set():
+                for wd, mask, name in self._inotify.read_events(min(self.debounce, 0.5)):
+                    self._handle_event(wd, mask, name)
+                now = time.monotonic()
+                self._flush_due(now)
+                if self._polled_sources and now >= self._next_poll_at:
+                    self._next_poll_at = now + self.poll_interval
+                    self._sync_sources(set(self._polled_sources))
+            self._flush_due(float("inf"))
+        finally:
+            self._close_inotify()
+
+    def _watch_tree(self, root: str) -> None:
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            try:
+                wd = self._inotify.add_watch(directory)
+            except OSError as exc:
+                if exc.errno in {errno.ENOENT, errno.ENOTDIR, errno.EACCES}:
+                    continue
+                raise
+            self._watches[wd] = directory
+            try:
+                with os.scandir(directory) as iterator:
+                    pending.extend(
+                        entry.path for entry in iterator
+                        if entry.is_dir(follow_symlinks=False)
+                    )
+            except OSError:
+                continue
+
+    def _handle_event(self, wd: int, mask: int, name: str) -> None:
+        if mask & IN_Q_OVERFLOW:
+            for source in self.library.sources:
+                self._mark(source.id, dirty=True)
+            return
+        directory = self._watches.get(wd)
+        if mask & IN_IGNORED:
+            self._watches.pop(wd, None)
+            return
+        if directory is None:
+            return
+        path = os.path.join(directory, name) if name else directory
+        source = self._source_for_path(path)
+        if source is None:
+            return
+        if mask & IN_ISDIR or mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self._watch_tree(path)
+                except OSError as exc:
+                    # Part of this subtree is unwatched; poll the source from now on.
+                    self.last_error = str(exc)
+                    if source.id not in self._polled_sources:
+                        self._polled_sources.add(source.id)
+                        self._next_poll_at = time.monotonic() + self.poll_interval
+            # Whole subtrees appeared or vanished; the directory-mtime sync is cheap.
+            self._mark(source.id, dirty=True)
+            return
+        if media_type_for_suffix(os.path.splitext(name)[1]):
+            self._mark(source.id, path=path)
+
+    def _mark(self, source_id: str, *, path: str = "", dirty: bool = False) -> None:
+        now = time.monotonic()
+        self._first_event_at.setdefault(source_id, now)
+        self._last_event_at[source_id] = now
+        if dirty:
+            self._dirty_sources.add(source_id)
+        if path:
+            self._pending_paths.setdefault(source_id, set()).add(path)
+
+    def _flush_due(self, now: float) -> None:
+        for source_id in list(self._last_event_at):
+            quiet = now - self._last_event_at[source_id] >= self.debounce
+            overdue = now - self._first_event_at[source_id] >= self.max_delay
+            if quiet or overdue:
+                self._flush_source(source_id)
+
+    def _flush_source(self, source_id: str) -> None:
+        self._first_event_at.pop(source_id, None)
+        self._last_event_at.pop(source_id, None)
+        paths = self._pending_paths.pop(source_id, set())
+        if source_id in self._dirty_sources:
+            self._dirty_sources.discard(source_id)
+            self._sync_sources({source_id})
+        # The incremental sync only lists directories whose mtime moved, which
+        # misses files rewritten in place; apply the file events as well.
+        if not paths:
+            return
+        existing = [Path(path) for path in paths if os.path.lexists(path)]
+        removed = [Path(path) for path in paths if not os.path.lexists(path)]
+        try:
+            self.indexer.register_paths(existing)
+            for path in removed:
+                self.indexer.store.delete(self.library.get_relative_path(path))
+            self.applied_events += len(paths)
+        except Exception as exc:
+            self.last_error = str(exc)
+
+    def _sync_sources(self, source_ids: set[str] | None) -> None:
+        try:
+            self.indexer.sync(source_ids=source_ids)
+            self.applied_events += 1
+        except Exception as exc:
+            self.last_error = str(exc)
+
+    def _source_for_path(self, path: str):
+        target = Path(path)
+        for source in self.library.sources:
+            if target.is_relative_to(source.path):
+                return source
+        return None
+
+    def _close_inotify(self) -> None:
+        if self._inotify:
+            self._inotify.close()
+        self._inotify = None
+        self._watches.clear()
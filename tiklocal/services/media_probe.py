@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import datetime
+import json
+import subprocess as sp
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+FFPROBE_TIMEOUT_SECONDS = 8
+PROBE_LOOKUP_BATCH_SIZE = 500
+
+
+def run_ffprobe(path: Path, *, timeout: float = FFPROBE_TIMEOUT_SECONDS) -> dict[str, Any] | None:
+    """Return ffprobe's format and streams for ``path``.
+
+    A file ffprobe rejects gives {}; None means ffprobe itself could not run
+    (missing or timed out), which is worth retrying later.
+    """
+    try:
+        proc = sp.run(
+            [
+                "ffprobe",
+                "-v", "error",
+                "-show_format",
+                "-show_streams",
+                "-of", "json",
+                str(path),
+            ],
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+    except (OSError, sp.SubprocessError):
+        return None
+    try:
+        payload = json.loads(proc.stdout or "{}") if proc.returncode == 0 else {}
+    except ValueError:
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+
+def probe_format(payload: dict[str, Any]) -> dict[str, Any]:
+    fmt = payload.get("format")
+    return fmt if isinstance(fmt, dict) else {}
+
+
+def probe_stream(payload: dict[str, Any], codec_type: str) -> dict[str, Any]:
+    """First stream of ``codec_type`` ("video" or "audio"), or {}."""
+    for stream in payload.get("streams") or []:
+        if isinstance(stream, dict) and stream.get("codec_type") == codec_type:
+            return stream
+    return {}
+
+
+def probe_duration(payload: dict[str, Any]) -> float | None:
+    try:
+        duration = float(probe_format(payload).get("duration") or 0)
+    except (TypeError, ValueError):
+        return None
+    return duration if duration > 0 else None
+
+
+class MediaProbeCache:
+    """ffprobe output kept in ``media_probe_cache``, valid while size and mtime match.
+
+    The library indexer's probe pass fills it in batches; radio metadata and
+    thumbnail generation read it back, so a file is probed once across
+    subsystems and restarts.
+    """
+
+    def __init__(self, database, *, probe=run_ffprobe):
+        self.database = database
+        self._probe = probe
+
+    def lookup(self, files: list[tuple[str, int, float]]) -> dict[str, dict[str, Any]]:
+        """Return cached payloads for ``(uri, size, mtime)`` whose file is unchanged."""
+        found: dict[str, dict[str, Any]] = {}
+        with self.database.connect(read_only=True) as conn:
+            for start in range(0, len(files), PROBE_LOOKUP_BATCH_SIZE):
+                chunk = files[start:start + PROBE_LOOKUP_BATCH_SIZE]
+                rows = conn.execute(
+                    """
+                    SELECT media_probe_cache.uri, media_probe_cache.payload
+                    FROM json_each(?) AS wanted
+                    JOIN media_probe_cache ON media_probe_cache.uri = json_extract(wanted.value, '$[0]')
+                      AND media_probe_cache.size_bytes = json_extract(wanted.value, '$[1]')
+                      AND media_probe_cache.mtime = json_extract(wanted.value, '$[2]')
+                    """,
+                    (json.dumps([[uri, int(size), float(mtime)] for uri, size, mtime in chunk]),),
+                ).fetchall()
+                found.update({str(row[0]): json.loads(row[1]) for row in rows})
+        return found
+
+    def probe_files(
+        self,
+        files: list[tuple[str, Path, int, float]],
+        *,
+        executor: ThreadPoolExecutor | None = None,
+    ) -> dict[str, dict[str, Any]]:
+        """Return payloads for ``(uri, path, size, mtime)``, probing only cache misses.
+
+        Misses are probed on ``executor`` when given and stored in one write.
+        Files ffprobe rejects are stored as {} so they are not probed again
+        until they change; files it could not run on are left out.
+        """
+        found = self.lookup([(uri, size, mtime) for uri, _, size, mtime in files])
+        missing = [item for item in files if item[0] not in found]
+        if not missing:
+            return found
+        paths = [path for _, path, _, _ in missing]
+        payloads = list(executor.map(self._probe, paths)) if executor else [self._probe(path) for path in paths]
+        probed = [(item, payload) for item, payload in zip(missing, payloads) if payload is not None]
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with self.database.connect() as conn:
+            conn.executemany(
+                """
+                INSERT INTO media_probe_cache(uri, size_bytes, mtime, payload, probed_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(uri) DO UPDATE SET
+                  size_bytes = excluded.size_bytes,
+                  mtime = excluded.mtime,
+                  payload = excluded.payload,
+                  probed_at = excluded.probed_at
+                """,
+                [
+                    (uri, int(size), float(mtime), json.dumps(payload, ensure_ascii=False), now)
+                    for (uri, _, size, mtime), payload in probed
+                ],
+            )
+        found.update({uri: payload for (uri, _, _, _), payload in probed})
+        return found
+
+    def probe(self, uri: str, path: Path) -> dict[str, Any]:
+        """Return the payload for one file, probing it if the cache is stale."""
+        try:
+            stat = path.stat()
+        except OSError:
+            return {}
+        return self.probe_files([(uri, path, int(stat.st_size), float(stat.st_mtime))]).get(uri, {})
@@ -285,13 +285,28 @@ def compute_prompt_hash(prompt_config: dict[str, Any]) -> str:
     return hashlib.sha256(encoded).hexdigest()[:16]
 
 
+_MEDIA_META_INSERT = """
+(uri, width, height, caption, tags, payload, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
 class ImageMetadataStore:
-    def __init__(self, store_path: Path):
+    """AI captions and probed media dimensions, one ``media_meta`` row per URI.
+
+    The full payload is kept as JSON; width, height, caption and tags are also
+    columns so library queries can read them without parsing it. A legacy
+    ``metadata.json`` is imported once, recorded in ``media_meta_imports``.
+    """
+
+    def __init__(self, database, store_path: Path | None = None, *, library_service=None):
+        self.database = database
         self.store_path = store_path
-        self.store_path.parent.mkdir(parents=True, exist_ok=True)
+        self.library_service = library_service
+        self._import_json_once()
 
-    def _load(self) -> dict[str, Any]:
-        if not self.store_path.exists():
+    def _load_json(self) -> dict[str, Any]:
+        if not self.store_path or not self.store_path.exists():
             return {}
         try:
             with self.store_path.open('r', encoding='utf-8') as f:
@@ -300,23 +315,90 @@ class ImageMetadataStore:
         except Exception:
             return {}
 
+    def _import_json_once(self) -> None:
+        if not self.store_path or not self.store_path.exists():
+            return
+        path = str(self.store_path.resolve())
+        with self.database.connect() as conn:
+            if conn.execute("SELECT 1 FROM media_meta_imports WHERE path = ?", (path,)).fetchone():
+                return
+            data = self._load_json()
+            # A canonical ``@source/...`` key wins over a legacy key for the same
+            # file, as it did when the app looked up the canonical key first.
+            values: dict[str, tuple] = {}
+            for key, payload in data.items():
+                if not isinstance(payload, dict):
+                    continue
+                uri = self.library_service.canonicalize_uri(key) if self.library_service else str(key)
+                if uri == key or uri not in values:
+                    values[uri] = self._row_values(uri, payload)
+            conn.executemany(f"INSERT OR IGNORE INTO media_meta{_MEDIA_META_INSERT}", list(values.values()))
+            conn.execute(
+                "INSERT INTO media_meta_imports(path, item_count, imported_at) VALUES (?, ?, ?)",
+                (path, len(values), datetime.datetime.utcnow().isoformat() + "Z"),
+            )
+
+    @staticmethod
+    def _row_values(key: str, value: dict[str, Any]) -> tuple:
+        media_meta = value.get("media_meta") if isinstance(value.get("media_meta"), dict) else {}
+        try:
+            width = int(media_meta.get("width") or 0)
+            height = int(media_meta.get("height") or 0)
+        except (TypeError, ValueError):
+            width = height = 0
+        tags = value.get("tags")
+        if isinstance(tags, str):
+            tags = [tags]
+        if not isinstance(tags, list):
+            tags = []
+        return (
+            key,
+            width if width > 0 and height > 0 else None,
+            height if width > 0 and height > 0 else None,
+            str(value.get("title") or "").strip(),
+            json.dumps([str(tag) for tag in tags], ensure_ascii=False),
+            json.dumps(value, ensure_ascii=False),
+            datetime.datetime.utcnow().isoformat() + "Z",
+        )
+
     def get(self, key: str) -> dict[str, Any] | None:
-        return self._load().get(key)
+        with self.database.connect(read_only=True) as conn:
+            row = conn.execute(
+                "SELECT payload FROM media_meta WHERE uri = ? AND payload != '{}'",
+                (key,),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self) -> dict[str, Any]:
+        with self.database.connect(read_only=True) as conn:
+            rows = conn.execute("SELECT uri, payload FROM media_meta WHERE payload != '{}'")
+            return {str(row[0]): json.loads(row[1]) for row in rows}
 
     def set(self, key: str, value: dict[str, Any], overwrite: bool = True) -> tuple[dict[str, Any], bool]:
-        data = self._load()
-        if not overwrite and key in data:
-            return data[key], False
-        data[key] = value
-        self._write(data)
+        with self.database.connect() as conn:
+            if not overwrite:
+                row = conn.execute(
+                    "SELECT payload FROM media_meta WHERE uri = ? AND payload != '{}'",
+                    (key,),
+                ).fetchone()
+                if row:
+                    return json.loads(row[0]), False
+            # Probed columns (duration, codec, probe_*) belong to the indexer.
+            conn.execute(
+                f"""
+                INSERT INTO media_meta{_MEDIA_META_INSERT}
+                ON CONFLICT(uri) DO UPDATE SET
+                  width = COALESCE(excluded.width, media_meta.width),
+                  height = COALESCE(excluded.height, media_meta.height),
+                  caption = excluded.caption,
+                  tags = excluded.tags,
+                  payload = excluded.payload,
+                  updated_at = excluded.updated_at
+                """,
+                self._row_values(key, value),
+            )
         return value, True
 
-    def _write(self, data: dict[str, Any]) -> None:
-        tmp_path = self.store_path.with_name(self.store_path.name + ".tmp")
-        with tmp_path.open('w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        os.replace(tmp_path, self.store_path)
-
 
 class PromptConfigStore:
     def __init__(self, store_path: Path):
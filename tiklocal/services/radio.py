@@ -1,20 +1,12 @@
 import datetime
 import json
 import random
-import subprocess as sp
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Callable
 
 from tiklocal.services import FavoriteService, LibraryService
-
-
-def _positive_float(value) -> float | None:
-    try:
-        number = float(value)
-    except (TypeError, ValueError):
-        return None
-    return number if number > 0 else None
+from tiklocal.services.media_probe import MediaProbeCache, probe_duration, probe_format, run_ffprobe
 
 
 @dataclass(frozen=True)
@@ -126,12 +118,13 @@ class RadioService:
         favorite_service: FavoriteService,
         profile_store: RadioProfileStore | None = None,
         activity_store=None,
+        probe_cache: MediaProbeCache | None = None,
     ):
         self.library = library_service
         self.favorites = favorite_service
         self.profile_store = profile_store
         self.activity_store = activity_store
-        self._metadata_cache: dict[str, tuple[float, AudioMetadata]] = {}
+        self.probe_cache = probe_cache
 
     def list_stations(self) -> list[dict]:
         return [
@@ -218,50 +211,36 @@ class RadioService:
         return self.metadata_for(path)
 
     def metadata_for(self, path: Path) -> AudioMetadata:
-        try:
-            mtime = path.stat().st_mtime
-        except OSError:
-            return AudioMetadata()
-
-        cache_key = str(path)
-        cached = self._metadata_cache.get(cache_key)
-        if cached and cached[0] == mtime:
-            return cached[1]
-
-        metadata = self._probe_audio_metadata(path)
-        self._metadata_cache[cache_key] = (mtime, metadata)
-        return metadata
+        return self.metadata_for_paths([path])[0]
+
+    def metadata_for_paths(self, paths: list[Path]) -> list[AudioMetadata]:
+        """Metadata for several files with one probe-cache lookup."""
+        if not self.probe_cache:
+            return [self._metadata_from_probe(run_ffprobe(path) or {}) for path in paths]
+        files = []
+        for path in paths:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((self.library.get_relative_path(path), path, int(stat.st_size), float(stat.st_mtime)))
+        payloads = self.probe_cache.probe_files(files)
+        return [
+            self._metadata_from_probe(payloads.get(self.library.get_relative_path(path)) or {})
+            for path in paths
+        ]
 
-    def _probe_audio_metadata(self, path: Path) -> AudioMetadata:
-        try:
-            proc = sp.run(
-                [
-                    "ffprobe",
-                    "-v", "error",
-                    "-show_entries", "format=duration:format_tags=title,artist,album",
-                    "-of", "json",
-                    str(path),
-                ],
-                capture_output=True,
-                text=True,
-                timeout=5,
-            )
-            if proc.returncode != 0:
-                return AudioMetadata()
-            payload = json.loads(proc.stdout or "{}")
-            fmt = payload.get("format") if isinstance(payload, dict) else {}
-            fmt = fmt if isinstance(fmt, dict) else {}
-            tags = fmt.get("tags") if isinstance(fmt.get("tags"), dict) else {}
-            normalized_tags = {str(key).lower(): str(value).strip() for key, value in tags.items()}
-            duration = _positive_float(fmt.get("duration"))
-            return AudioMetadata(
-                title=normalized_tags.get("title", ""),
-                artist=normalized_tags.get("artist", ""),
-                album=normalized_tags.get("album", ""),
-                duration=duration,
-            )
-        except Exception:
-            return AudioMetadata()
+    @staticmethod
+    def _metadata_from_probe(payload: dict) -> AudioMetadata:
+        fmt = probe_format(payload)
+        tags = fmt.get("tags") if isinstance(fmt.get("tags"), dict) else {}
+        normalized_tags = {str(key).lower(): str(value).strip() for key, value in tags.items()}
+        return AudioMetadata(
+            title=normalized_tags.get("title", ""),
+            artist=normalized_tags.get("artist", ""),
+            album=normalized_tags.get("album", ""),
+            duration=probe_duration(payload),
+        )
 
     def _select_recent(
         self,
@@ -1,9 +1,16 @@
+import bisect
 import hashlib
 import datetime
+import json
 from typing import Any
 
 from tiklocal.services.database import AppDatabase
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 DEFAULT_SIMILARITY_THRESHOLD = 0.84
 DEFAULT_SIMILARITY_SCAN_LIMIT = 500
@@ -11,6 +18,83 @@ DEFAULT_SIMILARITY_GROUP_LIMIT = 24
 DEFAULT_SIMILARITY_MIN_GROUP_SIZE = 2
 DEFAULT_SIMILARITY_MAX_GROUP_SIZE = 8
 SIMILARITY_KIND_IMAGE_EMBEDDING = "image_embedding"
+DEFAULT_PROFILE_THRESHOLDS = (0.92, 0.88, 0.84, 0.80)
+# Scores computed per block product; bounds memory at ~16 MB of float32.
+SIMILARITY_BLOCK_ELEMENTS = 4_000_000
+
+
+def cosine_similarity(left: dict[str, Any], right: dict[str, Any]) -> float:
+    left_embedding = left.get("embedding")
+    right_embedding = right.get("embedding")
+    left_norm = float(left.get("embedding_norm") or 0)
+    right_norm = float(right.get("embedding_norm") or 0)
+    if (
+        left_norm <= 0
+        or right_norm <= 0
+        or left_embedding is None
+        or right_embedding is None
+        or len(left_embedding) != len(right_embedding)
+    ):
+        return -1.0
+    dot = sum(float(a) * float(b) for a, b in zip(left_embedding, right_embedding))
+    return dot / (left_norm * right_norm)
+
+
+class SimilarityGraph:
+    """Every pair of vectors scoring at least ``threshold``, computed once.
+
+    Groups and pair counts for any threshold at or above the build threshold
+    are read from the same graph, so profiling several thresholds costs one
+    pass over the vectors. With NumPy that pass is a series of blocked matrix
+    products over unit vectors; without it, the pairwise Python loop.
+    """
+
+    def __init__(self, vectors: list[dict[str, Any]], *, threshold: float):
+        self.threshold = float(threshold)
+        self.neighbours: list[list[tuple[int, float]]] = [[] for _ in vectors]
+        scores: list[float] = []
+        pairs = self._matrix_pairs(vectors) if np is not None else self._python_pairs(vectors)
+        for left, right, score in pairs:
+            self.neighbours[left].append((right, score))
+            self.neighbours[right].append((left, score))
+            scores.append(score)
+        uris = [str(vector.get("uri") or "") for vector in vectors]
+        for items in self.neighbours:
+            items.sort(key=lambda item: (-item[1], uris[item[0]]))
+        scores.sort()
+        self._scores = scores
+
+    def count_pairs(self, threshold: float) -> int:
+        return len(self._scores) - bisect.bisect_left(self._scores, float(threshold))
+
+    def _python_pairs(self, vectors: list[dict[str, Any]]):
+        for index, left in enumerate(vectors):
+            for other in range(index + 1, len(vectors)):
+                score = cosine_similarity(left, vectors[other])
+                if score >= self.threshold:
+                    yield index, other, score
+
+    def _matrix_pairs(self, vectors: list[dict[str, Any]]):
+        valid = [
+            index for index, vector in enumerate(vectors)
+            if float(vector.get("embedding_norm") or 0) > 0 and vector.get("embedding") is not None
+        ]
+        if valid:
+            # Vectors of another length never score against the first one.
+            dimensions = len(vectors[valid[0]]["embedding"])
+            valid = [index for index in valid if len(vectors[index]["embedding"]) == dimensions]
+        if len(valid) < 2:
+            return
+        matrix = np.asarray([vectors[index]["embedding"] for index in valid], dtype=np.float32)
+        matrix /= np.asarray([float(vectors[index]["embedding_norm"]) for index in valid], dtype=np.float32)[:, None]
+        step = max(1, SIMILARITY_BLOCK_ELEMENTS // len(valid))
+        for start in range(0, len(valid), step):
+            # Only columns from ``start`` on: each pair is scored once.
+            block = matrix[start:start + step] @ matrix[start:].T
+            rows, columns = np.nonzero(block >= self.threshold)
+            above_diagonal = columns > rows
+            for row, column in zip(rows[above_diagonal].tolist(), columns[above_diagonal].tolist()):
+                yield valid[start + row], valid[start + column], float(block[row, column])
 
 
 class SQLiteSimilarityGroupStore:
@@ -25,6 +109,7 @@ class SQLiteSimilarityGroupStore:
             ).fetchall()
             keys = [str(row["group_key"]) for row in rows]
             conn.execute("DELETE FROM media_similarity_groups WHERE kind = ?", (kind,))
+            conn.execute("DELETE FROM media_similarity_state WHERE kind = ?", (kind,))
         return len(keys)
 
     def save_groups(
@@ -36,64 +121,202 @@ class SQLiteSimilarityGroupStore:
         max_group_size: int,
         exclusive: bool = True,
         kind: str = SIMILARITY_KIND_IMAGE_EMBEDDING,
+        watermark: str = "",
     ) -> int:
+        """Replace all groups of ``kind`` with the result of a full analysis.
+
+        The settings and ``watermark`` (the newest ``indexed_at`` the analysis
+        saw) are kept so ``ImageSimilarityService.update_groups`` can fold in
+        vectors indexed later.
+        """
         now = datetime.datetime.utcnow().isoformat() + "Z"
+        settings = {
+            "threshold": float(threshold),
+            "min_group_size": int(min_group_size),
+            "max_group_size": int(max_group_size),
+            "exclusive": bool(exclusive),
+        }
         saved = 0
         with self.database.connect() as conn:
             conn.execute("DELETE FROM media_similarity_groups WHERE kind = ?", (kind,))
             for group in groups:
-                items = [item for item in (group.get("items") or []) if item.get("uri")]
-                if len(items) < min_group_size:
-                    continue
-                profile = self._group_profile(items)
-                group_key = str(group.get("group_key") or "")
-                if not group_key:
-                    continue
-                conn.execute(
-                    """
-                    INSERT INTO media_similarity_groups (
-                      group_key, kind, seed_uri, score, item_count, threshold,
-                      min_group_size, max_group_size, exclusive, model, dimensions,
-                      image_max_size, image_quality, created_at, updated_at
-                    )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        group_key,
-                        kind,
-                        str(group.get("seed_uri") or ""),
-                        float(group.get("score") or 0),
-                        len(items),
-                        float(threshold),
-                        int(min_group_size),
-                        int(max_group_size),
-                        1 if exclusive else 0,
-                        profile["model"],
-                        profile["dimensions"],
-                        profile["image_max_size"],
-                        profile["image_quality"],
-                        now,
-                        now,
-                    ),
+                if self._insert_group(conn, group, settings=settings, kind=kind, now=now):
+                    saved += 1
+            conn.execute(
+                """
+                INSERT INTO media_similarity_state(
+                  kind, threshold, min_group_size, max_group_size, watermark, updated_at
                 )
-                conn.executemany(
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(kind) DO UPDATE SET
+                  threshold = excluded.threshold,
+                  min_group_size = excluded.min_group_size,
+                  max_group_size = excluded.max_group_size,
+                  watermark = excluded.watermark,
+                  updated_at = excluded.updated_at
+                """,
+                (kind, float(threshold), int(min_group_size), int(max_group_size), str(watermark or ""), now),
+            )
+        return saved
+
+    def state(self, *, kind: str = SIMILARITY_KIND_IMAGE_EMBEDDING) -> dict[str, Any] | None:
+        """Settings and watermark of the last full analysis, or None if there was none."""
+        with self.database.connect(read_only=True) as conn:
+            row = conn.execute("SELECT * FROM media_similarity_state WHERE kind = ?", (kind,)).fetchone()
+        if not row:
+            return None
+        return {
+            "threshold": float(row["threshold"]),
+            "min_group_size": int(row["min_group_size"]),
+            "max_group_size": int(row["max_group_size"]),
+            "watermark": str(row["watermark"]),
+        }
+
+    def groups_for_uris(
+        self,
+        uris: list[str],
+        *,
+        kind: str = SIMILARITY_KIND_IMAGE_EMBEDDING,
+    ) -> dict[str, dict[str, Any]]:
+        """Map each grouped uri in ``uris`` to its whole group; members share one dict."""
+        with self.database.connect(read_only=True) as conn:
+            group_rows = conn.execute(
+                """
+                SELECT * FROM media_similarity_groups
+                WHERE kind = ? AND group_key IN (
+                  SELECT group_key FROM media_similarity_group_items
+                  WHERE uri IN (SELECT value FROM json_each(?))
+                )
+                """,
+                (kind, json.dumps(list(uris))),
+            ).fetchall()
+            groups = {
+                str(row["group_key"]): {
+                    "group_key": str(row["group_key"]),
+                    "seed_uri": str(row["seed_uri"]),
+                    "score": float(row["score"]),
+                    "items": [],
+                    "profile": {
+                        "model": str(row["model"]),
+                        "dimensions": int(row["dimensions"]),
+                        "image_max_size": int(row["image_max_size"]),
+                        "image_quality": int(row["image_quality"]),
+                    },
+                }
+                for row in group_rows
+            }
+            if groups:
+                item_rows = conn.execute(
                     """
-                    INSERT INTO media_similarity_group_items(group_key, uri, rank, score)
-                    VALUES (?, ?, ?, ?)
+                    SELECT * FROM media_similarity_group_items
+                    WHERE group_key IN (SELECT value FROM json_each(?))
+                    ORDER BY group_key ASC, rank ASC
                     """,
-                    [
-                        (
-                            group_key,
-                            str(item.get("uri") or ""),
-                            index,
-                            float(item.get("score") or 0),
-                        )
-                        for index, item in enumerate(items)
-                    ],
-                )
-                saved += 1
+                    (json.dumps(list(groups)),),
+                ).fetchall()
+                for row in item_rows:
+                    groups[str(row["group_key"])]["items"].append({
+                        "uri": str(row["uri"]),
+                        "score": float(row["score"]),
+                        "metadata": {},
+                    })
+        wanted = set(uris)
+        return {
+            item["uri"]: group
+            for group in groups.values()
+            for item in group["items"]
+            if item["uri"] in wanted
+        }
+
+    def replace_groups(
+        self,
+        remove_keys: list[str],
+        groups: list[dict[str, Any]],
+        *,
+        watermark: str,
+        kind: str = SIMILARITY_KIND_IMAGE_EMBEDDING,
+    ) -> int:
+        """Swap ``remove_keys`` for ``groups`` under the saved settings and advance the watermark."""
+        state = self.state(kind=kind)
+        if state is None:
+            return 0
+        now = datetime.datetime.utcnow().isoformat() + "Z"
+        settings = {**state, "exclusive": True}
+        saved = 0
+        with self.database.connect() as conn:
+            conn.executemany(
+                "DELETE FROM media_similarity_groups WHERE group_key = ? AND kind = ?",
+                [(key, kind) for key in remove_keys],
+            )
+            for group in groups:
+                if self._insert_group(conn, group, settings=settings, kind=kind, now=now):
+                    saved += 1
+            conn.execute(
+                "UPDATE media_similarity_state SET watermark = MAX(watermark, ?), updated_at = ? WHERE kind = ?",
+                (str(watermark), now, kind),
+            )
         return saved
 
+    def _insert_group(
+        self,
+        conn,
+        group: dict[str, Any],
+        *,
+        settings: dict[str, Any],
+        kind: str,
+        now: str,
+    ) -> bool:
+        items = [item for item in (group.get("items") or []) if item.get("uri")]
+        if len(items) < int(settings["min_group_size"]):
+            return False
+        group_key = str(group.get("group_key") or "")
+        if not group_key:
+            return False
+        profile = group.get("profile") or self._group_profile(items)
+        conn.execute(
+            """
+            INSERT INTO media_similarity_groups (
+              group_key, kind, seed_uri, score, item_count, threshold,
+              min_group_size, max_group_size, exclusive, model, dimensions,
+              image_max_size, image_quality, created_at, updated_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                group_key,
+                kind,
+                str(group.get("seed_uri") or ""),
+                float(group.get("score") or 0),
+                len(items),
+                float(settings["threshold"]),
+                int(settings["min_group_size"]),
+                int(settings["max_group_size"]),
+                1 if settings["exclusive"] else 0,
+                profile["model"],
+                profile["dimensions"],
+                profile["image_max_size"],
+                profile["image_quality"],
+                now,
+                now,
+            ),
+        )
+        conn.executemany(
+            """
+            INSERT INTO media_similarity_group_items(group_key, uri, rank, score)
+            VALUES (?, ?, ?, ?)
+            """,
+            [
+                (
+                    group_key,
+                    str(item.get("uri") or ""),
+                    index,
+                    float(item.get("score") or 0),
+                )
+                for index, item in enumerate(items)
+            ],
+        )
+        return True
+
     def list_groups(
         self,
         *,
@@ -103,7 +326,7 @@ class SQLiteSimilarityGroupStore:
     ) -> dict[str, Any]:
         start = max(0, int(offset))
         safe_limit = max(1, min(int(limit), 5000))
-        with self.database.connect() as conn:
+        with self.database.connect(read_only=True) as conn:
             total = int(conn.execute(
                 "SELECT COUNT(*) FROM media_similarity_groups WHERE kind = ?",
                 (kind,),
@@ -190,17 +413,22 @@ class ImageSimilarityService:
         min_group_size: int = DEFAULT_SIMILARITY_MIN_GROUP_SIZE,
         max_group_size: int = DEFAULT_SIMILARITY_MAX_GROUP_SIZE,
         scan_limit: int = DEFAULT_SIMILARITY_SCAN_LIMIT,
+        vectors: list[dict[str, Any]] | None = None,
+        graph: SimilarityGraph | None = None,
     ) -> dict[str, Any]:
-        vectors = self.load_vectors(scan_limit=scan_limit)
+        if vectors is None:
+            vectors = self.load_vectors(scan_limit=scan_limit)
         groups = self._greedy_groups(
             vectors,
             threshold=max(0.0, min(float(threshold), 1.0)),
             min_group_size=max(2, int(min_group_size)),
             max_group_size=max(2, int(max_group_size)),
+            graph=graph,
         )
 
         start = max(0, int(offset))
-        safe_limit = max(1, min(int(limit), 48))
+        # limit 0 returns every group (analyze-similar saves them all).
+        safe_limit = max(1, min(int(limit), 48)) if int(limit) > 0 else max(1, len(groups))
         end = start + safe_limit
         page_items = groups[start:end]
         return {
@@ -221,17 +449,23 @@ class ImageSimilarityService:
         thresholds: list[float] | None = None,
         min_group_size: int = DEFAULT_SIMILARITY_MIN_GROUP_SIZE,
         max_group_size: int = DEFAULT_SIMILARITY_MAX_GROUP_SIZE,
+        vectors: list[dict[str, Any]] | None = None,
+        graph: SimilarityGraph | None = None,
     ) -> list[dict[str, Any]]:
-        vectors = self.load_vectors(scan_limit=scan_limit)
-        values = thresholds or [0.92, 0.88, 0.84, 0.80]
+        if vectors is None:
+            vectors = self.load_vectors(scan_limit=scan_limit)
+        values = [float(value) for value in (thresholds or DEFAULT_PROFILE_THRESHOLDS)]
+        if graph is None or graph.threshold > min(values):
+            graph = self.build_graph(vectors, threshold=min(values))
         profile = []
         for threshold in values:
-            pair_count = self.count_candidate_pairs(vectors, threshold=float(threshold))
+            pair_count = graph.count_pairs(threshold)
             groups = self._greedy_groups(
                 vectors,
-                threshold=float(threshold),
+                threshold=threshold,
                 min_group_size=max(2, int(min_group_size)),
                 max_group_size=max(2, int(max_group_size)),
+                graph=graph,
             )
             profile.append({
                 "threshold": float(threshold),
@@ -270,13 +504,121 @@ class ImageSimilarityService:
             })
         return result
 
+    def update_groups(
+        self,
+        group_store: SQLiteSimilarityGroupStore,
+        *,
+        kind: str = SIMILARITY_KIND_IMAGE_EMBEDDING,
+    ) -> dict[str, int]:
+        """Fold vectors indexed since the last pass into the saved groups.
+
+        Only runs after a full ``analyze-similar`` has saved groups, whose
+        threshold and group sizes it keeps using. Each new vector joins the
+        group of its closest grouped neighbour, merging in other neighbour
+        groups that still fit, or else starts a group with its ungrouped
+        neighbours. The watermark advances per vector, so an interrupted
+        pass resumes where it stopped.
+        """
+        result = {"processed": 0, "attached": 0, "created": 0, "merged": 0}
+        state = group_store.state(kind=kind)
+        if state is None:
+            return result
+        threshold = float(state["threshold"])
+        min_group_size = int(state["min_group_size"])
+        max_group_size = int(state["max_group_size"])
+        for metadata in self.vector_index.vectors_indexed_since(state["watermark"]):
+            uri = str(metadata["uri"])
+            neighbours = [
+                {"uri": str(item["uri"]), "score": 1.0 - float(item["distance"]), "metadata": item.get("metadata") or {}}
+                for item in self.vector_index.query_similar(uri, limit=max_group_size * 2)
+                if 1.0 - float(item["distance"]) >= threshold
+            ]
+            memberships = group_store.groups_for_uris([uri, *(item["uri"] for item in neighbours)], kind=kind)
+            remove_keys, groups, outcome = self._fold_vector(
+                {"uri": uri, "metadata": metadata},
+                neighbours,
+                memberships,
+                min_group_size=min_group_size,
+                max_group_size=max_group_size,
+            )
+            group_store.replace_groups(remove_keys, groups, watermark=str(metadata["indexed_at"]), kind=kind)
+            result["processed"] += 1
+            for key in outcome:
+                result[key] += 1
+        return result
+
+    def _fold_vector(
+        self,
+        vector: dict[str, Any],
+        neighbours: list[dict[str, Any]],
+        memberships: dict[str, dict[str, Any]],
+        *,
+        min_group_size: int,
+        max_group_size: int,
+    ) -> tuple[list[str], list[dict[str, Any]], list[str]]:
+        """Plan the group changes for one new vector: (keys to drop, groups to insert, outcomes)."""
+        uri = vector["uri"]
+        originals = {group["group_key"]: group for group in memberships.values()}
+        # A re-indexed image leaves its old group first.
+        members = {
+            key: [item for item in group["items"] if item["uri"] != uri]
+            for key, group in originals.items()
+        }
+        changed: set[str] = set()
+        if uri in memberships:
+            changed.add(memberships[uri]["group_key"])
+        outcome: list[str] = []
+
+        grouped = [item for item in neighbours if item["uri"] in memberships]
+        if grouped:
+            target_key = memberships[grouped[0]["uri"]]["group_key"]
+            target = members[target_key]
+            for item in grouped[1:]:
+                key = memberships[item["uri"]]["group_key"]
+                if key in members and key != target_key and len(target) + len(members[key]) < max_group_size:
+                    target.extend(members.pop(key))
+                    changed.update({key, target_key})
+                    outcome.append("merged")
+            if len(target) < max_group_size:
+                target.append({"uri": uri, "score": grouped[0]["score"], "metadata": vector["metadata"]})
+                changed.add(target_key)
+                outcome.append("attached")
+
+        groups: list[dict[str, Any]] = []
+        if "attached" not in outcome:
+            loose = [item for item in neighbours if item["uri"] not in memberships][:max(0, max_group_size - 1)]
+            if len(loose) + 1 >= min_group_size:
+                groups.append(self._make_group([
+                    {"uri": uri, "score": 1.0, "metadata": vector["metadata"]},
+                    *loose,
+                ]))
+                outcome.append("created")
+
+        for key in sorted(changed):
+            if key in members and len(members[key]) >= min_group_size:
+                groups.append(self._make_group(members[key], profile=originals[key].get("profile")))
+        return sorted(changed), groups, outcome
+
+    def _make_group(self, items: list[dict[str, Any]], *, profile: dict[str, Any] | None = None) -> dict[str, Any]:
+        member_uris = [str(item["uri"]) for item in items]
+        scores = [float(item.get("score") or 0) for item in items[1:]]
+        group_key = self._group_key(member_uris)
+        return {
+            "type": "similar_group",
+            "name": f"similar:{group_key}",
+            "group_key": group_key,
+            "seed_uri": member_uris[0],
+            "count": len(items),
+            "score": round(sum(scores) / len(scores), 4) if scores else 1.0,
+            "items": items,
+            "profile": profile,
+        }
+
+    def build_graph(self, vectors: list[dict[str, Any]], *, threshold: float) -> SimilarityGraph:
+        return SimilarityGraph(vectors, threshold=threshold)
+
     def count_candidate_pairs(self, vectors: list[dict[str, Any]], *, threshold: float) -> int:
-        count = 0
-        for index, left in enumerate(vectors):
-            for right in vectors[index + 1:]:
-                if self._cosine_similarity(left, right) >= threshold:
-                    count += 1
-        return count
+        return self.build_graph(vectors, threshold=threshold).count_pairs(threshold)
 
     def _greedy_groups(
         self,
@@ -285,11 +627,16 @@ class ImageSimilarityService:
         threshold: float,
         min_group_size: int,
         max_group_size: int,
+        graph: SimilarityGraph | None = None,
     ) -> list[dict[str, Any]]:
+        """Seeds in ``vectors`` order each take their best unused neighbours."""
+        if graph is None or graph.threshold > threshold:
+            graph = self.build_graph(vectors, threshold=threshold)
+        uris = [str(vector.get("uri") or "") for vector in vectors]
         used: set[str] = set()
         groups: list[dict[str, Any]] = []
-        for seed in vectors:
-            seed_uri = str(seed.get("uri") or "")
+        for index, seed in enumerate(vectors):
+            seed_uri = uris[index]
             if not seed_uri or seed_uri in used:
                 continue
             seed_norm = float(seed.get("embedding_norm") or 0)
@@ -297,60 +644,31 @@ class ImageSimilarityService:
                 continue
 
             candidates: list[dict[str, Any]] = []
-            for candidate in vectors:
-                candidate_uri = str(candidate.get("uri") or "")
+            for other, score in graph.neighbours[index]:
+                if score < threshold or len(candidates) >= max_group_size - 1:
+                    break
+                candidate_uri = uris[other]
                 if not candidate_uri or candidate_uri == seed_uri or candidate_uri in used:
                     continue
-                score = self._cosine_similarity(seed, candidate)
-                if score < threshold:
-                    continue
                 candidates.append({
                     "uri": candidate_uri,
                     "score": score,
-                    "metadata": candidate.get("metadata") or {},
+                    "metadata": vectors[other].get("metadata") or {},
                 })
 
-            candidates.sort(key=lambda item: (-float(item.get("score") or 0), str(item.get("uri") or "")))
             members = [
                 {"uri": seed_uri, "score": 1.0, "metadata": seed.get("metadata") or {}},
-                *candidates[:max(0, max_group_size - 1)],
+                *candidates,
             ]
             if len(members) < min_group_size:
                 continue
 
-            member_uris = [str(item["uri"]) for item in members]
-            used.update(member_uris)
-            scores = [float(item.get("score") or 0) for item in members[1:]]
-            average_score = sum(scores) / len(scores) if scores else 1.0
-            groups.append({
-                "type": "similar_group",
-                "name": f"similar:{self._group_key(member_uris)}",
-                "group_key": self._group_key(member_uris),
-                "seed_uri": seed_uri,
-                "count": len(members),
-                "score": round(average_score, 4),
-                "items": members,
-            })
+            used.update(str(item["uri"]) for item in members)
+            groups.append(self._make_group(members))
 
         groups.sort(key=lambda item: (-int(item.get("count") or 0), -float(item.get("score") or 0), str(item.get("seed_uri") or "")))
         return groups
 
-    def _cosine_similarity(self, left: dict[str, Any], right: dict[str, Any]) -> float:
-        left_embedding = left.get("embedding")
-        right_embedding = right.get("embedding")
-        left_norm = float(left.get("embedding_norm") or 0)
-        right_norm = float(right.get("embedding_norm") or 0)
-        if (
-            left_norm <= 0
-            or right_norm <= 0
-            or left_embedding is None
-            or right_embedding is None
-            or len(left_embedding) != len(right_embedding)
-        ):
-            return -1.0
-        dot = sum(float(a) * float(b) for a, b in zip(left_embedding, right_embedding))
-        return dot / (left_norm * right_norm)
-
     def _group_key(self, uris: list[str]) -> str:
         payload = "\n".join(sorted(str(uri) for uri in uris if uri)).encode("utf-8")
         return hashlib.sha1(payload).hexdigest()[:16]
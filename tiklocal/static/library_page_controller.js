@@ -9,6 +9,7 @@
   const initialItems = Array.isArray(boot.initialItems) ? boot.initialItems : [];
   const initialHasMore = !!boot.initialHasMore;
   const initialNextOffset = Number(boot.initialNextOffset || 0);
+  const initialNextCursor = String(boot.initialNextCursor || '');
   const initialMode = String(boot.initialMode || 'all');
   const initialSeed = String(boot.initialSeed || '');
   const minMb = Number(boot.minMb || 0);
@@ -82,7 +83,7 @@
   const flowSession = window.createFlowSession({
     initialItems,
     initialHasMore: !!initialHasMore,
-    initialCursor: { offset: Number(initialNextOffset || 0) },
+    initialCursor: { offset: Number(initialNextOffset || 0), token: initialNextCursor },
     keyOf: (item) => String(item?.name || ''),
   });
   const items = flowSession.items;
@@ -466,13 +467,15 @@
     return -1;
   }
 
-  function apiParams(offset) {
+  function apiParams(offset, token = '') {
     const params = new URLSearchParams({
       scope,
       mode,
       offset: String(offset),
       limit: String(pageSize),
     });
+    // The opaque cursor lets the server seek instead of skipping `offset` rows.
+    if (token) params.set('cursor', token);
     if (scope === 'collection' && collectionId) {
       params.set('collection_id', String(collectionId));
     }
@@ -503,7 +506,7 @@
         const offset = Number(cursor?.offset || 0);
         const url = isSimilarMode()
           ? `/api/library/similar-groups?${similarGroupApiParams(offset).toString()}`
-          : `/api/library/items?${apiParams(offset).toString()}`;
+          : `/api/library/items?${apiParams(offset, String(cursor?.token || '')).toString()}`;
         const res = await fetch(url);
         const data = await res.json();
         if (!data?.success) throw new Error('request failed');
@@ -513,7 +516,10 @@
         return {
           items: Array.isArray(payload.items) ? payload.items : [],
           hasMore: payload.has_more === true,
-          cursor: { offset: Number(payload.next_offset || (offset + pageSize)) },
+          cursor: {
+            offset: Number(payload.next_offset || (offset + pageSize)),
+            token: String(payload.next_cursor || ''),
+          },
         };
       }).then((result) => {
         const appendedIndexes = result.appendedIndices || [];
@@ -8,6 +8,8 @@ import sys
 from pathlib import Path
 import mimetypes
 from tiklocal.paths import get_thumbnails_dir, get_thumbs_map_path, get_data_dir
+from tiklocal.services import LibraryService
+from tiklocal.services.media_probe import MediaProbeCache, probe_duration
 
 
 def _thumb_key(rel_path: str) -> str:
@@ -53,12 +55,12 @@ def _probe_duration(path: Path) -> float | None:
     return None
 
 
-def _ffmpeg_capture(input_path: Path, output_path: Path, ts: float | None) -> bool:
+def _ffmpeg_capture(input_path: Path, output_path: Path, ts: float | None, duration: float | None = None) -> bool:
     candidates: list[float]
     if ts is not None and ts >= 0:
         candidates = [ts]
     else:
-        dur = _probe_duration(input_path)
+        dur = duration if duration is not None else _probe_duration(input_path)
         if dur and dur > 1:
             t = max(1.0, min(dur - 1.0, dur * 0.2))
             candidates = [t, 5.0, 1.0, 0.1]
@@ -114,8 +116,22 @@ def _print_progress(current: int, total: int, prefix: str = '') -> None:
     sys.stdout.flush()
 
 
-def generate_thumbnails(media_root: str | Path, overwrite: bool = False, limit: int = 0, show_progress: bool = True) -> dict:
+def generate_thumbnails(
+    media_root: str | Path,
+    overwrite: bool = False,
+    limit: int = 0,
+    show_progress: bool = True,
+    probe_cache: MediaProbeCache | None = None,
+    library: LibraryService | None = None,
+) -> dict:
+    """Capture a frame per video; durations come from ``probe_cache`` when given.
+
+    Pass the configured ``library`` so cache keys are the same ``@<source>/...``
+    uris the library indexer probes under.
+    """
     root = Path(media_root)
+    if probe_cache and library is None:
+        library = LibraryService(root)
     mapping = _load_map()
     videos = _iter_videos(root)
     total = len(videos)
@@ -151,7 +167,11 @@ def generate_thumbnails(media_root: str | Path, overwrite: bool = False, limit:
                     break
             continue
 
-        ok = _ffmpeg_capture(vp, out, mapping.get(rel, {}).get('ts'))
+        ts = mapping.get(rel, {}).get('ts')
+        duration = None
+        if probe_cache and ts is None:
+            duration = probe_duration(probe_cache.probe(library.get_relative_path(vp), vp))
+        ok = _ffmpeg_capture(vp, out, ts, duration)
         if ok:
             mapping[rel] = {
                 'ts': mapping.get(rel, {}).get('ts'),
@@ -1,13 +1,7 @@
-import datetime
-import json
 import random
-import subprocess as sp
-from pathlib import Path
 from typing import Callable
 from urllib.parse import quote
 
-from PIL import Image
-
 
 def legacy_media_key(uri: str) -> str:
     text = str(uri or '').strip().replace('\\', '/')
@@ -237,98 +231,11 @@ def build_theme_strip_candidates(
     return candidates
 
 
-def read_media_dims_from_metadata(metadata_store, name: str) -> tuple[int | None, int | None]:
-    payload = metadata_store.get(name)
-    if not isinstance(payload, dict):
-        return None, None
-    media_meta = payload.get('media_meta')
-    if not isinstance(media_meta, dict):
-        return None, None
-    try:
-        width = int(media_meta.get('width') or 0)
-        height = int(media_meta.get('height') or 0)
-    except (TypeError, ValueError):
-        return None, None
-    if width <= 0 or height <= 0:
-        return None, None
-    return width, height
-
-
-def save_media_dims_to_metadata(metadata_store, name: str, media_type: str, width: int, height: int) -> None:
-    if width <= 0 or height <= 0:
-        return
-    current = metadata_store.get(name)
-    payload = dict(current) if isinstance(current, dict) else {}
-    payload['media_meta'] = {
-        'type': media_type,
-        'width': int(width),
-        'height': int(height),
-        'updated_at': datetime.datetime.utcnow().isoformat() + 'Z',
-    }
-    metadata_store.set(name, payload, overwrite=True)
-
-
-def probe_media_dims(library_service, name: str, media_type: str) -> tuple[int | None, int | None]:
-    target = library_service.resolve_path(name)
-    if not target or not target.exists():
-        return None, None
-
-    if media_type == 'image':
-        try:
-            with Image.open(target) as img:
-                width, height = img.size
-            if int(width) > 0 and int(height) > 0:
-                return int(width), int(height)
-        except Exception:
-            return None, None
-        return None, None
-
-    try:
-        cmd = [
-            'ffprobe',
-            '-v', 'error',
-            '-select_streams', 'v:0',
-            '-show_entries', 'stream=width,height',
-            '-of', 'json',
-            str(target),
-        ]
-        proc = sp.run(cmd, capture_output=True, text=True, timeout=8)
-        if proc.returncode != 0:
-            return None, None
-        payload = json.loads(proc.stdout or '{}')
-        streams = payload.get('streams') or []
-        if not streams:
-            return None, None
-        stream = streams[0] if isinstance(streams[0], dict) else {}
-        width = int(stream.get('width') or 0)
-        height = int(stream.get('height') or 0)
-        if width > 0 and height > 0:
-            return width, height
-    except Exception:
-        return None, None
-    return None, None
-
-
-def get_or_probe_media_dims(metadata_store, library_service, name: str, media_type: str) -> tuple[int | None, int | None]:
-    width, height = read_media_dims_from_metadata(metadata_store, name)
-    if not (width and height):
-        for legacy_key in library_service.legacy_candidates(name)[1:]:
-            width, height = read_media_dims_from_metadata(metadata_store, legacy_key)
-            if width and height:
-                save_media_dims_to_metadata(metadata_store, name, media_type, width, height)
-                return width, height
-    if width and height:
-        return width, height
-    width, height = probe_media_dims(library_service, name, media_type)
-    if width and height:
-        save_media_dims_to_metadata(metadata_store, name, media_type, width, height)
-    return width, height
-
-
-def serialize_library_item(record: dict, metadata_store, library_service) -> dict:
+def serialize_library_item(record: dict) -> dict:
+    """Serialize an index record; dimensions come from the indexer's background probe."""
     name = str(record.get('name') or '')
     media_type = str(record.get('media_type') or 'video')
-    width, height = get_or_probe_media_dims(metadata_store, library_service, name, media_type)
+    width, height = record.get('width'), record.get('height')
     encoded = quote(name)
     media_url = f"/media/{quote(name, safe='/')}"
     return {
@@ -748,5 +655,6 @@ def build_library_template_context(
         'initial_has_more': initial_page['has_more'],
         'initial_offset': initial_page['offset'],
         'initial_next_offset': initial_page['next_offset'],
+        'initial_next_cursor': initial_page.get('next_cursor', ''),
         'page_size': initial_page['limit'],
     }